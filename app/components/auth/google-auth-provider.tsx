@@ -39,9 +39,8 @@ export function GoogleAuthProvider({ children }: GoogleAuthProviderProps) {
       localStorage.setItem("googleUser", JSON.stringify(userData))
       localStorage.setItem("authToken", event.data.token)
       
-      // Get user ID and hash it for the URL
-      const userId = userData.email.split('@')[0]
-      const hashedId = hashUserId(userId)
+      // The dashboard is keyed by the session's user id (the full email)
+      const hashedId = hashUserId(userData.email)
       router.push(`/dashboard/${hashedId}`)
     }
   }, [router])
@@ -12,12 +12,12 @@ import Image from "next/image"
 import axios from "axios"
 
 interface TwoFactorAuthProps {
-  email: string
+  preAuthToken: string
   onVerified: (token: string) => void
   onCancel: () => void
 }
 
-export function TwoFactorVerification({ email, onVerified, onCancel }: TwoFactorAuthProps) {
+export function TwoFactorVerification({ preAuthToken, onVerified, onCancel }: TwoFactorAuthProps) {
   const [code, setCode] = useState("")
   const [isLoading, setIsLoading] = useState(false)
   const [error, setError] = useState<string | null>(null)
@@ -32,7 +32,7 @@ export function TwoFactorVerification({ email, onVerified, onCancel }: TwoFactor
     try {
       // Call the 2FA verification endpoint
       const response = await axios.post("http://localhost:8000/api/auth/2fa/login", {
-        email,
+        pre_auth_token: preAuthToken,
         code
       })
 
@@ -118,9 +118,7 @@ export function TwoFactorSetup() {
     const checkTwoFactorStatus = async () => {
       try {
         const token = localStorage.getItem("authToken")
-        const userId = localStorage.getItem("userId")
-        
-        const response = await axios.get(`http://localhost:8000/api/auth/2fa/check?user_id=${userId || ''}`, {
+        const response = await axios.get("http://localhost:8000/api/auth/2fa/check", {
           headers: token ? {
             Authorization: `Bearer ${token}`
           } : {}
@@ -141,30 +139,14 @@ export function TwoFactorSetup() {
 
     try {
       const token = localStorage.getItem("authToken")
-      const userInfo = localStorage.getItem("userInfo")
-      let user: any = null
-      
-      try {
-        user = userInfo ? JSON.parse(userInfo) : null
-      } catch (e) {
-        console.error("Error parsing user info:", e)
-      }
-      
-      const userId = user?.email || localStorage.getItem("userId")
-      
-      if (!userId) {
-        throw new Error("User ID not found")
+      if (!token) {
+        throw new Error("Not signed in")
       }
 
-      // Send token in multiple ways for flexibility
       const response = await axios.post(
         "http://localhost:8000/api/auth/2fa/setup",
-        { user_id: userId, token },
-        {
-          headers: token ? {
-            Authorization: `Bearer ${token}`
-          } : {}
-        }
+        {},
+        { headers: { Authorization: `Bearer ${token}` } }
       )
 
       setQrCode(response.data.qr_code_base64)
@@ -189,29 +171,14 @@ export function TwoFactorSetup() {
 
     try {
       const token = localStorage.getItem("authToken")
-      const userInfo = localStorage.getItem("userInfo")
-      let user: any = null
-      
-      try {
-        user = userInfo ? JSON.parse(userInfo) : null
-      } catch (e) {
-        console.error("Error parsing user info:", e)
-      }
-      
-      const userId = user?.email || localStorage.getItem("userId")
-      
-      if (!userId) {
-        throw new Error("User ID not found")
+      if (!token) {
+        throw new Error("Not signed in")
       }
 
       const response = await axios.post(
         "http://localhost:8000/api/auth/2fa/verify",
-        { code: verificationCode, user_id: userId, token },
-        {
-          headers: token ? {
-            Authorization: `Bearer ${token}`
-          } : {}
-        }
+        { code: verificationCode },
+        { headers: { Authorization: `Bearer ${token}` } }
       )
 
       if (response.data.is_valid) {
@@ -249,25 +216,14 @@ export function TwoFactorSetup() {
 
     try {
       const token = localStorage.getItem("authToken")
-      const userInfo = localStorage.getItem("userInfo")
-      let user: any = null
-      
-      try {
-        user = userInfo ? JSON.parse(userInfo) : null
-      } catch (e) {
-        console.error("Error parsing user info:", e)
+      if (!token) {
+        throw new Error("Not signed in")
       }
-      
-      const userId = user?.email || localStorage.getItem("userId")
 
       await axios.post(
         "http://localhost:8000/api/auth/2fa/disable",
-        { user_id: userId, token },
-        {
-          headers: token ? {
-            Authorization: `Bearer ${token}`
-          } : {}
-        }
+        {},
+        { headers: { Authorization: `Bearer ${token}` } }
       )
 
       setIsEnabled(false)
@@ -174,6 +174,26 @@ export async function disconnectIntegration(provider: string, userId: string, or
   }
 }
 
+export interface SyncJob {
+  id: string;
+  status: 'queued' | 'running' | 'succeeded' | 'failed';
+  items: number;
+  error?: string;
+  result?: { items: number; lastSync: string };
+}
+
+export async function getSyncJob(jobId: string): Promise<SyncJob> {
+  const response = await fetchWithAuth(`/api/integrations/jobs/${jobId}`);
+  if (!response?.ok) {
+    throw new Error('Failed to get sync job');
+  }
+  return await response.json();
+}
+
+// Longest syncIntegrationData waits for a sync job before giving up
+const SYNC_JOB_TIMEOUT_MS = 10 * 60 * 1000;
+
+// Syncs run as background jobs; resolves once the job has finished
 export async function syncIntegrationData(provider: string, userId: string, orgId?: string): Promise<void> {
   const response = await fetchWithAuth(`/api/integrations/${provider}/sync`, {
     method: 'POST',
@@ -182,6 +202,21 @@ export async function syncIntegrationData(provider: string, userId: string, orgI
   if (!response?.ok) {
     throw new Error('Failed to sync integration data');
   }
+  const { jobId } = await response.json();
+  const deadline = Date.now() + SYNC_JOB_TIMEOUT_MS;
+  for (;;) {
+    if (Date.now() > deadline) {
+      throw new Error('Sync is taking longer than expected; check back later');
+    }
+    const job = await getSyncJob(jobId);
+    if (job.status === 'succeeded') {
+      return;
+    }
+    if (job.status === 'failed') {
+      throw new Error(job.error || 'Failed to sync integration data');
+    }
+    await new Promise((resolve) => setTimeout(resolve, 1000));
+  }
 }
 
 // Integration-specific methods
@@ -19,6 +19,7 @@ export default function LoginPage() {
   const [password, setPassword] = useState("")
   const [isLoading, setIsLoading] = useState(false)
   const [needsTwoFactor, setNeedsTwoFactor] = useState(false)
+  const [preAuthToken, setPreAuthToken] = useState("")
   const router = useRouter()
   const { toast } = useToast()
 
@@ -62,6 +63,7 @@ export default function LoginPage() {
 
       // Check if 2FA is required
       if (data.requires_2fa) {
+        setPreAuthToken(data.pre_auth_token)
         setNeedsTwoFactor(true)
         toast({
           title: "Verification required",
@@ -99,9 +101,8 @@ export default function LoginPage() {
     const returnUrl = localStorage.getItem("returnUrl")
     localStorage.removeItem("returnUrl") // Clean up
 
-    // Get user ID from email and hash it
-    const userId = user.email.split('@')[0]
-    const hashedId = hashUserId(userId)
+    // The dashboard is keyed by the session's user id (the full email)
+    const hashedId = hashUserId(user.email)
 
     // Force navigation to dashboard with replace to prevent back navigation
     const dashboardUrl = `/dashboard/${hashedId}`
@@ -121,6 +122,7 @@ export default function LoginPage() {
 
   const handleTwoFactorCancel = () => {
     setNeedsTwoFactor(false)
+    setPreAuthToken("")
     setPassword("")
   }
 
@@ -128,7 +130,7 @@ export default function LoginPage() {
     <div className="flex min-h-screen items-center justify-center px-4 py-12">
       {needsTwoFactor ? (
         <TwoFactorVerification 
-          email={email} 
+          preAuthToken={preAuthToken} 
           onVerified={handleTwoFactorVerified} 
           onCancel={handleTwoFactorCancel} 
         />
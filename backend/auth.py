@@ -0,0 +1,232 @@
+"""Request authentication: one token format, one dependency.
+
+Access tokens are HS256 JWTs signed with JWT_SECRET_KEY. Verifying one only
+needs the secret, so the common case costs no network round trip:
+``authenticate`` decodes the token once, then serves its session from a
+bounded in-process TTL cache. Revocations (logout, password reset) are
+written to Redis and broadcast over pub/sub. Every worker applies them to
+its own cache, and a worker that missed a message finds the Redis record
+the next time it decodes the token.
+"""
+import asyncio
+import json
+import logging
+import os
+import secrets
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional, Tuple
+import jwt
+from fastapi import Depends, HTTPException
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from dotenv import load_dotenv
+from redis_client import redis_client, execute_redis
+from metrics import CACHE_REQUESTS
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+JWT_SECRET = os.getenv('JWT_SECRET_KEY', os.getenv('JWT_SECRET', 'your-jwt-secret-key'))
+JWT_ALGORITHM = 'HS256'
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv('ACCESS_TOKEN_EXPIRE_MINUTES', '60'))
+# Verified sessions kept per process, and the longest any is trusted
+# without being decoded again
+SESSION_CACHE_SIZE = int(os.getenv('SESSION_CACHE_SIZE', '10000'))
+SESSION_CACHE_TTL = float(os.getenv('SESSION_CACHE_TTL', '300'))
+# A correct password on a 2FA account earns a short-lived pre-auth token
+# instead of a session; only the 2FA login accepts it
+PRE_AUTH_SCOPE = "2fa"
+PRE_AUTH_EXPIRE_MINUTES = int(os.getenv('PRE_AUTH_EXPIRE_MINUTES', '5'))
+
+REVOCATION_CHANNEL = "auth:revocations"
+
+security = HTTPBearer(auto_error=False)
+
+def _unauthorized(detail: str) -> HTTPException:
+    return HTTPException(status_code=401, detail=detail, headers={"WWW-Authenticate": "Bearer"})
+
+def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta] = None) -> str:
+    """Sign an access token for ``data`` (which should include ``sub``)."""
+    now = datetime.now(timezone.utc)
+    payload = dict(data)
+    payload.setdefault("email", payload.get("sub"))
+    # Sub-second precision so a login right after a password reset is not
+    # caught by that reset's revocation
+    payload["iat"] = now.timestamp()
+    payload["exp"] = now + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
+    payload["jti"] = secrets.token_urlsafe(16)
+    return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
+
+def create_pre_auth_token(sub: str) -> str:
+    """Sign a token proving ``sub`` passed the password check, pending 2FA."""
+    return create_access_token({"sub": sub, "scope": PRE_AUTH_SCOPE},
+                               timedelta(minutes=PRE_AUTH_EXPIRE_MINUTES))
+
+class SessionCache:
+    """Bounded LRU of verified sessions with per-entry expiry, plus the
+    revocations this process has heard about."""
+
+    def __init__(self, size: int = SESSION_CACHE_SIZE, ttl: float = SESSION_CACHE_TTL):
+        self.size = size
+        self.ttl = ttl
+        self._sessions: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        # jti -> token expiry, and sub -> tokens issued before this are revoked
+        self.revoked_tokens: Dict[str, float] = {}
+        self.revoked_before: Dict[str, float] = {}
+
+    def is_revoked(self, session: Dict[str, Any]) -> bool:
+        if session.get("jti") in self.revoked_tokens:
+            return True
+        cutoff = self.revoked_before.get(session.get("sub"))
+        return cutoff is not None and session.get("iat", 0) <= cutoff
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        entry = self._sessions.get(token)
+        if entry is None:
+            return None
+        expires, session = entry
+        if time.time() >= expires or self.is_revoked(session):
+            del self._sessions[token]
+            return None
+        self._sessions.move_to_end(token)
+        return session
+
+    def put(self, token: str, session: Dict[str, Any]):
+        expires = min(time.time() + self.ttl, session["exp"])
+        self._sessions[token] = (expires, session)
+        self._sessions.move_to_end(token)
+        while len(self._sessions) > self.size:
+            self._sessions.popitem(last=False)
+
+    def apply(self, message: Dict[str, Any]):
+        """Record one revocation and evict the sessions it covers."""
+        now = time.time()
+        if message.get("jti"):
+            self.revoked_tokens[message["jti"]] = float(message.get("exp") or now + self.ttl)
+        if message.get("sub"):
+            self.revoked_before[message["sub"]] = float(message["before"])
+        # Expired tokens are rejected anyway, so their revocations can go
+        self.revoked_tokens = {jti: exp for jti, exp in self.revoked_tokens.items() if exp > now}
+        for token, (_, session) in list(self._sessions.items()):
+            if self.is_revoked(session):
+                del self._sessions[token]
+
+sessions = SessionCache()
+
+def _revoked_token_key(jti: str) -> str:
+    return f"auth:revoked:{jti}"
+
+def _revoked_before_key(sub: str) -> str:
+    return f"auth:revoked_before:{sub}"
+
+async def _load_revocations(session: Dict[str, Any]):
+    """Pick up revocations this process may have missed (one MGET per decode)."""
+    jti, sub = session.get("jti"), session.get("sub")
+    try:
+        revoked, before = await execute_redis(
+            "mget", redis_client.mget, _revoked_token_key(jti or ""), _revoked_before_key(sub or "")
+        )
+    except HTTPException:
+        # Fail open: the signature and expiry have been checked, and the
+        # broadcast still reaches this process once Redis is back
+        return
+    if revoked and jti:
+        sessions.apply({"jti": jti, "exp": session["exp"]})
+    if before and sub:
+        sessions.apply({"sub": sub, "before": before})
+
+def _decode(token: str) -> Dict[str, Any]:
+    try:
+        payload = jwt.decode(
+            token, JWT_SECRET, algorithms=[JWT_ALGORITHM], options={"require": ["exp"]}
+        )
+    except jwt.ExpiredSignatureError:
+        raise _unauthorized("Token has expired")
+    except jwt.InvalidTokenError:
+        raise _unauthorized("Invalid token")
+    payload["email"] = payload.get("email") or payload.get("sub")
+    return payload
+
+def _check_scope(session: Dict[str, Any], scope: Optional[str]) -> Dict[str, Any]:
+    if session.get("scope") != scope:
+        raise _unauthorized("Invalid token")
+    return session
+
+async def authenticate(token: str, scope: Optional[str] = None) -> Dict[str, Any]:
+    """Return the session for ``token`` or raise 401.
+
+    Sessions are unscoped; a scoped token (e.g. ``PRE_AUTH_SCOPE``) is only
+    accepted when the caller asks for that scope.
+    """
+    session = sessions.get(token)
+    if session is not None:
+        CACHE_REQUESTS.inc("session", "hit")
+        return _check_scope(session, scope)
+    CACHE_REQUESTS.inc("session", "miss")
+    session = _decode(token)
+    await _load_revocations(session)
+    if sessions.is_revoked(session):
+        raise _unauthorized("Token has been revoked")
+    sessions.put(token, session)
+    return _check_scope(session, scope)
+
+async def get_current_user(credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)) -> Dict[str, Any]:
+    """FastAPI dependency: the authenticated session, or 401."""
+    if not credentials:
+        raise _unauthorized("Not authenticated")
+    return await authenticate(credentials.credentials)
+
+async def _publish(message: Dict[str, Any], key: str, value: str, ttl: int):
+    sessions.apply(message)
+    pipe = redis_client.pipeline(transaction=True)
+    pipe.set(key, value, ex=max(1, ttl))
+    pipe.publish(REVOCATION_CHANNEL, json.dumps(message))
+    await execute_redis("revoke", pipe.execute)
+
+async def revoke_token(token: str):
+    """Revoke one access token (logout) in every worker."""
+    session = _decode(token)
+    ttl = int(session["exp"] - time.time()) + 1
+    await _publish({"jti": session["jti"], "exp": session["exp"]},
+                   _revoked_token_key(session["jti"]), "1", ttl)
+
+async def revoke_user_sessions(sub: str):
+    """Revoke every token issued to ``sub`` so far (e.g. after a password reset)."""
+    before = time.time()
+    await _publish({"sub": sub, "before": before}, _revoked_before_key(sub), str(before),
+                   ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
+async def _listen():
+    while True:
+        pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.subscribe(REVOCATION_CHANNEL)
+            async for message in pubsub.listen():
+                try:
+                    sessions.apply(json.loads(message["data"]))
+                except (TypeError, ValueError, KeyError) as e:
+                    logger.warning("Ignoring malformed revocation: %s", e)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("Revocation listener error: %s", e)
+            await asyncio.sleep(1)
+        finally:
+            await pubsub.aclose()
+
+_listener: Optional[asyncio.Task] = None
+
+def start_revocation_listener():
+    """Subscribe to revocation broadcasts (called on app startup)."""
+    global _listener
+    if _listener is None:
+        _listener = asyncio.create_task(_listen())
+
+async def stop_revocation_listener():
+    global _listener
+    if _listener is not None:
+        _listener.cancel()
+        await asyncio.gather(_listener, return_exceptions=True)
+        _listener = None
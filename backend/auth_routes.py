@@ -1,14 +1,12 @@
 from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
 from typing import Optional
-from cassandra_client import CassandraClient
-import os
-import jwt
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from cassandra_client import CassandraClient, get_cassandra
+from fastapi.security import HTTPAuthorizationCredentials
+from auth import create_pre_auth_token, get_current_user, revoke_token, revoke_user_sessions, security
+from two_factor_auth import is_2fa_enabled
 
 router = APIRouter()
-security = HTTPBearer()
-cassandra = CassandraClient()
 
 class UserCreate(BaseModel):
     email: str
@@ -26,7 +24,7 @@ class PasswordUpdate(BaseModel):
     new_password: str
 
 @router.post("/signup")
-async def signup(user: UserCreate):
+async def signup(user: UserCreate, cassandra: CassandraClient = Depends(get_cassandra)):
     try:
         user_id = await cassandra.create_user(user.email, user.password)
         # After successful creation, immediately log them in
@@ -47,9 +45,18 @@ async def signup(user: UserCreate):
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @router.post("/login")
-async def login(user: UserLogin):
+async def login(user: UserLogin, cassandra: CassandraClient = Depends(get_cassandra)):
     try:
         auth_data = await cassandra.verify_user(user.email, user.password)
+        if await is_2fa_enabled(user.email, cassandra):
+            # No session until the code checks out at /2fa/login
+            return {
+                "requires_2fa": True,
+                "pre_auth_token": create_pre_auth_token(user.email),
+                "user": {
+                    "email": user.email
+                }
+            }
         # Include user information in response
         return {
             **auth_data,
@@ -63,7 +70,7 @@ async def login(user: UserLogin):
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @router.post("/forgot-password")
-async def forgot_password(reset_request: PasswordReset):
+async def forgot_password(reset_request: PasswordReset, cassandra: CassandraClient = Depends(get_cassandra)):
     try:
         token = await cassandra.create_password_reset_token(reset_request.email)
         # In a real application, you would send this token via email
@@ -74,24 +81,19 @@ async def forgot_password(reset_request: PasswordReset):
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @router.post("/reset-password")
-async def reset_password(password_update: PasswordUpdate):
+async def reset_password(password_update: PasswordUpdate, cassandra: CassandraClient = Depends(get_cassandra)):
     try:
-        success = await cassandra.reset_password(password_update.token, password_update.new_password)
-        return {"message": "Password reset successful"}
+        email = await cassandra.reset_password(password_update.token, password_update.new_password)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail="Internal server error")
+    # Sessions issued under the old password stop working everywhere
+    await revoke_user_sessions(email)
+    return {"message": "Password reset successful"}
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    try:
-        payload = jwt.decode(
-            credentials.credentials,
-            os.getenv('JWT_SECRET', 'your-secret-key'),
-            algorithms=['HS256']
-        )
-        return payload
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(status_code=401, detail="Token has expired")
-    except jwt.JWTError:
-        raise HTTPException(status_code=401, detail="Invalid token")
+@router.post("/logout")
+async def logout(credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
+                 user: dict = Depends(get_current_user)):
+    await revoke_token(credentials.credentials)
+    return {"message": "Logged out"}
@@ -0,0 +1,143 @@
+"""Requests/sec on a plain route under uvicorn, old vs new middleware stack.
+
+Run from the backend directory:
+
+    python benchmarks/asgi_middleware.py --concurrency 50 --duration 10
+
+Each mode serves ``GET /`` from its own uvicorn process (one worker, stdout
+and stderr discarded, uvicorn's own access log off). The "before" mode
+reproduces the old stack: the ``@app.middleware("http")`` request logger
+that printed twice per request plus ``AuthMiddleware`` on
+``BaseHTTPMiddleware`` (which let ``/`` through). The "after" mode installs
+``middleware.setup_middleware`` with auth required. The load generator
+speaks keep-alive HTTP/1.1 over raw asyncio streams so the client is not the
+bottleneck.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import socket
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI, Request  # noqa: E402
+from starlette.middleware.base import BaseHTTPMiddleware  # noqa: E402
+
+from middleware import setup_middleware  # noqa: E402
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class OldAuthMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        if any(request.url.path.startswith(path) for path in ("/auth/google/callback", "/")):
+            return await call_next(request)
+        raise AssertionError("benchmark only requests excluded paths")
+
+def plain_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get('/')
+    def read_root():
+        return {'Ping': 'Pong'}
+
+    return app
+
+before_app = plain_app()
+before_app.add_middleware(OldAuthMiddleware)
+
+@before_app.middleware("http")
+async def log_requests(request: Request, call_next):
+    print(f"\nRequest: {request.method} {request.url}")
+    response = await call_next(request)
+    print(f"Response: {response.status_code}")
+    return response
+
+after_app = plain_app()
+setup_middleware(after_app, require_auth=True)
+# The access log runs (and formats) as it would in production
+logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+
+REQUEST = b"GET / HTTP/1.1\r\nHost: bench\r\n\r\n"
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+async def wait_until_listening(port: int, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.1)
+            continue
+        writer.close()
+        await writer.wait_closed()
+        return
+
+async def request_loop(port: int, stop: asyncio.Event, counts: list, index: int):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        while not stop.is_set():
+            writer.write(REQUEST)
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = 0
+            for line in head.split(b"\r\n"):
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":", 1)[1])
+            await reader.readexactly(length)
+            counts[index] += 1
+    finally:
+        writer.close()
+
+async def load(port: int, concurrency: int, duration: float) -> float:
+    await wait_until_listening(port)
+    stop = asyncio.Event()
+    counts = [0] * concurrency
+    # Warm up before measuring
+    warmup = asyncio.create_task(request_loop(port, stop, [0], 0))
+    await asyncio.sleep(0.5)
+    stop.set()
+    await warmup
+    stop.clear()
+
+    workers = [asyncio.create_task(request_loop(port, stop, counts, i)) for i in range(concurrency)]
+    started = time.perf_counter()
+    await asyncio.sleep(duration)
+    stop.set()
+    await asyncio.gather(*workers)
+    return sum(counts) / (time.perf_counter() - started)
+
+def serve(app_name: str, port: int) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", f"benchmarks.asgi_middleware:{app_name}",
+         "--port", str(port), "--no-access-log", "--log-level", "warning"],
+        cwd=BACKEND_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=10.0)
+    args = parser.parse_args()
+
+    for label, app_name in (("before (BaseHTTPMiddleware + print)", "before_app"),
+                            ("after (pure ASGI)", "after_app")):
+        port = free_port()
+        server = serve(app_name, port)
+        try:
+            rps = asyncio.run(load(port, args.concurrency, args.duration))
+        finally:
+            server.terminate()
+            server.wait()
+        print(f"{label:36s} {rps:10.0f} req/s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Per-query latency of raw CQL strings vs registry prepared statements.
+
+Run from the backend directory:
+
+    python benchmarks/cassandra_prepared.py --iterations 5000
+    python benchmarks/cassandra_prepared.py --driver real   # needs ``python init_db.py``
+
+Both modes issue the same point read on ``users`` through
+CassandraClient.execute, so metrics and tracing overhead is the same. The raw
+mode sends a simple statement that the coordinator has to parse every time
+and that the driver cannot route by token; the prepared mode names the
+registry's ``user_by_email`` statement.
+
+By default this runs against benchmarks/simulated_cassandra.py, whose
+per-operation costs are printed with the results.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cassandra_client  # noqa: E402
+import simulated_cassandra  # noqa: E402
+
+RAW_QUERY = "SELECT email, password_hash, created_at FROM users WHERE email = %s"
+
+def timed(fn, iterations: int):
+    samples = []
+    for i in range(iterations):
+        started = time.perf_counter()
+        fn(f"bench-{i % 100}@example.com")
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return statistics.mean(samples), samples[len(samples) // 2], samples[int(len(samples) * 0.99)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=5000)
+    simulated_cassandra.add_arguments(parser)
+    args = parser.parse_args()
+
+    if args.driver == "simulated":
+        costs = simulated_cassandra.costs_from(args)
+        simulated_cassandra.install(cassandra_client, costs)
+        print(costs.describe())
+
+    client = cassandra_client.CassandraClient()
+    try:
+        modes = (
+            ("raw CQL string", lambda email: client.execute(RAW_QUERY, (email,))),
+            ("prepared (registry)", lambda email: client.execute("user_by_email", (email,))),
+        )
+        for label, fn in modes:
+            timed(fn, min(500, args.iterations))  # warm-up
+            mean, p50, p99 = timed(fn, args.iterations)
+            print(f"{label:22s} mean {mean:6.3f} ms   p50 {p50:6.3f} ms   p99 {p99:6.3f} ms")
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+    main()
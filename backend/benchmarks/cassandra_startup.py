@@ -0,0 +1,147 @@
+"""Worker startup cost: one CassandraClient per router vs one shared client.
+
+Run from the backend directory:
+
+    python benchmarks/cassandra_startup.py --clients 5
+    python benchmarks/cassandra_startup.py --driver real   # CASSANDRA_HOST/PORT
+
+"before" runs the per-router initialisation that importing auth_routes,
+twofa_routes and routes/{dashboard,profiles,integrations} used to do: each
+module built a LegacyCassandraClient (the old CassandraClient.__init__,
+reproduced below) with its own Cluster, CREATE KEYSPACE, set_keyspace and
+three CREATE TABLE IF NOT EXISTS. "after" calls init_cassandra() once, which
+is what the lifespan does now: one Cluster, a schema version read and the
+statement registry's prepares.
+
+By default both run against benchmarks/simulated_cassandra.py, whose
+per-operation costs are printed with the results; the schema already exists,
+as it does on every worker restart after the first deploy. Open sockets are
+counted from /proc/self/fd, so this is Linux only.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cassandra_client  # noqa: E402
+from cassandra.cluster import ExecutionProfile, EXEC_PROFILE_DEFAULT  # noqa: E402
+from cassandra.policies import DCAwareRoundRobinPolicy, TokenAwarePolicy  # noqa: E402
+import simulated_cassandra  # noqa: E402
+
+class LegacyCassandraClient:
+    """CassandraClient.__init__ as it was before the client was shared."""
+
+    def __init__(self):
+        self.host = os.getenv('CASSANDRA_HOST', 'localhost')
+        self.port = int(os.getenv('CASSANDRA_PORT', '9042'))
+        self.keyspace = os.getenv('CASSANDRA_KEYSPACE', 'vectorshift')
+
+        profile = ExecutionProfile(
+            load_balancing_policy=TokenAwarePolicy(DCAwareRoundRobinPolicy()),
+            request_timeout=60
+        )
+        # Looked up at call time so --driver simulated applies here too
+        self.cluster = cassandra_client.Cluster(
+            contact_points=[self.host],
+            port=self.port,
+            execution_profiles={EXEC_PROFILE_DEFAULT: profile},
+            protocol_version=4
+        )
+        self.session = self.cluster.connect()
+        self.session.execute(f"""
+            CREATE KEYSPACE IF NOT EXISTS {self.keyspace}
+            WITH replication = {{
+                'class': 'SimpleStrategy',
+                'replication_factor': 1
+            }}
+        """)
+        self.session.set_keyspace(self.keyspace)
+        self._init_tables()
+
+    def _init_tables(self):
+        self.session.execute("""
+            CREATE TABLE IF NOT EXISTS users (
+                id text PRIMARY KEY,
+                email text,
+                password_hash text,
+                created_at timestamp,
+                updated_at timestamp
+            )
+        """)
+        self.session.execute("""
+            CREATE TABLE IF NOT EXISTS user_profiles (
+                user_id text PRIMARY KEY,
+                full_name text,
+                avatar_url text,
+                company text,
+                job_title text,
+                timezone text,
+                preferences map<text, text>,
+                updated_at timestamp
+            )
+        """)
+        self.session.execute("""
+            CREATE TABLE IF NOT EXISTS user_integrations (
+                user_id text,
+                provider text,
+                org_id text,
+                status text,
+                last_sync timestamp,
+                PRIMARY KEY ((user_id, provider))
+            )
+        """)
+
+    def close(self):
+        if not self.cluster.is_shutdown:
+            self.cluster.shutdown()
+
+def open_sockets() -> int:
+    count = 0
+    for fd in os.listdir('/proc/self/fd'):
+        try:
+            if os.readlink(f'/proc/self/fd/{fd}').startswith('socket:'):
+                count += 1
+        except OSError:
+            continue
+    return count
+
+def measure(label: str, build, server=None):
+    counts = dict(server.counts) if server else None
+    baseline = open_sockets()
+    started = time.perf_counter()
+    clients = build()
+    elapsed = time.perf_counter() - started
+    sockets = open_sockets() - baseline
+    line = f"{label:36s} startup {elapsed * 1000:9.1f} ms   sockets {sockets:4d}"
+    if server:
+        sent = {key: server.counts[key] - counts[key] for key in ("ddl", "prepares", "queries")}
+        line += "   " + "  ".join(f"{key} {value}" for key, value in sent.items())
+    print(line)
+    for client in clients:
+        client.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=5,
+                        help="number of router modules that used to build their own client")
+    parser.add_argument("--repeat", type=int, default=3)
+    simulated_cassandra.add_arguments(parser)
+    args = parser.parse_args()
+
+    server = None
+    if args.driver == "simulated":
+        costs = simulated_cassandra.costs_from(args)
+        server = simulated_cassandra.install(cassandra_client, costs)
+        print(costs.describe())
+
+    for _ in range(args.repeat):
+        measure(f"before ({args.clients} x per-router init)",
+                lambda: [LegacyCassandraClient() for _ in range(args.clients)], server)
+        measure("after (shared init_cassandra)",
+                lambda: [cassandra_client.init_cassandra()], server)
+        cassandra_client.shutdown_cassandra()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Memory per IntegrationItem and items serialized per second.
+
+Run from the backend directory:
+
+    python benchmarks/integration_item.py --count 1000000
+
+The "before" mode reproduces the old model: a plain class whose instances
+carry a ``__dict__`` plus fresh ``children``/``properties``/``metadata``
+containers, serialized the way FastAPI did it (``jsonable_encoder`` then
+``json.dumps``). The "after" mode uses the slotted ``IntegrationItem`` and
+``encode_items``. Memory is measured with tracemalloc while the whole batch
+is alive.
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+
+from integrations import integration_item  # noqa: E402
+from integrations.integration_item import IntegrationItem, encode_items, FIELDS  # noqa: E402
+
+class DictItem:
+    def __init__(self, **kwargs):
+        for field in FIELDS:
+            setattr(self, field, kwargs.get(field))
+        self.directory = kwargs.get('directory', False)
+        self.visibility = kwargs.get('visibility', True)
+        self.children = kwargs.get('children') or []
+        self.properties = kwargs.get('properties') or {}
+        self.metadata = kwargs.get('metadata') or {}
+
+def item_kwargs(i: int) -> dict:
+    return {
+        'id': f'{i:032x}',
+        'type': 'contact',
+        'name': f'Contact {i}',
+        'email': f'contact{i}@example.com',
+        'company': 'Example Inc',
+        'last_modified_time': '2025-03-12T12:00:00.000Z',
+        'source': 'hubspot',
+    }
+
+def build(cls, count: int):
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+    items = [cls(**item_kwargs(i)) for i in range(count)]
+    built = time.perf_counter() - started
+    used = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    return items, used, built
+
+def before_encode(items) -> bytes:
+    return json.dumps(jsonable_encoder(items)).encode('utf-8')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=1_000_000)
+    parser.add_argument("--skip-before", action="store_true",
+                        help="only measure the current model (jsonable_encoder is slow)")
+    args = parser.parse_args()
+
+    encoder = 'orjson' if integration_item.orjson is not None else 'json'
+    modes = [("after (__slots__, " + encoder + ")", IntegrationItem, encode_items)]
+    if not args.skip_before:
+        modes.insert(0, ("before (__dict__, jsonable_encoder)", DictItem, before_encode))
+
+    for label, cls, encode in modes:
+        items, used, built = build(cls, args.count)
+        started = time.perf_counter()
+        payload = encode(items)
+        elapsed = time.perf_counter() - started
+        print(f"{label:38s} {used / args.count:7.0f} B/item   "
+              f"build {args.count / built:10.0f} items/s   "
+              f"encode {args.count / elapsed:10.0f} items/s   "
+              f"{len(payload) / 1e6:8.1f} MB JSON")
+        del items, payload
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Throughput of concurrent get_value_redis callers, blocking vs asyncio client.
+
+Needs a reachable Redis (REDIS_HOST/REDIS_PORT). Run from the backend directory:
+
+    python benchmarks/redis_get_value.py --concurrency 200 --duration 5
+
+The "before" mode reproduces the old helper: an ``async def`` that calls the
+synchronous ``redis.Redis`` client. The "after" mode calls the current
+``redis_client.get_value_redis``. Besides requests/sec the script reports the
+worst event-loop stall seen by a 1ms ticker, which is what every other
+in-flight request pays while a blocking call holds the loop.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import redis  # noqa: E402
+
+import redis_client  # noqa: E402
+
+KEY = "bench:get_value_redis"
+
+sync_client = redis.Redis(
+    host=redis_client.REDIS_HOST,
+    port=redis_client.REDIS_PORT,
+    db=redis_client.REDIS_DB,
+    password=redis_client.REDIS_PASSWORD,
+    decode_responses=True,
+)
+
+async def blocking_get_value(key: str):
+    # Old behaviour: PING + GET on the synchronous client inside a coroutine.
+    sync_client.ping()
+    return sync_client.get(key)
+
+async def measure_loop_lag(stop: asyncio.Event, samples: list):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.001)
+        samples.append(time.perf_counter() - start - 0.001)
+
+async def run(getter, concurrency: int, duration: float):
+    stop = asyncio.Event()
+    lag_samples = []
+    counts = [0] * concurrency
+
+    async def worker(index: int):
+        while not stop.is_set():
+            await getter(KEY)
+            counts[index] += 1
+
+    lag_task = asyncio.create_task(measure_loop_lag(stop, lag_samples))
+    workers = [asyncio.create_task(worker(i)) for i in range(concurrency)]
+    started = time.perf_counter()
+    await asyncio.sleep(duration)
+    stop.set()
+    await asyncio.gather(*workers, lag_task)
+    elapsed = time.perf_counter() - started
+    return sum(counts) / elapsed, max(lag_samples or [0.0])
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=5.0)
+    args = parser.parse_args()
+
+    sync_client.set(KEY, "x" * 256)
+    try:
+        for label, getter in (("before (sync redis.Redis)", blocking_get_value),
+                              ("after (redis.asyncio)", redis_client.get_value_redis)):
+            rps, worst_lag = await run(getter, args.concurrency, args.duration)
+            print(f"{label:28s} {rps:10.0f} req/s   worst loop stall {worst_lag * 1000:7.2f} ms")
+    finally:
+        sync_client.delete(KEY)
+        await redis_client.close_redis()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,199 @@
+"""A simulated Cassandra driver for the Cassandra benchmarks.
+
+``SimulatedCluster`` stands in for ``cassandra.cluster.Cluster`` when no
+cluster is reachable. Every operation costs a fixed amount of time, spent in a
+busy wait so sub-millisecond costs stay accurate, and every connection holds a
+real socket, so timings and /proc/self/fd socket counts come out of the same
+code paths a real cluster would exercise. The costs are assumptions and are
+printed with each run (``describe``); pass ``--driver real`` to a benchmark
+to measure an actual cluster instead.
+
+The model:
+
+* ``connect`` opens a control connection (handshake plus topology and schema
+  metadata) and one pooled connection to each node, as the driver does for
+  protocol v3+.
+* An unprepared statement is parsed by the coordinator on every execution
+  and, because the driver cannot compute its token, lands on a random node;
+  when that node is not a replica the read takes one more hop.
+* A prepared statement is parsed once, at prepare time, and is routed to a
+  replica (token-aware).
+* DDL that changes the schema also waits for schema agreement. ``IF NOT
+  EXISTS`` on an object that already exists does not.
+"""
+import random
+import re
+import socket
+import time
+from collections import namedtuple
+from dataclasses import dataclass, fields
+from typing import Optional
+
+DDL = re.compile(r"\s*(CREATE|ALTER|DROP)\s+(KEYSPACE|TABLE)\s+(IF\s+NOT\s+EXISTS\s+)?([\w.]+)", re.I)
+
+Row = namedtuple("Row", "version email password_hash created_at")
+
+@dataclass
+class Costs:
+    """Seconds per simulated operation, and the cluster's shape."""
+    rtt: float = 0.0005
+    parse: float = 0.0002
+    control_connect: float = 0.015
+    pool_connect: float = 0.002
+    schema_agreement: float = 0.05
+    nodes: int = 6
+    replication_factor: int = 3
+
+    def describe(self) -> str:
+        parts = []
+        for field in fields(self):
+            value = getattr(self, field.name)
+            parts.append(f"{field.name}={value * 1000:g}ms" if isinstance(value, float)
+                         else f"{field.name}={value}")
+        return "simulated driver: " + ", ".join(parts)
+
+def spin(seconds: float):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+class SimulatedServer:
+    """Cluster-side state shared by every SimulatedCluster: the schema objects
+    that exist, and counters of what the clients sent."""
+
+    def __init__(self, costs: Costs, existing_schema: bool = True):
+        self.costs = costs
+        self.existing_schema = existing_schema
+        self.schema = set()
+        self.counts = {"connections": 0, "ddl": 0, "schema_changes": 0, "prepares": 0, "queries": 0}
+
+    def ddl(self, name: str, if_not_exists: bool):
+        self.counts["ddl"] += 1
+        spin(self.costs.rtt + self.costs.parse)
+        if (self.existing_schema or name in self.schema) and if_not_exists:
+            return
+        self.schema.add(name)
+        self.counts["schema_changes"] += 1
+        spin(self.costs.schema_agreement)
+
+    def query(self, prepared: bool):
+        self.counts["queries"] += 1
+        costs = self.costs
+        cost = costs.rtt
+        if not prepared:
+            cost += costs.parse
+            if random.randrange(costs.nodes) >= costs.replication_factor:
+                # The coordinator is not a replica and forwards the read
+                cost += costs.rtt
+        spin(cost)
+
+class SimulatedPrepared:
+    def __init__(self, query: str):
+        self.query_string = query
+
+    def bind(self, values=()):
+        return SimulatedBound(self, tuple(values or ()))
+
+class SimulatedBound:
+    def __init__(self, prepared: SimulatedPrepared, values: tuple):
+        self.prepared_statement = prepared
+        self.values = values
+        self.fetch_size = None
+
+class SimulatedResult(list):
+    paging_state = None
+    was_applied = True
+
+    @property
+    def current_rows(self):
+        return list(self)
+
+    def one(self):
+        return self[0] if self else None
+
+class SimulatedSession:
+    def __init__(self, cluster: "SimulatedCluster", keyspace: Optional[str]):
+        self.cluster = cluster
+        self.server = cluster.server
+        self.keyspace = keyspace
+
+    def set_keyspace(self, keyspace: str):
+        spin(self.server.costs.rtt)
+        self.keyspace = keyspace
+
+    def prepare(self, query: str) -> SimulatedPrepared:
+        # Prepared on every node (the driver's prepare_on_all_hosts), in parallel
+        self.server.counts["prepares"] += 1
+        spin(self.server.costs.rtt + self.server.costs.parse)
+        return SimulatedPrepared(query)
+
+    def execute(self, query, parameters=None, *args, **kwargs) -> SimulatedResult:
+        if isinstance(query, SimulatedBound):
+            text, prepared = query.prepared_statement.query_string, True
+        elif isinstance(query, SimulatedPrepared):
+            text, prepared = query.query_string, True
+        else:
+            text, prepared = getattr(query, "query_string", query), False
+        ddl = DDL.match(text)
+        if ddl:
+            self.server.ddl(f"{self.keyspace}.{ddl.group(4)}".lower(), bool(ddl.group(3)))
+            return SimulatedResult()
+        self.server.query(prepared)
+        if "schema_version" in text:
+            from migrations import LATEST_VERSION
+            return SimulatedResult([Row(LATEST_VERSION, None, None, None)])
+        return SimulatedResult([Row(None, "bench@example.com", "x", None)])
+
+class SimulatedCluster:
+    """Drop-in for ``cassandra.cluster.Cluster`` backed by ``server``."""
+
+    server: SimulatedServer = None
+
+    def __init__(self, *args, **kwargs):
+        self.is_shutdown = False
+        self._sockets = []
+
+    def _open(self, cost: float):
+        # One real socket per connection, so fd counts match a real driver
+        ours, theirs = socket.socketpair()
+        theirs.close()
+        self._sockets.append(ours)
+        self.server.counts["connections"] += 1
+        spin(cost)
+
+    def connect(self, keyspace: Optional[str] = None) -> SimulatedSession:
+        costs = self.server.costs
+        self._open(costs.control_connect)
+        for _ in range(costs.nodes):
+            self._open(costs.pool_connect)
+        session = SimulatedSession(self, None)
+        if keyspace:
+            session.set_keyspace(keyspace)
+        return session
+
+    def shutdown(self):
+        for sock in self._sockets:
+            sock.close()
+        self._sockets.clear()
+        self.is_shutdown = True
+
+def install(cassandra_client_module, costs: Costs, existing_schema: bool = True) -> SimulatedServer:
+    """Point ``cassandra_client.Cluster`` at a fresh simulated cluster."""
+    server = SimulatedServer(costs, existing_schema)
+    SimulatedCluster.server = server
+    cassandra_client_module.Cluster = SimulatedCluster
+    return server
+
+def add_arguments(parser):
+    """--driver plus the simulated costs most worth varying."""
+    defaults = Costs()
+    parser.add_argument("--driver", choices=("simulated", "real"), default="simulated",
+                        help="simulated (default) or a reachable cluster at CASSANDRA_HOST/PORT")
+    parser.add_argument("--rtt-ms", type=float, default=defaults.rtt * 1000)
+    parser.add_argument("--parse-ms", type=float, default=defaults.parse * 1000)
+    parser.add_argument("--nodes", type=int, default=defaults.nodes)
+    parser.add_argument("--replication-factor", type=int, default=defaults.replication_factor)
+
+def costs_from(args) -> Costs:
+    return Costs(rtt=args.rtt_ms / 1000, parse=args.parse_ms / 1000, nodes=args.nodes,
+                 replication_factor=args.replication_factor)
@@ -1,11 +1,46 @@
 from cassandra.cluster import Cluster, ExecutionProfile, EXEC_PROFILE_DEFAULT
 from cassandra.policies import DCAwareRoundRobinPolicy, TokenAwarePolicy
 from cassandra.auth import PlainTextAuthProvider
+from cassandra import InvalidRequest
+from cassandra.query import UNSET_VALUE, SimpleStatement, BatchStatement, BatchType
+from fastapi import HTTPException
+from typing import Optional, Dict, Any, List, AsyncIterator, Tuple
+from datetime import datetime, timedelta, timezone
+import asyncio
+import base64
+import hashlib
+import logging
 import os
+import secrets
+import time
+import bcrypt
 from dotenv import load_dotenv
+from auth import create_access_token, authenticate
+from migrations import get_schema_version, LATEST_VERSION
+from cassandra_statements import StatementRegistry
+from metrics import CASSANDRA_QUERY_SECONDS
+from tracing import child_span
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+RESET_TOKEN_TTL = int(os.getenv('RESET_TOKEN_TTL', '3600'))
+# Upper bound on in-flight async queries per process
+CASSANDRA_MAX_CONCURRENCY = int(os.getenv('CASSANDRA_MAX_CONCURRENCY', '128'))
+DEFAULT_FETCH_SIZE = int(os.getenv('CASSANDRA_FETCH_SIZE', '500'))
+
+# Profile API fields (camelCase) -> user_profiles columns
+PROFILE_FIELDS = {
+    "fullName": "full_name",
+    "displayName": "display_name",
+    "avatarUrl": "avatar_url",
+    "company": "company",
+    "jobTitle": "job_title",
+    "timezone": "timezone",
+    "preferences": "preferences",
+}
+
 class CassandraClient:
     def __init__(self):
         self.host = os.getenv('CASSANDRA_HOST', 'localhost')
@@ -26,78 +61,320 @@ class CassandraClient:
             protocol_version=4
         )
         
-        # Create session
-        self.session = self.cluster.connect()
-        
-        # Create keyspace if it doesn't exist
-        self.session.execute(f"""
-            CREATE KEYSPACE IF NOT EXISTS {self.keyspace}
-            WITH replication = {{
-                'class': 'SimpleStrategy',
-                'replication_factor': 1
-            }}
-        """)
-        
-        # Set keyspace
-        self.session.set_keyspace(self.keyspace)
-        
-        # Initialize tables
-        self._init_tables()
-    
-    def _init_tables(self):
-        """Initialize required tables."""
-        # Users table
-        self.session.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                id text PRIMARY KEY,
-                email text,
-                password_hash text,
-                created_at timestamp,
-                updated_at timestamp
-            )
-        """)
-        
-        # User profiles table
-        self.session.execute("""
-            CREATE TABLE IF NOT EXISTS user_profiles (
-                user_id text PRIMARY KEY,
-                full_name text,
-                avatar_url text,
-                company text,
-                job_title text,
-                timezone text,
-                preferences map<text, text>,
-                updated_at timestamp
-            )
-        """)
-        
-        # User integrations table
-        self.session.execute("""
-            CREATE TABLE IF NOT EXISTS user_integrations (
-                user_id text,
-                provider text,
-                org_id text,
-                status text,
-                last_sync timestamp,
-                PRIMARY KEY ((user_id, provider))
+        # Create session bound to the keyspace created by the migration runner
+        try:
+            self.session = self.cluster.connect(self.keyspace)
+        except Exception:
+            self.cluster.shutdown()
+            raise
+
+        # Schema changes are applied by init_db.py, never here
+        self._verify_schema()
+
+        # Prepare every query once for this session
+        self.statements = StatementRegistry(self.session)
+        self.statements.prepare_all()
+
+        self._query_slots = asyncio.Semaphore(CASSANDRA_MAX_CONCURRENCY)
+
+    def _verify_schema(self):
+        """Check the applied schema version with a single-row read."""
+        try:
+            version = get_schema_version(self.session)
+        except InvalidRequest as e:
+            self.cluster.shutdown()
+            raise RuntimeError(
+                f"Keyspace {self.keyspace} has no schema version table; run `python init_db.py`"
+            ) from e
+        if version < LATEST_VERSION:
+            self.cluster.shutdown()
+            raise RuntimeError(
+                f"Database schema is at version {version}, expected {LATEST_VERSION}; "
+                "run `python init_db.py`"
             )
-        """)
-    
+        self.schema_version = version
+
     def execute(self, query, values=None):
-        """Execute a CQL query."""
+        """Execute a CQL query.
+
+        ``query`` may be the name of a statement in the registry, in which
+        case the prepared statement is bound to ``values``.
+        """
+        label = self._query_label(query)
+        if query in self.statements.queries:
+            query = self.statements.get(query)
+        started = time.perf_counter()
         try:
-            if values:
-                return self.session.execute(query, values)
-            return self.session.execute(query)
+            with child_span(f"cassandra {label}"):
+                if values:
+                    result = self.session.execute(query, values)
+                else:
+                    result = self.session.execute(query)
         except Exception as e:
-            print(f"Error executing query: {str(e)}")
+            CASSANDRA_QUERY_SECONDS.observe(time.perf_counter() - started, label, "error")
+            logger.error("Error executing query: %s", e)
             raise
-    
+        CASSANDRA_QUERY_SECONDS.observe(time.perf_counter() - started, label, "ok")
+        return result
+
+    def _query_label(self, query) -> str:
+        """Metric label for a query: its registry name, "batch" or "cql"."""
+        if isinstance(query, str):
+            return query if query in self.statements.queries else "cql"
+        return "batch" if isinstance(query, BatchStatement) else "cql"
+
+    def _statement(self, query, values=None, fetch_size: Optional[int] = None):
+        """Resolve a registry name or CQL string to a statement and its parameters."""
+        if query in self.statements.queries:
+            bound = self.statements.get(query).bind(values or ())
+            if fetch_size:
+                bound.fetch_size = fetch_size
+            return bound, None
+        if fetch_size:
+            query = SimpleStatement(query, fetch_size=fetch_size)
+        return query, values or None
+
+    async def execute_async(self, query, values=None, fetch_size: Optional[int] = None,
+                            paging_state: Optional[bytes] = None):
+        """Awaitable ``execute``: runs the query on the driver's I/O thread.
+
+        Returns the first page as a ResultSet. Use ``fetch_page`` or
+        ``iterate`` for multi-page results; iterating the returned ResultSet
+        past its first page would block on the next fetch.
+        """
+        label = self._query_label(query)
+        statement, parameters = self._statement(query, values, fetch_size)
+        async with self._query_slots:
+            started = time.perf_counter()
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+
+            def on_success(_rows):
+                loop.call_soon_threadsafe(_resolve, future, response_future.result)
+
+            def on_error(exc):
+                loop.call_soon_threadsafe(_reject, future, exc)
+
+            response_future = self.session.execute_async(
+                statement, parameters, paging_state=paging_state
+            )
+            response_future.add_callbacks(on_success, on_error)
+            try:
+                with child_span(f"cassandra {label}"):
+                    result = await future
+            except asyncio.CancelledError:
+                response_future.cancel()
+                raise
+            except Exception as e:
+                CASSANDRA_QUERY_SECONDS.observe(time.perf_counter() - started, label, "error")
+                logger.error("Error executing query: %s", e)
+                raise
+            CASSANDRA_QUERY_SECONDS.observe(time.perf_counter() - started, label, "ok")
+            return result
+
+    async def execute_batch(self, query: str, rows: List[tuple]):
+        """Apply a registered statement to many rows in one UNLOGGED batch.
+
+        Only batch rows of a single partition: the coordinator then applies
+        them as one mutation instead of fanning out to other replicas.
+        """
+        batch = BatchStatement(batch_type=BatchType.UNLOGGED)
+        statement = self.statements.get(query)
+        for values in rows:
+            batch.add(statement, values)
+        return await self.execute_async(batch)
+
+    async def fetch_page(self, query, values=None, fetch_size: int = DEFAULT_FETCH_SIZE,
+                         paging_state: Optional[bytes] = None) -> Tuple[List[Any], Optional[bytes]]:
+        """Fetch one page of rows and the paging state for the next one (None when done)."""
+        result = await self.execute_async(query, values, fetch_size, paging_state)
+        return list(result.current_rows), result.paging_state
+
+    async def iterate(self, query, values=None, fetch_size: int = DEFAULT_FETCH_SIZE) -> AsyncIterator[Any]:
+        """Yield every row of a query, fetching one page at a time."""
+        paging_state = None
+        while True:
+            rows, paging_state = await self.fetch_page(query, values, fetch_size, paging_state)
+            for row in rows:
+                yield row
+            if not paging_state:
+                break
+
+    # Tokens
+
+    def _create_access_token(self, data: Dict[str, Any], expires_delta: Optional[timedelta] = None) -> str:
+        """Create a signed JWT access token (see ``auth.create_access_token``)."""
+        return create_access_token(data, expires_delta)
+
+    async def verify_token(self, token: str) -> Optional[Dict[str, Any]]:
+        """Decode an access token and return its user data, or None."""
+        try:
+            return await authenticate(token)
+        except HTTPException:
+            return None
+
+    @staticmethod
+    def hash_user_id(user_id: str) -> str:
+        """Short stable hash used in dashboard URLs (matches app/lib/hash-utils.ts)."""
+        return hashlib.sha256(user_id.encode('utf-8')).hexdigest()[:12]
+
+    # Users
+
+    async def create_user(self, email: str, password: str) -> str:
+        """Create a user and return its id (users are keyed by email)."""
+        password_hash = await asyncio.to_thread(_hash_password, password)
+        result = await self.execute_async("user_insert", (email, password_hash, datetime.now(timezone.utc)))
+        if not result.was_applied:
+            raise ValueError("User already exists")
+        return email
+
+    async def verify_user(self, email: str, password: str) -> Dict[str, Any]:
+        """Check a password and return a fresh access token."""
+        row = (await self.execute_async("user_by_email", (email,))).one()
+        if not row or not row.password_hash:
+            raise ValueError("Invalid email or password")
+        if not await asyncio.to_thread(_check_password, password, row.password_hash):
+            raise ValueError("Invalid email or password")
+        token = self._create_access_token({"sub": email, "email": email})
+        return {"token": token, "token_type": "bearer"}
+
+    async def get_user_by_id(self, user_id: str) -> Optional[Dict[str, Any]]:
+        row = (await self.execute_async("user_by_email", (user_id,))).one()
+        if not row:
+            return None
+        return {"id": row.email, "email": row.email, "created_at": row.created_at}
+
+    # Password reset
+
+    async def create_password_reset_token(self, email: str) -> str:
+        """Create a single-use reset token that expires after RESET_TOKEN_TTL seconds.
+
+        The token embeds the email so the reset lookup hits a single partition.
+        """
+        if not (await self.execute_async("user_by_email", (email,))).one():
+            raise ValueError("User not found")
+        encoded_email = base64.urlsafe_b64encode(email.encode('utf-8')).decode('ascii').rstrip('=')
+        token = f"{encoded_email}.{secrets.token_urlsafe(32)}"
+        await self.execute_async("reset_token_insert", (email, token, datetime.now(timezone.utc), RESET_TOKEN_TTL))
+        return token
+
+    async def reset_password(self, token: str, new_password: str) -> str:
+        """Set a new password and return the email the reset token belongs to."""
+        try:
+            encoded_email = token.split('.', 1)[0]
+            padding = '=' * (-len(encoded_email) % 4)
+            email = base64.urlsafe_b64decode(encoded_email + padding).decode('utf-8')
+        except (ValueError, UnicodeDecodeError):
+            raise ValueError("Invalid or expired reset token")
+        if not (await self.execute_async("reset_token_select", (email, token))).one():
+            raise ValueError("Invalid or expired reset token")
+        password_hash = await asyncio.to_thread(_hash_password, new_password)
+        await self.execute_async("user_update_password", (password_hash, email))
+        await self.execute_async("reset_tokens_delete", (email,))
+        return email
+
+    # Profiles
+
+    async def get_user_profile(self, email: str) -> Optional[Dict[str, Any]]:
+        row = (await self.execute_async("profile_by_email", (email,))).one()
+        if not row:
+            return None
+        profile = {"email": row.email}
+        for field, column in PROFILE_FIELDS.items():
+            profile[field] = getattr(row, column)
+        profile["preferences"] = dict(row.preferences or {})
+        profile["updatedAt"] = row.updated_at.isoformat() if row.updated_at else None
+        return profile
+
+    async def create_user_profile(self, email: str) -> bool:
+        await self.execute_async("profile_insert", (
+            email, "", "", "", "", "", "UTC", {}, datetime.now(timezone.utc)
+        ))
+        return True
+
+    async def update_user_profile(self, email: str, updates: Dict[str, Any]) -> bool:
+        values = [
+            updates[field] if field in updates else UNSET_VALUE
+            for field in PROFILE_FIELDS
+        ]
+        await self.execute_async("profile_update", (*values, datetime.now(timezone.utc), email))
+        return True
+
+    # Integrations
+
+    async def get_user_integrations(self, user_id: str) -> List[Dict[str, Any]]:
+        rows = self.iterate("integrations_by_user", (user_id,))
+        return [
+            {
+                "name": row.provider,
+                "provider": row.provider,
+                "org_id": row.org_id,
+                "status": row.status,
+                "last_sync": row.last_sync,
+                "workspace_count": int((row.settings or {}).get("workspace_count", 0)),
+            }
+            async for row in rows
+        ]
+
+    # Two-factor secrets
+
+    async def store_2fa_secret(self, user_id: str, secret: str) -> bool:
+        await self.execute_async("2fa_secret_insert", (user_id, secret, datetime.now(timezone.utc)))
+        return True
+
+    async def get_2fa_secret(self, user_id: str) -> Optional[str]:
+        row = (await self.execute_async("2fa_secret_select", (user_id,))).one()
+        return row.secret if row else None
+
+    async def remove_2fa_secret(self, user_id: str) -> bool:
+        await self.execute_async("2fa_secret_delete", (user_id,))
+        return True
+
     def close(self):
         """Close cluster connection."""
-        if self.cluster:
+        if self.cluster and not self.cluster.is_shutdown:
             self.cluster.shutdown()
     
     def __del__(self):
         """Cleanup on deletion."""
         self.close()
+
+def _resolve(future: asyncio.Future, get_result):
+    if not future.done():
+        try:
+            future.set_result(get_result())
+        except Exception as e:
+            future.set_exception(e)
+
+def _reject(future: asyncio.Future, exc: BaseException):
+    if not future.done():
+        future.set_exception(exc)
+
+def _hash_password(password: str) -> str:
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+
+def _check_password(password: str, password_hash: str) -> bool:
+    return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+
+# Process-wide client, created once by the FastAPI lifespan in main.py
+_client: Optional[CassandraClient] = None
+
+def init_cassandra() -> CassandraClient:
+    """Create the shared client (one Cluster and one session per process)."""
+    global _client
+    if _client is None:
+        _client = CassandraClient()
+    return _client
+
+def get_cassandra() -> CassandraClient:
+    """FastAPI dependency returning the shared client."""
+    if _client is None:
+        raise HTTPException(status_code=503, detail="Database is not initialized")
+    return _client
+
+def shutdown_cassandra():
+    """Shut down the shared cluster (called on app shutdown)."""
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
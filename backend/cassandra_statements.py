@@ -0,0 +1,120 @@
+import threading
+from typing import Dict
+
+# Every CQL statement the routes issue, keyed by name. Statements are prepared
+# once per session, so Cassandra parses each only once and the driver can
+# route by partition key (TokenAwarePolicy).
+QUERIES: Dict[str, str] = {
+    # Users
+    "user_by_email": "SELECT email, password_hash, created_at FROM users WHERE email = ?",
+    "user_insert": (
+        "INSERT INTO users (email, password_hash, created_at) VALUES (?, ?, ?) IF NOT EXISTS"
+    ),
+    "user_update_password": "UPDATE users SET password_hash = ? WHERE email = ?",
+
+    # Password reset tokens
+    "reset_token_insert": (
+        "INSERT INTO password_reset_tokens (user_email, reset_token, created_at) "
+        "VALUES (?, ?, ?) USING TTL ?"
+    ),
+    "reset_token_select": (
+        "SELECT created_at FROM password_reset_tokens WHERE user_email = ? AND reset_token = ?"
+    ),
+    "reset_tokens_delete": "DELETE FROM password_reset_tokens WHERE user_email = ?",
+
+    # Profiles
+    "profile_by_email": (
+        "SELECT email, full_name, display_name, avatar_url, company, job_title, "
+        "timezone, preferences, updated_at FROM user_profiles WHERE email = ?"
+    ),
+    "profile_insert": (
+        "INSERT INTO user_profiles (email, full_name, display_name, avatar_url, company, "
+        "job_title, timezone, preferences, updated_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) IF NOT EXISTS"
+    ),
+    # Unchanged columns are bound as UNSET_VALUE so they keep their value
+    "profile_update": (
+        "UPDATE user_profiles SET full_name = ?, display_name = ?, avatar_url = ?, "
+        "company = ?, job_title = ?, timezone = ?, preferences = ?, updated_at = ? "
+        "WHERE email = ?"
+    ),
+
+    # Integrations
+    "integrations_by_user": (
+        "SELECT provider, org_id, status, last_sync, settings "
+        "FROM user_integrations WHERE user_id = ?"
+    ),
+    "integration_by_provider": (
+        "SELECT org_id, status, last_sync, settings "
+        "FROM user_integrations WHERE user_id = ? AND provider = ?"
+    ),
+    # settings carries workspace_count and the delta-sync watermark
+    "integration_synced": (
+        "UPDATE user_integrations SET org_id = ?, status = ?, last_sync = ?, "
+        "settings = settings + ? WHERE user_id = ? AND provider = ?"
+    ),
+    "integration_status_update": (
+        "UPDATE user_integrations SET status = ? WHERE user_id = ? AND provider = ?"
+    ),
+
+    # Synced integration items, one partition per (user, provider)
+    # Appending to metadata (rather than overwriting it) avoids writing a
+    # collection tombstone on every sync; unchanged columns are UNSET.
+    "item_upsert": (
+        "UPDATE integration_items SET name = ?, item_type = ?, url = ?, creation_time = ?, "
+        "last_modified_time = ?, parent_id = ?, metadata = metadata + ? "
+        "WHERE user_id = ? AND provider = ? AND item_id = ?"
+    ),
+    "items_by_owner": (
+        "SELECT item_id, name, item_type, url, creation_time, last_modified_time, "
+        "parent_id, metadata FROM integration_items WHERE user_id = ? AND provider = ?"
+    ),
+    "item_ids_by_owner": (
+        "SELECT item_id FROM integration_items WHERE user_id = ? AND provider = ?"
+    ),
+    # Which of a batch's item ids are already stored (a keyed read, not a scan)
+    "item_ids_stored": (
+        "SELECT item_id FROM integration_items "
+        "WHERE user_id = ? AND provider = ? AND item_id IN ?"
+    ),
+    "item_delete": (
+        "DELETE FROM integration_items WHERE user_id = ? AND provider = ? AND item_id = ?"
+    ),
+    "items_delete_all": "DELETE FROM integration_items WHERE user_id = ? AND provider = ?",
+
+    # Two-factor secrets
+    "2fa_secret_select": "SELECT secret FROM user_2fa_secrets WHERE user_id = ?",
+    "2fa_secret_insert": (
+        "INSERT INTO user_2fa_secrets (user_id, secret, created_at) VALUES (?, ?, ?)"
+    ),
+    "2fa_secret_delete": "DELETE FROM user_2fa_secrets WHERE user_id = ?",
+}
+
+class StatementRegistry:
+    """Prepares each named query at most once per session and hands back the
+    cached PreparedStatement afterwards."""
+
+    def __init__(self, session, queries: Dict[str, str] = QUERIES):
+        self.session = session
+        self.queries = queries
+        self._prepared = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str):
+        statement = self._prepared.get(name)
+        if statement is not None:
+            return statement
+        with self._lock:
+            statement = self._prepared.get(name)
+            if statement is None:
+                statement = self.session.prepare(self.queries[name])
+                self._prepared[name] = statement
+            return statement
+
+    def prepare_all(self):
+        """Prepare every registered query up front (done once at startup)."""
+        for name in self.queries:
+            self.get(name)
+
+    def __len__(self):
+        return len(self._prepared)
@@ -0,0 +1,234 @@
+"""Synced integration items in Cassandra.
+
+``/sync`` streams provider items through ``sync_items``, which upserts them
+into ``integration_items`` in batches while they are sent to the client.
+``/status`` then reads them back with ``stored_items`` or ``stored_page``
+without contacting the provider.
+"""
+import asyncio
+import base64
+import json
+import os
+from contextlib import aclosing
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Optional, Dict, Any, List, Tuple
+from cassandra.query import UNSET_VALUE
+from cassandra_client import CassandraClient
+from integrations.integration_item import IntegrationItem, FIELDS, dumps
+
+# Items per UNLOGGED batch; every batch targets one partition
+ITEM_BATCH_SIZE = int(os.getenv('ITEM_BATCH_SIZE', '25'))
+# Batches written concurrently while a sync is streaming
+ITEM_WRITE_CONCURRENCY = int(os.getenv('ITEM_WRITE_CONCURRENCY', '4'))
+# Seconds between full syncs; syncs in between only fetch changes. Full
+# syncs also remove items deleted at the provider.
+SYNC_FULL_INTERVAL = float(os.getenv('SYNC_FULL_INTERVAL', '86400'))
+# Seconds a delta sync reaches back before the previous sync started, to
+# cover clock skew and provider indexing delay
+SYNC_WATERMARK_OVERLAP = float(os.getenv('SYNC_WATERMARK_OVERLAP', '300'))
+
+# Item fields with their own column; everything else set on an item is kept
+# JSON-encoded in the metadata map
+COLUMN_FIELDS = ('id', 'name', 'type', 'url', 'creation_time', 'last_modified_time', 'parent_id')
+METADATA_FIELDS = tuple(field for field in FIELDS if field not in COLUMN_FIELDS)
+
+def _timestamp(value) -> Optional[datetime]:
+    """Provider timestamps arrive as ISO-8601 strings, epoch seconds or datetimes."""
+    if value is None or value == '':
+        return None
+    if isinstance(value, datetime):
+        return value
+    try:
+        if isinstance(value, (int, float)):
+            return datetime.fromtimestamp(value, timezone.utc)
+        return datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except (ValueError, OverflowError, OSError):
+        return None
+
+def format_timestamp(value: Optional[datetime]) -> Optional[str]:
+    """ISO-8601 UTC with a Z suffix (the driver returns naive UTC datetimes)."""
+    if value is None:
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.isoformat(timespec='milliseconds') + 'Z'
+
+def _set(value):
+    # Binding None would write a tombstone; UNSET leaves the cell alone
+    return UNSET_VALUE if value is None else value
+
+def _item_row(user_id: str, provider: str, item: IntegrationItem) -> tuple:
+    metadata = {}
+    for field in METADATA_FIELDS:
+        value = getattr(item, field)
+        if value is not None and value != [] and value != {}:
+            metadata[field] = dumps(value).decode('utf-8')
+    return (
+        _set(item.name), _set(item.type), _set(item.url),
+        _set(_timestamp(item.creation_time)), _set(_timestamp(item.last_modified_time)),
+        _set(item.parent_id), metadata,
+        user_id, provider, str(item.id),
+    )
+
+def _row_item(row) -> IntegrationItem:
+    extra = {}
+    for field, value in (row.metadata or {}).items():
+        if field in METADATA_FIELDS:
+            try:
+                extra[field] = json.loads(value)
+            except ValueError:
+                continue
+    return IntegrationItem(
+        id=row.item_id,
+        type=row.item_type,
+        name=row.name,
+        url=row.url,
+        creation_time=format_timestamp(row.creation_time),
+        last_modified_time=format_timestamp(row.last_modified_time),
+        parent_id=row.parent_id,
+        **extra,
+    )
+
+async def get_integration(cassandra: CassandraClient, user_id: str, provider: str) -> Optional[Dict[str, Any]]:
+    """The user_integrations row for one provider, or None if it never synced."""
+    row = (await cassandra.execute_async("integration_by_provider", (user_id, provider))).one()
+    if row is None:
+        return None
+    settings = row.settings or {}
+    return {
+        "org_id": row.org_id,
+        "status": row.status,
+        "last_sync": format_timestamp(row.last_sync),
+        "workspace_count": int(settings.get("workspace_count", 0)),
+        "watermark": _timestamp(settings.get("watermark")),
+        "full_sync_at": _timestamp(settings.get("full_sync_at")),
+    }
+
+def delta_since(integration: Optional[Dict[str, Any]], now: Optional[datetime] = None) -> Optional[datetime]:
+    """Modification time a delta sync should start from, or None for a full sync.
+
+    A full sync is due when the integration never synced successfully or
+    the last full sync is older than SYNC_FULL_INTERVAL.
+    """
+    if not integration or not integration.get("watermark") or not integration.get("full_sync_at"):
+        return None
+    now = now or datetime.now(timezone.utc)
+    if (now - integration["full_sync_at"]).total_seconds() >= SYNC_FULL_INTERVAL:
+        return None
+    return integration["watermark"] - timedelta(seconds=SYNC_WATERMARK_OVERLAP)
+
+async def set_integration_status(cassandra: CassandraClient, user_id: str, provider: str, status: str):
+    await cassandra.execute_async("integration_status_update", (status, user_id, provider))
+
+async def stored_items(cassandra: CassandraClient, user_id: str, provider: str) -> AsyncIterator[IntegrationItem]:
+    """Yield every stored item for a user and provider, one Cassandra page at a time."""
+    async for row in cassandra.iterate("items_by_owner", (user_id, provider)):
+        yield _row_item(row)
+
+async def stored_page(cassandra: CassandraClient, user_id: str, provider: str, page_size: int,
+                      page_token: Optional[str] = None) -> Tuple[List[IntegrationItem], Optional[str]]:
+    """One page of stored items and an opaque token for the next page (None on the last)."""
+    paging_state = base64.urlsafe_b64decode(page_token) if page_token else None
+    rows, paging_state = await cassandra.fetch_page(
+        "items_by_owner", (user_id, provider), page_size, paging_state
+    )
+    next_token = base64.urlsafe_b64encode(paging_state).decode('ascii') if paging_state else None
+    return [_row_item(row) for row in rows], next_token
+
+async def delete_items(cassandra: CassandraClient, user_id: str, provider: str):
+    """Drop every stored item for a user and provider (a single partition delete)."""
+    await cassandra.execute_async("items_delete_all", (user_id, provider))
+
+async def _prune(cassandra: CassandraClient, user_id: str, provider: str, seen: set):
+    """Delete stored items the provider no longer returned."""
+    stale = []
+    async for row in cassandra.iterate("item_ids_by_owner", (user_id, provider)):
+        if row.item_id not in seen:
+            stale.append((user_id, provider, row.item_id))
+    for start in range(0, len(stale), ITEM_BATCH_SIZE):
+        await cassandra.execute_batch("item_delete", stale[start:start + ITEM_BATCH_SIZE])
+
+async def _count_new(cassandra: CassandraClient, user_id: str, provider: str, item_ids: List[str]) -> int:
+    """How many of ``item_ids`` (at most one batch) are not stored yet."""
+    if not item_ids:
+        return 0
+    result = await cassandra.execute_async("item_ids_stored", (user_id, provider, item_ids))
+    return len(item_ids) - len(result.current_rows)
+
+async def sync_items(cassandra: CassandraClient, user_id: str, org_id: str, provider: str,
+                     items: AsyncIterator[IntegrationItem],
+                     synced_at: Optional[datetime] = None,
+                     full: bool = True) -> AsyncIterator[IntegrationItem]:
+    """Pass provider items through while upserting them into integration_items.
+
+    Items are written in single-partition UNLOGGED batches, with up to
+    ITEM_WRITE_CONCURRENCY batches in flight, so storing them does not hold
+    up the response. Once the crawl completes the user_integrations row
+    records the sync and ``synced_at`` becomes the next delta watermark. A
+    full crawl (``full``) also deletes items the provider no longer
+    returned and counts what it saw; a delta crawl only merges the changed
+    items it was given, and adds the ones not stored before (looked up by
+    key, batch by batch) to the previous count. A failed crawl marks the
+    integration as errored and keeps the old items.
+    """
+    synced_at = synced_at or datetime.now(timezone.utc)
+    seen = set()
+    batch = []
+    # Ids first seen in this crawl, per batch; only delta crawls look them up
+    batch_ids = []
+    pending = set()
+    added = 0
+
+    async def write(rows, item_ids) -> int:
+        # Look the ids up before the upsert stores them
+        new = 0 if full else await _count_new(cassandra, user_id, provider, item_ids)
+        await cassandra.execute_batch("item_upsert", rows)
+        return new
+
+    async def flush():
+        nonlocal batch, batch_ids, added
+        if not batch:
+            return
+        rows, item_ids, batch, batch_ids = batch, batch_ids, [], []
+        pending.add(asyncio.create_task(write(rows, item_ids)))
+        if len(pending) >= ITEM_WRITE_CONCURRENCY:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            pending.difference_update(done)
+            for task in done:
+                added += task.result()
+
+    try:
+        async with aclosing(items):
+            async for item in items:
+                item_id = str(item.id)
+                if item_id not in seen:
+                    seen.add(item_id)
+                    batch_ids.append(item_id)
+                batch.append(_item_row(user_id, provider, item))
+                if len(batch) >= ITEM_BATCH_SIZE:
+                    await flush()
+                yield item
+        await flush()
+        if pending:
+            added += sum(await asyncio.gather(*pending))
+            pending.clear()
+        settings = {"watermark": synced_at.isoformat()}
+        if full:
+            await _prune(cassandra, user_id, provider, seen)
+            settings["workspace_count"] = str(len(seen))
+            settings["full_sync_at"] = synced_at.isoformat()
+        else:
+            # A delta crawl never removes items, so the count only grows
+            previous = await get_integration(cassandra, user_id, provider)
+            stored = previous["workspace_count"] if previous else 0
+            settings["workspace_count"] = str(stored + added)
+        await cassandra.execute_async(
+            "integration_synced",
+            (org_id, "active", synced_at, settings, user_id, provider),
+        )
+    except Exception:
+        await set_integration_status(cassandra, user_id, provider, "error")
+        raise
+    finally:
+        for task in pending:
+            task.cancel()
@@ -1,12 +1,16 @@
+import base64
+import hashlib
 import json
 import secrets
 import os
 from fastapi import Request, HTTPException
 from fastapi.responses import HTMLResponse
-import httpx
+from integrations.http_clients import get_client
 import asyncio
+from typing import AsyncIterator
 from dotenv import load_dotenv
 from integrations.integration_item import IntegrationItem
+from integrations.pagination import flat_map, collect
 from redis_client import add_key_value_redis, get_value_redis, delete_key_redis
 
 load_dotenv()
@@ -18,15 +22,27 @@ AUTHORIZATION_URL = 'https://airtable.com/oauth2/v1/authorize'
 TOKEN_URL = 'https://airtable.com/oauth2/v1/token'
 API_URL = 'https://api.airtable.com/v0/meta'
 
+# Table listings run for this many bases at a time; the client keeps them
+# within Airtable's 5 requests per second
+TABLE_CONCURRENCY = 5
+
+def _code_challenge(code_verifier: str) -> str:
+    """PKCE S256 challenge for ``code_verifier`` (RFC 7636)."""
+    digest = hashlib.sha256(code_verifier.encode('ascii')).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b'=').decode('ascii')
+
 async def authorize_airtable(user_id, org_id):
     state = secrets.token_urlsafe(32)
+    # Airtable requires PKCE; the verifier stays server-side with the state
+    code_verifier = secrets.token_urlsafe(64)
     state_data = {
         'state': state,
         'user_id': user_id,
-        'org_id': org_id
+        'org_id': org_id,
+        'code_verifier': code_verifier,
     }
     encoded_state = json.dumps(state_data)
-    await add_key_value_redis(f'airtable_state:{org_id}:{user_id}', encoded_state, expire=600)
+    await add_key_value_redis(f'airtable_state:{state}', encoded_state, expire=600)
     
     scopes = [
         'data.records:read',
@@ -42,6 +58,8 @@ async def authorize_airtable(user_id, org_id):
         f'&response_type=code'
         f'&state={state}'
         f'&scope={" ".join(scopes)}'
+        f'&code_challenge={_code_challenge(code_verifier)}'
+        f'&code_challenge_method=S256'
     )
     return auth_url
 
@@ -54,47 +72,47 @@ async def oauth2callback_airtable(request: Request):
     
     code = request.query_params.get('code')
     state = request.query_params.get('state')
-    
-    try:
-        state_data = json.loads(state)
-    except (json.JSONDecodeError, TypeError):
-        raise HTTPException(status_code=400, detail='Invalid state parameter')
+    if not state or not code:
+        raise HTTPException(status_code=400, detail='Missing required parameters')
 
+    saved_state = await get_value_redis(f'airtable_state:{state}')
+    if not saved_state:
+        raise HTTPException(status_code=400, detail='Invalid or expired state')
+
+    state_data = json.loads(saved_state)
     user_id = state_data.get('user_id')
     org_id = state_data.get('org_id')
 
-    saved_state = await get_value_redis(f'airtable_state:{org_id}:{user_id}')
-    if not saved_state or state != json.loads(saved_state).get('state'):
-        raise HTTPException(status_code=400, detail='State mismatch')
-
-    async with httpx.AsyncClient() as client:
-        response, _ = await asyncio.gather(
-            client.post(
-                TOKEN_URL,
-                data={
-                    'grant_type': 'authorization_code',
-                    'code': code,
-                    'redirect_uri': REDIRECT_URI,
-                    'client_id': CLIENT_ID,
-                    'client_secret': CLIENT_SECRET
-                }
-            ),
-            delete_key_redis(f'airtable_state:{org_id}:{user_id}')
-        )
+    client = get_client('airtable')
+    # The state is single-use: drop it while the code is exchanged
+    response, _ = await asyncio.gather(
+        client.post(
+            TOKEN_URL,
+            data={
+                'grant_type': 'authorization_code',
+                'code': code,
+                'redirect_uri': REDIRECT_URI,
+                'client_id': CLIENT_ID,
+                'client_secret': CLIENT_SECRET,
+                'code_verifier': state_data.get('code_verifier'),
+            }
+        ),
+        delete_key_redis(f'airtable_state:{state}')
+    )
 
-        if response.status_code != 200:
-            raise HTTPException(
-                status_code=response.status_code,
-                detail='Failed to obtain access token'
-            )
-
-        token_data = response.json()
-        await add_key_value_redis(
-            f'airtable_credentials:{org_id}:{user_id}',
-            json.dumps(token_data),
-            expire=token_data.get('expires_in', 7200)
+    if response.status_code != 200:
+        raise HTTPException(
+            status_code=response.status_code,
+            detail='Failed to obtain access token'
         )
-    
+
+    token_data = response.json()
+    await add_key_value_redis(
+        f'airtable_credentials:{org_id}:{user_id}',
+        json.dumps(token_data),
+        expire=token_data.get('expires_in', 7200)
+    )
+
     return HTMLResponse(content="""
         <html>
             <head><title>Airtable Connection Successful</title></head>
@@ -120,61 +138,85 @@ async def get_airtable_credentials(user_id, org_id):
     credentials = await get_value_redis(f'airtable_credentials:{org_id}:{user_id}')
     if not credentials:
         raise HTTPException(status_code=400, detail='No credentials found')
-    
-    credentials_data = json.loads(credentials)
-    await delete_key_redis(f'airtable_credentials:{org_id}:{user_id}')
-    return credentials_data
+    return json.loads(credentials)
 
-async def get_items_airtable(credentials) -> list[IntegrationItem]:
-    """Get list of bases and tables from Airtable"""
+async def _airtable_get(url: str, access_token: str, params: dict = None) -> dict:
+    """GET a metadata endpoint (the shared client enforces the per-token rate limit)."""
+    client = get_client('airtable')
+    response = await client.get(url, headers={'Authorization': f'Bearer {access_token}'}, params=params)
+    if response.status_code != 200:
+        raise HTTPException(
+            status_code=response.status_code,
+            detail=f'Failed to fetch Airtable {url.rsplit("/", 1)[-1]}'
+        )
+    return response.json()
+
+async def _bases(access_token: str) -> AsyncIterator[dict]:
+    """Follow the offset token through every page of /meta/bases."""
+    params = {}
+    while True:
+        data = await _airtable_get(f'{API_URL}/bases', access_token, params)
+        for base in data.get('bases', []):
+            yield base
+        if not data.get('offset'):
+            break
+        params['offset'] = data['offset']
+
+async def _base_and_tables(access_token: str, base: dict) -> AsyncIterator[IntegrationItem]:
+    base_id = base.get('id')
+
+    # Add base as an item
+    yield IntegrationItem(
+        id=base_id,
+        type='base',
+        name=base.get('name', 'Untitled Base'),
+        url=f"https://airtable.com/{base_id}",
+        creation_time=base.get('createdTime'),
+        last_modified_time=base.get('modifiedTime'),
+        permissions=base.get('permissionLevel')
+    )
+
+    # Add each table in the base
+    data = await _airtable_get(f'{API_URL}/bases/{base_id}/tables', access_token)
+    for table in data.get('tables', []):
+        yield IntegrationItem(
+            id=f"{base_id}/{table.get('id')}",
+            type='table',
+            name=table.get('name', 'Untitled Table'),
+            url=f"https://airtable.com/{base_id}/{table.get('id')}",
+            creation_time=table.get('createdTime'),
+            last_modified_time=table.get('modifiedTime'),
+            parent_id=base_id
+        )
+
+async def stream_items_airtable(credentials, since=None) -> AsyncIterator[IntegrationItem]:
+    """Yield Airtable bases and their tables as they arrive.
+
+    Table listings for different bases are fetched concurrently (at most
+    TABLE_CONCURRENCY at once) while every call shares the per-token rate
+    limit, so total time tracks the rate limit rather than round trips.
+
+    The metadata API reports no modification times for bases or tables, so
+    there is nothing to filter a delta on: ``since`` is accepted for
+    interface parity and ignored, and every Airtable sync is a full sync
+    (``PROVIDER_MAP`` marks Airtable as not supporting deltas).
+    """
     try:
-        creds = json.loads(credentials)
+        creds = json.loads(credentials) if isinstance(credentials, str) else credentials
     except json.JSONDecodeError:
         raise HTTPException(status_code=400, detail='Invalid credentials format')
-    
+
     access_token = creds.get('access_token')
     if not access_token:
         raise HTTPException(status_code=400, detail='Missing access token')
 
-    async with httpx.AsyncClient() as client:
-        bases_response = await client.get(
-            f'{API_URL}/bases',
-            headers={'Authorization': f'Bearer {access_token}'}
-        )
-        
-        if bases_response.status_code != 200:
-            raise HTTPException(
-                status_code=bases_response.status_code,
-                detail='Failed to fetch Airtable bases'
-            )
-        
-        bases_data = bases_response.json()
-        
-    items = []
-    for base in bases_data.get('bases', []):
-        # Add base as an item
-        base_item = IntegrationItem(
-            id=base.get('id'),
-            type='base',
-            name=base.get('name', 'Untitled Base'),
-            url=f"https://airtable.com/{base.get('id')}",
-            creation_time=base.get('createdTime'),
-            last_modified_time=base.get('modifiedTime'),
-            permissions=base.get('permissionLevel')
-        )
-        items.append(base_item)
-        
-        # Add each table in the base
-        for table in base.get('tables', []):
-            table_item = IntegrationItem(
-                id=f"{base.get('id')}/{table.get('id')}",
-                type='table',
-                name=table.get('name', 'Untitled Table'),
-                url=f"https://airtable.com/{base.get('id')}/{table.get('id')}",
-                creation_time=table.get('createdTime'),
-                last_modified_time=table.get('modifiedTime'),
-                parent_id=base.get('id')
-            )
-            items.append(table_item)
-
-    return items
+    async for item in flat_map(
+        _bases(access_token),
+        lambda base: _base_and_tables(access_token, base),
+        TABLE_CONCURRENCY,
+    ):
+        yield item
+
+async def get_items_airtable(credentials, since=None) -> list[IntegrationItem]:
+    """Get list of bases and tables from Airtable"""
+    return await collect(stream_items_airtable(credentials, since))
@@ -0,0 +1,133 @@
+import os
+import time
+from typing import Dict
+import httpx
+from metrics import PROVIDER_REQUEST_SECONDS
+from tracing import child_span
+from integrations.rate_limit import RateLimitedTransport
+from integrations.retry import RetryPolicy, RetryTransport, HTTP_HEDGE_AFTER
+
+try:
+    import h2  # noqa: F401  (httpx only negotiates HTTP/2 when h2 is installed)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+HTTP2_ENABLED = os.getenv('HTTP2_ENABLED', '1') == '1'
+HTTP_MAX_CONNECTIONS = int(os.getenv('HTTP_MAX_CONNECTIONS', '100'))
+HTTP_MAX_KEEPALIVE = int(os.getenv('HTTP_MAX_KEEPALIVE', '20'))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv('HTTP_KEEPALIVE_EXPIRY', '30'))
+HTTP_TIMEOUT = float(os.getenv('HTTP_TIMEOUT', '30'))
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '5'))
+
+# Per-provider settings. Each provider gets one long-lived client, so
+# repeated syncs reuse warm TCP+TLS connections to the provider's hosts.
+# ``rate``/``burst`` are the provider's documented request budget per
+# credential (requests per second and bucket size); Slack budgets each Web
+# API method separately.
+PROVIDERS: Dict[str, dict] = {
+    'notion': {'http2': True, 'rate': 3, 'burst': 10},
+    'hubspot': {'http2': True, 'rate': 10, 'burst': 100},
+    'slack': {'http2': True, 'rate': 20 / 60, 'burst': 20, 'per_endpoint': True},
+    'airtable': {'http2': True, 'rate': 5, 'burst': 5},
+    'google': {'http2': True},
+}
+
+_clients: Dict[str, httpx.AsyncClient] = {}
+
+def _env_override(provider: str, name: str, default):
+    value = os.getenv(f'{provider.upper()}_{name}')
+    return type(default)(value) if value is not None else default
+
+class MetricsTransport(httpx.AsyncBaseTransport):
+    """Record each call's time to response headers (all attempts included) and final status."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, provider: str):
+        self.transport = transport
+        self.provider = provider
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        started = time.perf_counter()
+        status = "error"
+        try:
+            response = await self.transport.handle_async_request(request)
+            status = str(response.status_code)
+            return response
+        finally:
+            PROVIDER_REQUEST_SECONDS.observe(time.perf_counter() - started, self.provider,
+                                             request.method, status)
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+class TracingTransport(httpx.AsyncBaseTransport):
+    """Span per provider call; the trace context goes out as a traceparent header."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, provider: str):
+        self.transport = transport
+        self.provider = provider
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        with child_span(f"{self.provider} {request.method}", **{
+            "http.method": request.method,
+            "http.host": request.url.host,
+            "http.path": request.url.path,
+        }) as span:
+            if span.traceparent:
+                request.headers["traceparent"] = span.traceparent
+            response = await self.transport.handle_async_request(request)
+            span.set("http.status_code", response.status_code)
+            span.set("http.attempts", response.extensions.get("attempts", 1))
+            return response
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+def build_transport(provider: str) -> httpx.AsyncBaseTransport:
+    """Connection-pooling transport for a provider."""
+    settings = PROVIDERS.get(provider, {})
+    limits = httpx.Limits(
+        max_connections=_env_override(provider, 'HTTP_MAX_CONNECTIONS', HTTP_MAX_CONNECTIONS),
+        max_keepalive_connections=_env_override(provider, 'HTTP_MAX_KEEPALIVE', HTTP_MAX_KEEPALIVE),
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+    http2 = HTTP2_AVAILABLE and HTTP2_ENABLED and settings.get('http2', False)
+    return httpx.AsyncHTTPTransport(http2=http2, limits=limits)
+
+def build_client(provider: str) -> httpx.AsyncClient:
+    timeout = httpx.Timeout(
+        _env_override(provider, 'HTTP_TIMEOUT', HTTP_TIMEOUT),
+        connect=HTTP_CONNECT_TIMEOUT,
+    )
+    settings = PROVIDERS.get(provider, {})
+    transport = build_transport(provider)
+    if settings.get('rate'):
+        transport = RateLimitedTransport(
+            transport,
+            provider,
+            rate=_env_override(provider, 'RATE_LIMIT', float(settings['rate'])),
+            capacity=_env_override(provider, 'RATE_LIMIT_BURST', float(settings['burst'])),
+            per_endpoint=settings.get('per_endpoint', False),
+        )
+    # Retries sit outside the rate limiter so every attempt spends budget
+    transport = RetryTransport(transport, RetryPolicy(
+        hedge_after=_env_override(provider, 'HEDGE_AFTER', HTTP_HEDGE_AFTER),
+    ))
+    transport = MetricsTransport(transport, provider)
+    transport = TracingTransport(transport, provider)
+    return httpx.AsyncClient(transport=transport, timeout=timeout)
+
+def get_client(provider: str) -> httpx.AsyncClient:
+    """Return the shared client for ``provider``, creating it on first use."""
+    client = _clients.get(provider)
+    if client is None or client.is_closed:
+        client = build_client(provider)
+        _clients[provider] = client
+    return client
+
+async def close_clients():
+    """Close every provider client (called on app shutdown)."""
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        await client.aclose()
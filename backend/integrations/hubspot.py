@@ -3,10 +3,13 @@ import secrets
 import os
 from fastapi import Request, HTTPException
 from fastapi.responses import HTMLResponse
-import httpx
+from integrations.http_clients import get_client
 import asyncio
+from datetime import datetime
+from typing import AsyncIterator
 from dotenv import load_dotenv
 from integrations.integration_item import IntegrationItem
+from integrations.pagination import merge_streams, collect
 from redis_client import add_key_value_redis, get_value_redis, delete_key_redis
 
 load_dotenv()
@@ -16,6 +19,27 @@ CLIENT_SECRET = os.getenv('HUBSPOT_CLIENT_SECRET')
 REDIRECT_URI = os.getenv('HUBSPOT_REDIRECT_URI')
 AUTHORIZATION_URL = 'https://app.hubspot.com/oauth/authorize'
 TOKEN_URL = 'https://api.hubapi.com/oauth/v1/token'
+API_URL = 'https://api.hubapi.com'
+
+# Largest page the CRM v3 list endpoints accept
+PAGE_SIZE = 100
+
+# CRM object types to crawl and the properties requested for each
+OBJECT_PROPERTIES = {
+    'contacts': ['firstname', 'lastname', 'email', 'company'],
+    'companies': ['name', 'domain', 'industry'],
+    'deals': ['dealname', 'dealstage', 'amount'],
+}
+
+# Last-modified property each object type can be searched by
+MODIFIED_PROPERTY = {
+    'contacts': 'lastmodifieddate',
+    'companies': 'hs_lastmodifieddate',
+    'deals': 'hs_lastmodifieddate',
+}
+
+# The search endpoint returns at most this many results per query
+SEARCH_RESULT_LIMIT = 10000
 
 SCOPES = [
     'contacts',
@@ -80,25 +104,25 @@ async def oauth2callback_hubspot(request: Request) -> HTMLResponse:
     user_id = state_data.get('user_id')
     org_id = state_data.get('org_id')
     
-    async with httpx.AsyncClient() as client:
-        token_response = await client.post(
-            TOKEN_URL,
-            data={
-                'grant_type': 'authorization_code',
-                'client_id': CLIENT_ID,
-                'client_secret': CLIENT_SECRET,
-                'redirect_uri': REDIRECT_URI,
-                'code': code
-            }
-        )
-        
-        if token_response.status_code != 200:
-            raise HTTPException(status_code=token_response.status_code, detail='Failed to get access token')
-        
-        credentials = token_response.json()
-        await add_key_value_redis(f'hubspot_credentials:{org_id}:{user_id}', json.dumps(credentials), expire=3600)
-        await delete_key_redis(f'hubspot_state:{state}')
-    
+    client = get_client('hubspot')
+    token_response = await client.post(
+        TOKEN_URL,
+        data={
+            'grant_type': 'authorization_code',
+            'client_id': CLIENT_ID,
+            'client_secret': CLIENT_SECRET,
+            'redirect_uri': REDIRECT_URI,
+            'code': code
+        }
+    )
+
+    if token_response.status_code != 200:
+        raise HTTPException(status_code=token_response.status_code, detail='Failed to get access token')
+
+    credentials = token_response.json()
+    await add_key_value_redis(f'hubspot_credentials:{org_id}:{user_id}', json.dumps(credentials), expire=3600)
+    await delete_key_redis(f'hubspot_state:{state}')
+
     return HTMLResponse(content="""
         <html>
             <head><title>HubSpot Connection Successful</title></head>
@@ -123,61 +147,143 @@ async def get_hubspot_credentials(user_id: str, org_id: str) -> dict:
         raise HTTPException(status_code=400, detail='No credentials found')
     return json.loads(credentials)
 
-async def get_items_hubspot(credentials: dict) -> list[IntegrationItem]:
-    """Retrieve HubSpot contacts, companies, and deals"""
-    credentials = json.loads(credentials) if isinstance(credentials, str) else credentials
-    access_token = credentials.get('access_token')
-    if not access_token:
-        raise HTTPException(status_code=400, detail='Invalid credentials')
-
-    headers = {
-        'Authorization': f'Bearer {access_token}',
-        'Content-Type': 'application/json'
-    }
-
-    async with httpx.AsyncClient() as client:
-        # Get contacts and companies in parallel
-        responses = await asyncio.gather(
-            client.get('https://api.hubapi.com/crm/v3/objects/contacts', headers=headers),
-            client.get('https://api.hubapi.com/crm/v3/objects/companies', headers=headers)
-        )
-
-        contacts_response, companies_response = responses
-
-        if contacts_response.status_code != 200 or companies_response.status_code != 200:
-            raise HTTPException(status_code=500, detail='Failed to fetch HubSpot data')
-
-        contacts_data = contacts_response.json()
-        companies_data = companies_response.json()
-
-    items = []
-
-    # Process contacts
-    for contact in contacts_data.get('results', []):
-        properties = contact.get('properties', {})
-        item = IntegrationItem(
-            id=contact['id'],
+def _hubspot_item(object_type: str, record: dict) -> IntegrationItem:
+    """Convert a CRM object record into an IntegrationItem."""
+    properties = record.get('properties') or {}
+    if object_type == 'contacts':
+        return IntegrationItem(
+            id=record['id'],
             type='contact',
-            name=f"{properties.get('firstname', '')} {properties.get('lastname', '')}".strip() or 'Unnamed Contact',
+            name=f"{properties.get('firstname') or ''} {properties.get('lastname') or ''}".strip() or 'Unnamed Contact',
             email=properties.get('email'),
             company=properties.get('company'),
-            last_modified_time=contact.get('updatedAt'),
+            last_modified_time=record.get('updatedAt'),
             source='hubspot'
         )
-        items.append(item)
-
-    # Process companies
-    for company in companies_data.get('results', []):
-        properties = company.get('properties', {})
-        item = IntegrationItem(
-            id=company['id'],
+    if object_type == 'companies':
+        return IntegrationItem(
+            id=record['id'],
             type='company',
-            name=properties.get('name', 'Unnamed Company'),
+            name=properties.get('name') or 'Unnamed Company',
             domain=properties.get('domain'),
             industry=properties.get('industry'),
-            last_modified_time=company.get('updatedAt'),
+            last_modified_time=record.get('updatedAt'),
             source='hubspot'
         )
-        items.append(item)
+    amount = properties.get('amount')
+    return IntegrationItem(
+        id=record['id'],
+        type='deal',
+        name=properties.get('dealname') or 'Unnamed Deal',
+        deal_stage=properties.get('dealstage'),
+        deal_amount=float(amount) if amount else None,
+        last_modified_time=record.get('updatedAt'),
+        source='hubspot'
+    )
+
+async def _paginate_objects(headers: dict, object_type: str) -> AsyncIterator[IntegrationItem]:
+    """Follow paging.next.after through every page of one CRM object type."""
+    client = get_client('hubspot')
+    params = {
+        'limit': PAGE_SIZE,
+        'properties': ','.join(OBJECT_PROPERTIES[object_type]),
+        'archived': 'false',
+    }
+    while True:
+        response = await client.get(f'{API_URL}/crm/v3/objects/{object_type}', headers=headers, params=params)
+        if response.status_code != 200:
+            raise HTTPException(status_code=500, detail=f'Failed to fetch HubSpot {object_type}')
+
+        data = response.json()
+        for record in data.get('results', []):
+            yield _hubspot_item(object_type, record)
+
+        after = ((data.get('paging') or {}).get('next') or {}).get('after')
+        if not after:
+            break
+        params['after'] = after
+
+def _epoch_ms(value) -> int:
+    """Milliseconds since the epoch from a datetime, ISO-8601 string or epoch-ms string."""
+    if isinstance(value, datetime):
+        return int(value.timestamp() * 1000)
+    value = str(value)
+    if value.isdigit():
+        return int(value)
+    return int(datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp() * 1000)
+
+async def _search_modified(headers: dict, object_type: str, since: datetime) -> AsyncIterator[IntegrationItem]:
+    """Yield objects of one type modified at or after ``since``, oldest first.
+
+    Search stops paging after SEARCH_RESULT_LIMIT results, so a long result
+    set is continued with a new query starting at the last modification
+    time seen (objects at exactly that time are repeated, not skipped).
+    """
+    client = get_client('hubspot')
+    modified = MODIFIED_PROPERTY[object_type]
+    watermark = _epoch_ms(since)
+    body = {
+        'filterGroups': [{'filters': [
+            {'propertyName': modified, 'operator': 'GTE', 'value': str(watermark)},
+        ]}],
+        'sorts': [{'propertyName': modified, 'direction': 'ASCENDING'}],
+        'properties': OBJECT_PROPERTIES[object_type] + [modified],
+        'limit': PAGE_SIZE,
+    }
+    seen = 0
+    while True:
+        # Search is read-only, so the client may retry it like a GET
+        response = await client.post(
+            f'{API_URL}/crm/v3/objects/{object_type}/search',
+            headers=headers, json=body, extensions={'idempotent': True},
+        )
+        if response.status_code != 200:
+            raise HTTPException(status_code=500, detail=f'Failed to search HubSpot {object_type}')
+
+        data = response.json()
+        last_modified = None
+        for record in data.get('results', []):
+            last_modified = (record.get('properties') or {}).get(modified) or record.get('updatedAt')
+            yield _hubspot_item(object_type, record)
+        seen += len(data.get('results', []))
 
-    return items
+        after = ((data.get('paging') or {}).get('next') or {}).get('after')
+        if not after:
+            break
+        if seen + PAGE_SIZE > SEARCH_RESULT_LIMIT and last_modified:
+            next_watermark = _epoch_ms(last_modified)
+            if next_watermark <= watermark:
+                raise HTTPException(status_code=500, detail=f'Too many HubSpot {object_type} changes to page through')
+            watermark, seen = next_watermark, 0
+            body['filterGroups'][0]['filters'][0]['value'] = str(watermark)
+            body.pop('after', None)
+        else:
+            body['after'] = after
+
+async def stream_items_hubspot(credentials: dict, since=None) -> AsyncIterator[IntegrationItem]:
+    """Yield HubSpot contacts, companies and deals as their pages arrive.
+
+    The three object types are crawled concurrently; only one page per type
+    plus a bounded buffer is held in memory at a time. With ``since`` (a
+    datetime or ISO-8601 string) only objects modified at or after it are
+    fetched, through the CRM search API.
+    """
+    credentials = json.loads(credentials) if isinstance(credentials, str) else credentials
+    access_token = credentials.get('access_token')
+    if not access_token:
+        raise HTTPException(status_code=400, detail='Invalid credentials')
+
+    headers = {
+        'Authorization': f'Bearer {access_token}',
+        'Content-Type': 'application/json'
+    }
+    if since:
+        streams = (_search_modified(headers, object_type, since) for object_type in OBJECT_PROPERTIES)
+    else:
+        streams = (_paginate_objects(headers, object_type) for object_type in OBJECT_PROPERTIES)
+    async for item in merge_streams(*streams):
+        yield item
+
+async def get_items_hubspot(credentials: dict, since=None) -> list[IntegrationItem]:
+    """Retrieve HubSpot contacts, companies, and deals"""
+    return await collect(stream_items_hubspot(credentials, since))
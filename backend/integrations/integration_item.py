@@ -1,7 +1,36 @@
+import json
 from datetime import datetime
-from typing import Optional, List, Any
+from operator import attrgetter
+from typing import Optional, List, Any, Iterable
+
+try:
+    import orjson
+except ImportError:  # Falls back to the standard library encoder
+    orjson = None
+
+# Declared schema: every field an item can carry, in serialization order.
+# Items store nothing else, so each instance is a fixed set of slots with no
+# per-instance __dict__.
+FIELDS = (
+    # Required fields
+    'id', 'type', 'name',
+    # Base properties
+    'directory', 'parent_path_or_name', 'parent_id', 'creation_time',
+    'last_modified_time', 'url', 'visibility', 'source', 'permissions',
+    # File-specific properties
+    'mime_type', 'children',
+    # Integration-specific properties
+    'title', 'items', 'email', 'company', 'industry', 'domain',
+    'deal_stage', 'deal_amount', 'properties',
+    # Metadata properties
+    'delta', 'drive_id', 'metadata',
+)
+
+_values = attrgetter(*FIELDS)
 
 class IntegrationItem:
+    __slots__ = FIELDS
+
     def __init__(
         self,
         id: str,
@@ -16,10 +45,13 @@ class IntegrationItem:
         url: Optional[str] = None,
         visibility: Optional[bool] = True,
         source: Optional[str] = None,
+        permissions: Optional[str] = None,     # Airtable bases
         # File-specific properties
         mime_type: Optional[str] = None,
         children: Optional[List[str]] = None,
         # Integration-specific properties
+        title: Optional[str] = None,          # Notion pages
+        items: Optional[int] = None,          # Notion databases (property count)
         email: Optional[str] = None,          # HubSpot contacts, Slack users
         company: Optional[str] = None,        # HubSpot contacts
         industry: Optional[str] = None,       # HubSpot companies
@@ -36,7 +68,7 @@ class IntegrationItem:
         self.id = id
         self.type = type
         self.name = name
-        
+
         # Base properties
         self.directory = directory
         self.parent_path_or_name = parent_path_or_name
@@ -46,21 +78,66 @@ class IntegrationItem:
         self.url = url
         self.visibility = visibility
         self.source = source
+        self.permissions = permissions
 
-        # File-specific properties
+        # File-specific properties. Empty containers are left as None and
+        # only materialised when the item is serialized.
         self.mime_type = mime_type
-        self.children = children or []
+        self.children = children
 
         # Integration-specific properties
+        self.title = title
+        self.items = items
         self.email = email
         self.company = company
         self.industry = industry
         self.domain = domain
         self.deal_stage = deal_stage
         self.deal_amount = deal_amount
-        self.properties = properties or {}
+        self.properties = properties
 
         # Metadata properties
         self.delta = delta
         self.drive_id = drive_id
-        self.metadata = metadata or {}
+        self.metadata = metadata
+
+    def to_dict(self) -> dict:
+        data = dict(zip(FIELDS, _values(self)))
+        if data['children'] is None:
+            data['children'] = []
+        if data['properties'] is None:
+            data['properties'] = {}
+        if data['metadata'] is None:
+            data['metadata'] = {}
+        return data
+
+    def __iter__(self):
+        # Lets dict(item) (and so FastAPI's jsonable_encoder) see the fields
+        return iter(self.to_dict().items())
+
+    def __repr__(self):
+        return f"IntegrationItem(id={self.id!r}, type={self.type!r}, name={self.name!r})"
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+if orjson is not None:
+    def dumps(value) -> bytes:
+        """Serialize plain JSON data (dicts, lists, datetimes) to bytes."""
+        return orjson.dumps(value, default=_default)
+else:
+    _encoder = json.JSONEncoder(default=_default, separators=(',', ':'))
+
+    def dumps(value) -> bytes:
+        """Serialize plain JSON data (dicts, lists, datetimes) to bytes."""
+        return _encoder.encode(value).encode('utf-8')
+
+def encode_item(item: IntegrationItem) -> bytes:
+    """Serialize one item straight to JSON bytes."""
+    return dumps(item.to_dict())
+
+def encode_items(items: Iterable[IntegrationItem]) -> bytes:
+    """Serialize items as a JSON array."""
+    return dumps([item.to_dict() for item in items])
@@ -1,23 +1,36 @@
 import json
+import logging
 import secrets
 import os
 from fastapi import Request, HTTPException
 from fastapi.responses import HTMLResponse
-import httpx
+from integrations.http_clients import get_client
 import asyncio
+from datetime import datetime
+from typing import AsyncIterator, Optional
 from dotenv import load_dotenv
 from integrations.integration_item import IntegrationItem
+from integrations.pagination import merge_streams, collect, RequestCoalescer
 from redis_client import add_key_value_redis, get_value_redis, delete_key_redis
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 CLIENT_ID = os.getenv('NOTION_CLIENT_ID')
 CLIENT_SECRET = os.getenv('NOTION_CLIENT_SECRET')
 REDIRECT_URI = os.getenv('NOTION_REDIRECT_URI')
 AUTHORIZATION_URL = 'https://api.notion.com/v1/oauth/authorize'
 TOKEN_URL = 'https://api.notion.com/v1/oauth/token'
+SEARCH_URL = 'https://api.notion.com/v1/search'
 NOTION_VERSION = '2022-06-28'
 
+# Largest page size the search endpoint accepts
+PAGE_SIZE = 100
+
+# Identical concurrent search requests (same token, filter and cursor) share one call
+_coalescer = RequestCoalescer()
+
 def validate_oauth_config():
     if not all([CLIENT_ID, CLIENT_SECRET, REDIRECT_URI]):
         raise HTTPException(status_code=500, detail="Missing Notion OAuth configuration")
@@ -64,36 +77,36 @@ async def oauth2callback_notion(request: Request):
     state_data = json.loads(saved_state)
     user_id, org_id = state_data.get('user_id'), state_data.get('org_id')
     
-    async with httpx.AsyncClient() as client:
-        token_response = await client.post(
-            TOKEN_URL,
-            auth=(CLIENT_ID, CLIENT_SECRET),
-            json={'grant_type': 'authorization_code', 'code': code, 'redirect_uri': REDIRECT_URI},
-        )
-        
-        if token_response.status_code != 200:
-            error_message = 'Failed to get access token'
-            return HTMLResponse(content=f"""
-                <html>
-                    <head><title>Notion Connection Failed</title></head>
-                    <body>
-                        <h1>Connection Failed</h1>
-                        <p>Error: {error_message}</p>
-                        <script>
-                            window.opener.postMessage(
-                                {{ type: 'notion-oauth-callback', success: false, error: "{error_message}" }}, 
-                                '*'
-                            );
-                            setTimeout(() => window.close(), 1000);
-                        </script>
-                    </body>
-                </html>
-            """)
-        
-        credentials = token_response.json()
-        await add_key_value_redis(f'notion_credentials:{org_id}:{user_id}', json.dumps(credentials), expire=3600)
-        await delete_key_redis(f'notion_state:{state}')
-    
+    client = get_client('notion')
+    token_response = await client.post(
+        TOKEN_URL,
+        auth=(CLIENT_ID, CLIENT_SECRET),
+        json={'grant_type': 'authorization_code', 'code': code, 'redirect_uri': REDIRECT_URI},
+    )
+
+    if token_response.status_code != 200:
+        error_message = 'Failed to get access token'
+        return HTMLResponse(content=f"""
+            <html>
+                <head><title>Notion Connection Failed</title></head>
+                <body>
+                    <h1>Connection Failed</h1>
+                    <p>Error: {error_message}</p>
+                    <script>
+                        window.opener.postMessage(
+                            {{ type: 'notion-oauth-callback', success: false, error: "{error_message}" }}, 
+                            '*'
+                        );
+                        setTimeout(() => window.close(), 1000);
+                    </script>
+                </body>
+            </html>
+        """)
+
+    credentials = token_response.json()
+    await add_key_value_redis(f'notion_credentials:{org_id}:{user_id}', json.dumps(credentials), expire=3600)
+    await delete_key_redis(f'notion_state:{state}')
+
     return HTMLResponse(content="""
         <html>
             <head><title>Notion Connection Successful</title></head>
@@ -136,73 +149,100 @@ async def get_notion_credentials(user_id: str, org_id: str):
         raise HTTPException(status_code=400, detail='No credentials found')
     return json.loads(credentials)
 
-async def get_items_notion(credentials: dict) -> list[IntegrationItem]:
-    """Retrieve Notion databases and pages"""
-    credentials = json.loads(credentials) if isinstance(credentials, str) else credentials
-    access_token = credentials.get('access_token')
-    if not access_token:
-        raise HTTPException(status_code=400, detail='Invalid credentials')
-    
-    headers = {'Authorization': f'Bearer {access_token}', 'Notion-Version': NOTION_VERSION}
-    async with httpx.AsyncClient() as client:
-        responses = await asyncio.gather(
-            client.get('https://api.notion.com/v1/users/me', headers=headers),
-            client.post('https://api.notion.com/v1/search', headers=headers, json={'filter': {'property': 'object', 'value': 'database'}}),
-            client.post('https://api.notion.com/v1/search', headers=headers, json={'filter': {'property': 'object', 'value': 'page'}}),
-        )
-    
-    if any(response.status_code != 200 for response in responses):
-        raise HTTPException(status_code=500, detail='Failed to fetch Notion data')
-    
-    user_response, db_response, page_response = responses
-    items = []
+def _plain_text(rich_text) -> str:
+    return ''.join(
+        (part.get('text') or {}).get('content', '') if part.get('type', 'text') == 'text'
+        else part.get('plain_text', '')
+        for part in rich_text or []
+    )
 
-    # Process databases
-    for db in db_response.json().get('results', []):
-        items.append(IntegrationItem(
-            id=db['id'],
+def _page_title(page: dict) -> str:
+    # Handle different page title structures
+    for prop in (page.get('properties') or {}).values():
+        if prop.get('type') == 'title':
+            return _plain_text(prop.get('title')) or 'Untitled'
+    # Fallback to page title if properties don't contain it
+    return _plain_text(page.get('title')) or 'Untitled'
+
+def _notion_item(result: dict) -> IntegrationItem:
+    if result.get('object') == 'database':
+        return IntegrationItem(
+            id=result['id'],
             type='database',
-            name=db.get('title', [{}])[0].get('text', {}).get('content', 'Untitled'),
-            items=len(db.get('properties', {})),
-            last_modified_time=db.get('last_edited_time'),
+            name=_plain_text(result.get('title')) or 'Untitled',
+            items=len(result.get('properties', {})),
+            last_modified_time=result.get('last_edited_time'),
             source='notion'
-        ))
-    
-    # Process pages
-    for page in page_response.json().get('results', []):
+        )
+    title = _page_title(result)
+    return IntegrationItem(
+        id=result['id'],
+        type='page',
+        title=title,
+        name=title,  # Add name field for compatibility
+        last_modified_time=result.get('last_edited_time'),
+        source='notion'
+    )
+
+def _parse_time(value) -> Optional[datetime]:
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+async def _search_page(headers: dict, body: dict) -> dict:
+    client = get_client('notion')
+    # Search is read-only, so the client may retry it like a GET
+    response = await client.post(SEARCH_URL, headers=headers, json=body, extensions={'idempotent': True})
+    if response.status_code != 200:
+        raise HTTPException(status_code=500, detail='Failed to fetch Notion data')
+    return response.json()
+
+async def _search(headers: dict, object_type: str, since: Optional[datetime]) -> AsyncIterator[dict]:
+    """Follow next_cursor through every search result page for one object type."""
+    body = {'filter': {'property': 'object', 'value': object_type}, 'page_size': PAGE_SIZE}
+    if since:
+        # Newest first, so the crawl can stop at the first result older than the watermark
+        body['sort'] = {'direction': 'descending', 'timestamp': 'last_edited_time'}
+
+    while True:
+        key = (headers['Authorization'], json.dumps(body, sort_keys=True))
+        data = await _coalescer.run(key, lambda body=dict(body): _search_page(headers, body))
+        for result in data.get('results', []):
+            edited = _parse_time(result.get('last_edited_time'))
+            if since and edited and edited < since:
+                return
+            yield result
+
+        if not data.get('has_more') or not data.get('next_cursor'):
+            break
+        body['start_cursor'] = data['next_cursor']
+
+async def _crawl(headers: dict, object_type: str, since: Optional[datetime]) -> AsyncIterator[IntegrationItem]:
+    async for result in _search(headers, object_type, since):
         try:
-            # Handle different page title structures
-            properties = page.get('properties', {})
-            title_prop = None
-            
-            # Try to find title in properties
-            for prop in properties.values():
-                if prop.get('type') == 'title':
-                    title_prop = prop
-                    break
-            
-            # Extract title from property
-            if title_prop and title_prop.get('title'):
-                title_parts = []
-                for text_obj in title_prop['title']:
-                    if text_obj.get('type') == 'text':
-                        title_parts.append(text_obj.get('text', {}).get('content', ''))
-                title = ' '.join(title_parts) if title_parts else 'Untitled'
-            else:
-                # Fallback to page title if properties don't contain it
-                title = page.get('title', [{}])[0].get('text', {}).get('content', 'Untitled')
-            
-            items.append(IntegrationItem(
-                id=page['id'],
-                type='page',
-                title=title,
-                name=title,  # Add name field for compatibility
-                last_modified_time=page.get('last_edited_time'),
-                source='notion'
-            ))
+            yield _notion_item(result)
         except Exception as e:
-            print(f"Error processing Notion page {page.get('id')}: {str(e)}")
-            # Continue processing other pages even if one fails
+            logger.warning("Error processing Notion %s %s: %s", object_type, result.get('id'), e)
+            # Continue processing other results even if one fails
             continue
-    
-    return items
+
+async def stream_items_notion(credentials: dict, since=None) -> AsyncIterator[IntegrationItem]:
+    """Yield Notion databases and pages as search result pages arrive.
+
+    With ``since`` (a datetime or ISO-8601 string) only objects edited at or
+    after that watermark are returned, and each crawl stops as soon as it
+    reaches older results.
+    """
+    credentials = json.loads(credentials) if isinstance(credentials, str) else credentials
+    access_token = credentials.get('access_token')
+    if not access_token:
+        raise HTTPException(status_code=400, detail='Invalid credentials')
+
+    since = _parse_time(since)
+    headers = {'Authorization': f'Bearer {access_token}', 'Notion-Version': NOTION_VERSION}
+    async for item in merge_streams(_crawl(headers, 'database', since), _crawl(headers, 'page', since)):
+        yield item
+
+async def get_items_notion(credentials: dict, since=None) -> list[IntegrationItem]:
+    """Retrieve Notion databases and pages"""
+    return await collect(stream_items_notion(credentials, since))
@@ -0,0 +1,115 @@
+import asyncio
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Callable, List, TypeVar
+
+T = TypeVar('T')
+
+# Items buffered between the provider crawlers and the consumer. Producers
+# block once it is full, so memory stays bounded however large the account is.
+DEFAULT_BUFFER = 500
+
+class _Done:
+    pass
+
+class _Failure:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+async def _drain(queue: asyncio.Queue, tasks: list, producers: int) -> AsyncIterator[T]:
+    """Yield queued items until every producer has finished, then clean up."""
+    try:
+        while producers:
+            item = await queue.get()
+            if item is _Done:
+                producers -= 1
+            elif isinstance(item, _Failure):
+                raise item.error
+            else:
+                yield item
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+async def merge_streams(*streams: AsyncIterator[T], maxsize: int = DEFAULT_BUFFER) -> AsyncIterator[T]:
+    """Consume several async iterators concurrently and yield items as they arrive.
+
+    The first producer error cancels the other producers and is re-raised to
+    the consumer.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize)
+
+    async def pump(stream):
+        try:
+            async with aclosing(stream):
+                async for item in stream:
+                    await queue.put(item)
+        except Exception as e:
+            await queue.put(_Failure(e))
+            return
+        await queue.put(_Done)
+
+    tasks = [asyncio.create_task(pump(stream)) for stream in streams]
+    async for item in _drain(queue, tasks, len(tasks)):
+        yield item
+
+async def flat_map(source: AsyncIterator[Any], expand: Callable[[Any], AsyncIterator[T]],
+                   concurrency: int, maxsize: int = DEFAULT_BUFFER) -> AsyncIterator[T]:
+    """Expand each item of ``source`` into a stream and yield all results as they arrive.
+
+    At most ``concurrency`` expansions run at once; ``source`` is only read
+    further when a slot frees up.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize)
+    slots = asyncio.Semaphore(concurrency)
+
+    async def expand_one(parent):
+        try:
+            async with aclosing(expand(parent)) as stream:
+                async for item in stream:
+                    await queue.put(item)
+        finally:
+            slots.release()
+
+    async def drive():
+        try:
+            async with asyncio.TaskGroup() as group:
+                async with aclosing(source):
+                    async for parent in source:
+                        await slots.acquire()
+                        group.create_task(expand_one(parent))
+        except BaseExceptionGroup as e:
+            await queue.put(_Failure(e.exceptions[0]))
+            return
+        except Exception as e:
+            await queue.put(_Failure(e))
+            return
+        await queue.put(_Done)
+
+    tasks = [asyncio.create_task(drive())]
+    async for item in _drain(queue, tasks, 1):
+        yield item
+
+async def collect(stream: AsyncIterator[T]) -> List[T]:
+    """Drain an async iterator into a list (for callers that need everything)."""
+    return [item async for item in stream]
+
+class RequestCoalescer:
+    """Share one in-flight request between concurrent callers with the same key.
+
+    Two dashboard polls for the same account arriving together will then
+    crawl each page once instead of twice. Only the in-flight call is
+    shared; nothing is cached after it completes.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+
+    async def run(self, key, factory):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # Shield so one caller going away does not cancel the others' request
+        return await asyncio.shield(task)
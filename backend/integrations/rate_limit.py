@@ -0,0 +1,192 @@
+import asyncio
+import hashlib
+import logging
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Optional
+import httpx
+import redis
+from metrics import PROVIDER_RATE_LIMIT_WAIT_SECONDS
+from redis_client import redis_client, redis_health
+from redis_health import CONNECTION_ERRORS, is_pool_exhausted
+from tracing import current_span
+
+logger = logging.getLogger(__name__)
+
+# Most tokens a worker reserves from Redis at once and then hands out
+# locally (never more than the bucket refills in one lease TTL)
+RATE_LIMIT_LEASE_SIZE = int(os.getenv('RATE_LIMIT_LEASE_SIZE', '5'))
+# Unused leased tokens are dropped after this many seconds
+RATE_LIMIT_LEASE_TTL = float(os.getenv('RATE_LIMIT_LEASE_TTL', '1'))
+# Assumed worker count when Redis is down and each worker limits on its own
+RATE_LIMIT_FALLBACK_WORKERS = int(os.getenv('RATE_LIMIT_FALLBACK_WORKERS', '4'))
+MAX_LIMITERS = 10000
+
+# Reserve ARGV[3] tokens from the bucket in KEYS[1] and return how many
+# seconds the caller must wait before using them. Tokens may go negative,
+# which queues later callers behind earlier ones without any retry loop.
+RESERVE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate) - requested
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate * 1000) + 1000)
+if tokens >= 0 then
+    return '0'
+end
+return tostring(-tokens / rate)
+"""
+
+_reserve = redis_client.register_script(RESERVE_SCRIPT)
+
+class TokenBucket:
+    """Async token bucket: ``rate`` requests per second with bursts up to ``capacity``."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, tokens: float = 1) -> float:
+        """Wait until ``tokens`` are available and return how long that took (seconds)."""
+        started = time.monotonic()
+        # The lock keeps waiters in FIFO order
+        async with self._lock:
+            self._refill()
+            if self.tokens < tokens:
+                await asyncio.sleep((tokens - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= tokens
+        return time.monotonic() - started
+
+class SharedRateLimiter:
+    """Token bucket for one provider credential, shared by every worker through Redis.
+
+    Each worker reserves ``lease_size`` tokens per Redis round trip and spends
+    them locally, so most requests never leave the process. Tokens left when
+    a lease expires are lost, so a lease never holds more than the bucket
+    refills in ``RATE_LIMIT_LEASE_TTL``; slow budgets (Slack's 20 a minute)
+    reserve one token at a time. While Redis is unavailable the limiter falls
+    back to a local bucket holding this worker's share of the budget.
+    """
+
+    def __init__(self, redis_key: str, rate: float, capacity: float,
+                 lease_size: int = RATE_LIMIT_LEASE_SIZE):
+        self.redis_key = redis_key
+        self.rate = rate
+        self.capacity = capacity
+        self.lease_size = max(1, min(lease_size, int(capacity), math.floor(rate * RATE_LIMIT_LEASE_TTL)))
+        self.leased = 0
+        self.lease_expires = 0.0
+        self.fallback = TokenBucket(
+            rate / RATE_LIMIT_FALLBACK_WORKERS,
+            max(1.0, capacity / RATE_LIMIT_FALLBACK_WORKERS),
+        )
+        self._lock = asyncio.Lock()
+
+    def _take_leased(self) -> bool:
+        if self.leased > 0 and time.monotonic() < self.lease_expires:
+            self.leased -= 1
+            return True
+        return False
+
+    async def acquire(self) -> float:
+        """Wait for one request slot and return how long that took (seconds)."""
+        if self._take_leased():
+            return 0.0
+
+        started = time.monotonic()
+        async with self._lock:
+            if self._take_leased():
+                return time.monotonic() - started
+            if not redis_health.is_available:
+                return await self.fallback.acquire() + (time.monotonic() - started)
+            try:
+                wait = float(await _reserve(
+                    keys=[self.redis_key], args=[self.rate, self.capacity, self.lease_size]
+                ))
+            except CONNECTION_ERRORS as e:
+                if not is_pool_exhausted(e):
+                    redis_health.record_failure(e)
+                return await self.fallback.acquire() + (time.monotonic() - started)
+            except redis.RedisError as e:
+                logger.error("Rate limiter error for %s: %s", self.redis_key, e)
+                return await self.fallback.acquire() + (time.monotonic() - started)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self.leased = self.lease_size - 1
+            self.lease_expires = time.monotonic() + RATE_LIMIT_LEASE_TTL
+        return time.monotonic() - started
+
+_limiters: "OrderedDict[str, SharedRateLimiter]" = OrderedDict()
+
+def get_limiter(provider: str, credential: str, rate: float, capacity: float,
+                scope: str = '') -> SharedRateLimiter:
+    """Process-wide limiter for a provider credential (and optional endpoint scope)."""
+    digest = hashlib.sha256(credential.encode('utf-8')).hexdigest()[:24]
+    redis_key = f"ratelimit:{provider}:{digest}" + (f":{scope}" if scope else '')
+    limiter = _limiters.get(redis_key)
+    if limiter is None:
+        limiter = _limiters[redis_key] = SharedRateLimiter(redis_key, rate, capacity)
+        if len(_limiters) > MAX_LIMITERS:
+            _limiters.popitem(last=False)
+    else:
+        _limiters.move_to_end(redis_key)
+    return limiter
+
+class RateLimitedTransport(httpx.AsyncBaseTransport):
+    """Applies a provider's request budget, keyed by the request's credential.
+
+    Sits below the retry layer, so it sees every attempt. Each attempt's wait
+    is recorded in ``provider_rate_limit_wait_seconds`` and added to the
+    current span's ``rate_limit_wait`` (the call's total across retries and
+    hedges); the last attempt's wait is also in
+    ``response.extensions['rate_limit_wait']``.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, provider: str,
+                 rate: float, capacity: float, per_endpoint: bool = False):
+        self.transport = transport
+        self.provider = provider
+        self.rate = rate
+        self.capacity = capacity
+        self.per_endpoint = per_endpoint
+
+    def limiter_for(self, request: httpx.Request) -> Optional[SharedRateLimiter]:
+        credential = request.headers.get('Authorization')
+        if not credential:
+            # OAuth token exchanges carry no user credential to budget against
+            return None
+        scope = request.url.path if self.per_endpoint else ''
+        return get_limiter(self.provider, credential, self.rate, self.capacity, scope)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        limiter = self.limiter_for(request)
+        waited = 0.0
+        if limiter:
+            waited = await limiter.acquire()
+            PROVIDER_RATE_LIMIT_WAIT_SECONDS.observe(waited, self.provider)
+            span = current_span()
+            if span is not None:
+                span.set("rate_limit_wait", span.attributes.get("rate_limit_wait", 0.0) + waited)
+        response = await self.transport.handle_async_request(request)
+        response.extensions['rate_limit_wait'] = waited
+        return response
+
+    async def aclose(self):
+        await self.transport.aclose()
@@ -0,0 +1,166 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional
+import httpx
+
+logger = logging.getLogger(__name__)
+
+HTTP_RETRY_ATTEMPTS = int(os.getenv('HTTP_RETRY_ATTEMPTS', '4'))
+HTTP_RETRY_BASE = float(os.getenv('HTTP_RETRY_BASE', '0.25'))
+HTTP_RETRY_CAP = float(os.getenv('HTTP_RETRY_CAP', '8'))
+HTTP_ATTEMPT_TIMEOUT = float(os.getenv('HTTP_ATTEMPT_TIMEOUT', '15'))
+HTTP_RETRY_BUDGET = float(os.getenv('HTTP_RETRY_BUDGET', '60'))
+# Seconds before a duplicate (hedged) GET is sent; 0 disables hedging
+HTTP_HEDGE_AFTER = float(os.getenv('HTTP_HEDGE_AFTER', '0'))
+
+RETRYABLE_STATUS = frozenset({429, 500, 502, 503, 504})
+IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'})
+
+class RetryPolicy:
+    """How a provider's requests are retried.
+
+    Waits use exponential backoff with full jitter (``base * 2**attempt``
+    capped at ``cap``) unless the provider sent Retry-After. Each attempt
+    gets ``attempt_timeout`` seconds, and all attempts and waits together
+    must fit in ``budget`` seconds.
+    """
+
+    def __init__(self, attempts: int = HTTP_RETRY_ATTEMPTS, base: float = HTTP_RETRY_BASE,
+                 cap: float = HTTP_RETRY_CAP, attempt_timeout: float = HTTP_ATTEMPT_TIMEOUT,
+                 budget: float = HTTP_RETRY_BUDGET, hedge_after: float = HTTP_HEDGE_AFTER):
+        self.attempts = attempts
+        self.base = base
+        self.cap = cap
+        self.attempt_timeout = attempt_timeout
+        self.budget = budget
+        self.hedge_after = hedge_after
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.cap, self.base * (2 ** attempt)))
+
+def retry_after(response: httpx.Response) -> Optional[float]:
+    """Seconds requested by a Retry-After header (delta-seconds or HTTP-date)."""
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+def is_idempotent(request: httpx.Request) -> bool:
+    """Safe to send twice. POSTs qualify only when marked, e.g. read-only search calls."""
+    return request.method in IDEMPOTENT_METHODS or bool(request.extensions.get('idempotent'))
+
+class RetryTransport(httpx.AsyncBaseTransport):
+    """Retries transient failures of idempotent requests under a RetryPolicy.
+
+    Retried: connection errors, timeouts and 429/5xx responses. The last
+    response is returned unchanged once attempts or budget run out, so
+    callers keep their own status handling. The number of attempts made is
+    reported in ``response.extensions['attempts']``.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, policy: RetryPolicy):
+        self.transport = transport
+        self.policy = policy
+
+    async def _attempt(self, request: httpx.Request, timeout: float) -> httpx.Response:
+        try:
+            async with asyncio.timeout(timeout):
+                return await self.transport.handle_async_request(request)
+        except TimeoutError:
+            raise httpx.ReadTimeout(f"Attempt timed out after {timeout:.1f}s", request=request)
+
+    async def _hedged(self, request: httpx.Request, timeout: float) -> httpx.Response:
+        """Send a second copy if the first has not answered after ``hedge_after``; first good answer wins."""
+        tasks = [asyncio.create_task(self._attempt(request, timeout))]
+        pending = set(tasks)
+        chosen = None
+        try:
+            done, pending = await asyncio.wait(pending, timeout=self.policy.hedge_after)
+            if done:
+                chosen = tasks[0].result()
+                return chosen
+
+            tasks.append(asyncio.create_task(self._attempt(request, timeout)))
+            pending = {tasks[0], tasks[1]}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None and task.result().status_code not in RETRYABLE_STATUS:
+                        chosen = task.result()
+                        return chosen
+            # Neither copy got a good answer: hand back a retryable response
+            # (so Retry-After is honoured) or, failing that, the last error
+            for task in tasks:
+                if task.exception() is None:
+                    chosen = task.result()
+                    return chosen
+            raise tasks[-1].exception()
+        finally:
+            for task in pending:
+                task.cancel()
+            for task in tasks:
+                try:
+                    response = await task
+                except BaseException:
+                    continue
+                if response is not chosen:
+                    await response.aclose()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        policy = self.policy
+        retryable = is_idempotent(request)
+        hedge = retryable and policy.hedge_after > 0 and request.method == 'GET'
+        deadline = time.monotonic() + policy.budget
+        attempt = 0
+
+        while True:
+            attempt += 1
+            remaining = deadline - time.monotonic()
+            timeout = max(0.001, min(policy.attempt_timeout, remaining))
+            try:
+                if hedge:
+                    response = await self._hedged(request, timeout)
+                else:
+                    response = await self._attempt(request, timeout)
+            except httpx.TransportError as e:
+                if not retryable or attempt >= policy.attempts:
+                    raise
+                delay = policy.backoff(attempt - 1)
+                if time.monotonic() + delay >= deadline:
+                    raise
+                logger.info("Retrying %s %s after %s (attempt %d, waiting %.2fs)",
+                            request.method, request.url.host, type(e).__name__, attempt, delay)
+                await asyncio.sleep(delay)
+                continue
+
+            if (response.status_code not in RETRYABLE_STATUS or not retryable
+                    or attempt >= policy.attempts):
+                response.extensions['attempts'] = attempt
+                return response
+
+            delay = retry_after(response)
+            if delay is None:
+                delay = policy.backoff(attempt - 1)
+            if time.monotonic() + delay >= deadline:
+                response.extensions['attempts'] = attempt
+                return response
+
+            await response.aclose()
+            logger.info("Retrying %s %s after HTTP %d (attempt %d, waiting %.2fs)",
+                        request.method, request.url.host, response.status_code, attempt, delay)
+            await asyncio.sleep(delay)
+
+    async def aclose(self):
+        await self.transport.aclose()
@@ -3,10 +3,13 @@ import secrets
 import os
 from fastapi import Request, HTTPException
 from fastapi.responses import HTMLResponse
-import httpx
+from integrations.http_clients import get_client
 import asyncio
+from datetime import datetime
+from typing import AsyncIterator, Optional
 from dotenv import load_dotenv
 from integrations.integration_item import IntegrationItem
+from integrations.pagination import merge_streams, collect
 from redis_client import add_key_value_redis, get_value_redis, delete_key_redis
 
 load_dotenv()
@@ -15,6 +18,10 @@ CLIENT_ID = os.getenv('SLACK_CLIENT_ID')
 CLIENT_SECRET = os.getenv('SLACK_CLIENT_SECRET')
 REDIRECT_URI = os.getenv('SLACK_REDIRECT_URI')
 AUTHORIZATION_URL = 'https://slack.com/oauth/v2/authorize'
+API_URL = 'https://slack.com/api'
+
+# Largest page conversations.list accepts
+PAGE_SIZE = 1000
 
 async def authorize_slack(user_id, org_id):
     state = secrets.token_urlsafe(32)
@@ -24,9 +31,9 @@ async def authorize_slack(user_id, org_id):
         'org_id': org_id
     }
     encoded_state = json.dumps(state_data)
-    await add_key_value_redis(f'slack_state:{org_id}:{user_id}', encoded_state, expire=600)
+    await add_key_value_redis(f'slack_state:{state}', encoded_state, expire=600)
     
-    scope = 'channels:read,chat:write,team:read,users:read'
+    scope = 'channels:read,groups:read,chat:write,team:read,users:read,users:read.email'
     auth_url = f'{AUTHORIZATION_URL}?client_id={CLIENT_ID}&scope={scope}&redirect_uri={REDIRECT_URI}&state={state}'
     return auth_url
 
@@ -36,28 +43,30 @@ async def oauth2callback_slack(request: Request):
     
     code = request.query_params.get('code')
     state = request.query_params.get('state')
-    state_data = json.loads(state)
+    if not state or not code:
+        raise HTTPException(status_code=400, detail='Missing required parameters')
+
+    saved_state = await get_value_redis(f'slack_state:{state}')
+    if not saved_state:
+        raise HTTPException(status_code=400, detail='State does not match.')
 
+    state_data = json.loads(saved_state)
     user_id = state_data.get('user_id')
     org_id = state_data.get('org_id')
 
-    saved_state = await get_value_redis(f'slack_state:{org_id}:{user_id}')
-    if not saved_state or state != json.loads(saved_state).get('state'):
-        raise HTTPException(status_code=400, detail='State does not match.')
-
-    async with httpx.AsyncClient() as client:
-        response, _ = await asyncio.gather(
-            client.post(
-                'https://slack.com/api/oauth.v2.access',
-                data={
-                    'code': code,
-                    'client_id': CLIENT_ID,
-                    'client_secret': CLIENT_SECRET,
-                    'redirect_uri': REDIRECT_URI
-                }
-            ),
-            delete_key_redis(f'slack_state:{org_id}:{user_id}'),
-        )
+    client = get_client('slack')
+    response, _ = await asyncio.gather(
+        client.post(
+            'https://slack.com/api/oauth.v2.access',
+            data={
+                'code': code,
+                'client_id': CLIENT_ID,
+                'client_secret': CLIENT_SECRET,
+                'redirect_uri': REDIRECT_URI
+            }
+        ),
+        delete_key_redis(f'slack_state:{state}'),
+    )
 
     await add_key_value_redis(f'slack_credentials:{org_id}:{user_id}', json.dumps(response.json()), expire=600)
     
@@ -86,34 +95,92 @@ async def get_slack_credentials(user_id, org_id):
     credentials = await get_value_redis(f'slack_credentials:{org_id}:{user_id}')
     if not credentials:
         raise HTTPException(status_code=400, detail='No credentials found.')
-    credentials = json.loads(credentials)
-    await delete_key_redis(f'slack_credentials:{org_id}:{user_id}')
-    return credentials
+    return json.loads(credentials)
+
+async def _slack_get(method: str, headers: dict, params: dict) -> dict:
+    """Call a Slack Web API method (the shared client retries 429s after Retry-After)."""
+    client = get_client('slack')
+    response = await client.get(f'{API_URL}/{method}', headers=headers, params=params)
+    if response.status_code == 429:
+        raise HTTPException(status_code=429, detail=f'Slack {method} is rate limited')
+    if response.status_code != 200:
+        raise HTTPException(status_code=400, detail=f'Failed to fetch Slack {method}')
+    data = response.json()
+    if not data.get('ok'):
+        raise HTTPException(status_code=400, detail=f"Slack {method} failed: {data.get('error')}")
+    return data
+
+async def _paginate(method: str, key: str, headers: dict, params: dict) -> AsyncIterator[dict]:
+    """Follow response_metadata.next_cursor through every page of a list method."""
+    params = {**params, 'limit': PAGE_SIZE}
+    while True:
+        data = await _slack_get(method, headers, params)
+        for entry in data.get(key, []):
+            yield entry
+        cursor = (data.get('response_metadata') or {}).get('next_cursor')
+        if not cursor:
+            break
+        params['cursor'] = cursor
+
+def _since_epoch(since) -> Optional[float]:
+    if since is None:
+        return None
+    if not isinstance(since, datetime):
+        since = datetime.fromisoformat(str(since).replace('Z', '+00:00'))
+    return since.timestamp()
 
-async def get_items_slack(credentials) -> list[IntegrationItem]:
-    credentials = json.loads(credentials)
+async def _channels(headers: dict, channel_type: str, since: Optional[float]) -> AsyncIterator[IntegrationItem]:
+    params = {'types': channel_type, 'exclude_archived': 'true'}
+    async for channel in _paginate('conversations.list', 'channels', headers, params):
+        # Channel ``updated`` is in milliseconds
+        if since and (channel.get('updated') or 0) / 1000 < since:
+            continue
+        yield IntegrationItem(
+            id=channel['id'],
+            type='channel',
+            name=channel['name'],
+            creation_time=channel.get('created'),
+            visibility=not channel.get('is_private', False),
+            source='slack'
+        )
+
+async def _users(headers: dict, since: Optional[float]) -> AsyncIterator[IntegrationItem]:
+    async for user in _paginate('users.list', 'members', headers, {}):
+        if user.get('deleted'):
+            continue
+        # User ``updated`` is in seconds
+        if since and (user.get('updated') or 0) < since:
+            continue
+        profile = user.get('profile') or {}
+        yield IntegrationItem(
+            id=user['id'],
+            type='user',
+            name=profile.get('real_name') or user.get('name', 'Unnamed User'),
+            email=profile.get('email'),
+            source='slack'
+        )
+
+async def stream_items_slack(credentials, since=None) -> AsyncIterator[IntegrationItem]:
+    """Yield public channels, private channels and users as their pages arrive.
+
+    Slack's list methods cannot filter by modification time, so with
+    ``since`` the lists are still paged but only objects whose ``updated``
+    time is at or after it are yielded (and stored).
+    """
+    credentials = json.loads(credentials) if isinstance(credentials, str) else credentials
     access_token = credentials.get('access_token')
-    
+
     if not access_token:
         raise HTTPException(status_code=400, detail='Invalid credentials')
 
-    async with httpx.AsyncClient() as client:
-        response = await client.get(
-            'https://slack.com/api/conversations.list',
-            headers={'Authorization': f'Bearer {access_token}'}
-        )
-        
-        if response.status_code != 200:
-            raise HTTPException(status_code=400, detail='Failed to fetch Slack channels')
-
-        channels = response.json().get('channels', [])
-        return [
-            IntegrationItem(
-                id=channel['id'],
-                type='channel',
-                name=channel['name'],
-                creation_time=channel.get('created'),
-                visibility=not channel['is_private']
-            )
-            for channel in channels
-        ]
+    since = _since_epoch(since)
+    headers = {'Authorization': f'Bearer {access_token}'}
+    async for item in merge_streams(
+        _channels(headers, 'public_channel', since),
+        _channels(headers, 'private_channel', since),
+        _users(headers, since),
+    ):
+        yield item
+
+async def get_items_slack(credentials, since=None) -> list[IntegrationItem]:
+    return await collect(stream_items_slack(credentials, since))
@@ -0,0 +1,75 @@
+import logging
+from contextlib import aclosing
+from typing import AsyncIterator, Optional
+from fastapi.responses import StreamingResponse
+from integrations.integration_item import IntegrationItem, dumps, encode_item
+
+logger = logging.getLogger(__name__)
+
+# Encoded items are sent in chunks of about this many bytes
+CHUNK_SIZE = 64 * 1024
+
+_END = object()
+
+async def _body(head: bytes, first, items: AsyncIterator[IntegrationItem]) -> AsyncIterator[bytes]:
+    buffer = bytearray(head)
+    try:
+        async with aclosing(items):
+            if first is not _END:
+                buffer += encode_item(first)
+                # Send the envelope and first item straight away
+                yield bytes(buffer)
+                buffer.clear()
+                async for item in items:
+                    buffer += b','
+                    buffer += encode_item(item)
+                    if len(buffer) >= CHUNK_SIZE:
+                        yield bytes(buffer)
+                        buffer.clear()
+        buffer += b']}'
+    except Exception as e:
+        # The status line has already gone out, so close the array and
+        # report the failure in the body instead
+        logger.exception("Error streaming workspace items")
+        buffer += b'],"error":' + dumps(str(e)) + b'}'
+    yield bytes(buffer)
+
+def _head(envelope: dict) -> bytes:
+    return dumps(envelope)[:-1] + (b',"workspace":[' if envelope else b'"workspace":[')
+
+async def encode_workspace(envelope: dict, items: AsyncIterator[IntegrationItem],
+                           max_bytes: Optional[int] = None) -> Optional[bytes]:
+    """Encode ``envelope`` with ``items`` as its ``workspace`` array into one body.
+
+    Returns None as soon as the body would exceed ``max_bytes``; the caller
+    should stream such workspaces with ``workspace_response`` instead.
+    """
+    head = _head(envelope)
+    parts = []
+    size = len(head) + 2
+    async with aclosing(items):
+        async for item in items:
+            encoded = encode_item(item)
+            size += len(encoded) + 1
+            if max_bytes is not None and size > max_bytes:
+                return None
+            parts.append(encoded)
+    return head + b','.join(parts) + b']}'
+
+async def workspace_response(envelope: dict, items: AsyncIterator[IntegrationItem]) -> StreamingResponse:
+    """Stream ``envelope`` with ``items`` as its ``workspace`` array.
+
+    Items are encoded one at a time as ``items`` yields them (a provider
+    crawl or a Cassandra read of stored items), so the first bytes reach the
+    client before the last page is fetched and memory stays flat however
+    large the workspace. /status uses this for workspaces too large for the
+    status cache. The first item is awaited before the response starts:
+    credential and other up-front errors still propagate to the caller,
+    which can turn them into a normal error response.
+    """
+    try:
+        first = await anext(items, _END)
+    except BaseException:
+        await items.aclose()
+        raise
+    return StreamingResponse(_body(_head(envelope), first, items), media_type='application/json')
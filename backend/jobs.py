@@ -0,0 +1,376 @@
+"""Background jobs: a Redis-backed queue drained by an asyncio worker pool.
+
+A job is a Redis hash (``job:<id>``) holding its kind, parameters, status
+and progress. Job ids are pushed onto one Redis list, and every API worker
+process runs ``JOB_WORKERS`` coroutines that move ids from it into that
+process's own processing list (BLMOVE). So a job runs once, in whichever
+process is free, and stays on record while it runs. Handlers are registered
+per kind with ``@job_handler``.
+
+Each process keeps a heartbeat key alive and renews the duplicate-suppression
+locks of the jobs it is running. A reaper in every process watches the
+others: when a process's heartbeat expires, its processing list is drained
+back onto the queue (or the jobs are failed after ``JOB_MAX_ATTEMPTS``), and
+their locks go with them, so a crashed worker never strands a job as
+``running``. A job that runs longer than ``JOB_TIMEOUT`` is cancelled and
+failed.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from fastapi import HTTPException
+from redis_client import redis_client, execute_redis
+from tracing import start_span, current_traceparent
+
+# Jobs run concurrently by each process
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '4'))
+# Seconds a finished job stays pollable
+JOB_TTL = int(os.getenv('JOB_TTL', '86400'))
+# Seconds a duplicate-suppression lock lives without renewal; renewed by the
+# heartbeat while the job runs
+JOB_LOCK_TTL = int(os.getenv('JOB_LOCK_TTL', '120'))
+# Seconds a worker process's heartbeat lives; its jobs are reaped after that
+JOB_LEASE_TTL = int(os.getenv('JOB_LEASE_TTL', '30'))
+# Times a job is re-queued after losing its worker before it is failed
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '3'))
+# Seconds a job may run before it is cancelled and failed
+JOB_TIMEOUT = float(os.getenv('JOB_TIMEOUT', '1800'))
+# Minimum seconds between progress writes
+JOB_PROGRESS_INTERVAL = float(os.getenv('JOB_PROGRESS_INTERVAL', '1'))
+# Seconds between status reads while waiting for a job
+JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', '0.5'))
+
+logger = logging.getLogger(__name__)
+
+QUEUE_KEY = "jobs:queue"
+# Set of worker process ids that may own a processing list
+WORKERS_KEY = "jobs:workers"
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+# Delete the lock only if it still belongs to this job
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# Extend the lock only if it still belongs to this job
+RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# Drain a dead worker's processing list (KEYS: workers set, queue; ARGV:
+# worker id, max attempts, lock ttl, now). Atomic, so a job is re-queued by
+# exactly one reaper; does nothing if the worker's heartbeat is back.
+REAP_SCRIPT = """
+local worker = ARGV[1]
+if redis.call('EXISTS', 'jobs:heartbeat:' .. worker) == 1 then
+    return 0
+end
+local processing = 'jobs:processing:' .. worker
+local reaped = 0
+while true do
+    local job_id = redis.call('RPOP', processing)
+    if not job_id then
+        break
+    end
+    local key = 'job:' .. job_id
+    if redis.call('EXISTS', key) == 1 then
+        local lock = redis.call('HGET', key, 'lock')
+        local owned = lock and redis.call('GET', lock) == job_id
+        if redis.call('HINCRBY', key, 'attempts', 1) < tonumber(ARGV[2]) then
+            redis.call('HSET', key, 'status', 'queued', 'items', 0)
+            redis.call('RPUSH', KEYS[2], job_id)
+            if owned then
+                redis.call('EXPIRE', lock, ARGV[3])
+            end
+        else
+            redis.call('HSET', key, 'status', 'failed', 'error', 'Worker lost', 'finished_at', ARGV[4])
+            if owned then
+                redis.call('DEL', lock)
+            end
+        end
+        reaped = reaped + 1
+    end
+end
+redis.call('SREM', KEYS[1], worker)
+return reaped
+"""
+
+_release = redis_client.register_script(RELEASE_SCRIPT)
+_renew = redis_client.register_script(RENEW_SCRIPT)
+_reap = redis_client.register_script(REAP_SCRIPT)
+
+Report = Callable[[int], Awaitable[None]]
+Handler = Callable[[Dict[str, Any], Report], Awaitable[Optional[dict]]]
+
+JOB_HANDLERS: Dict[str, Handler] = {}
+
+def job_handler(kind: str):
+    """Register ``handler(params, report)`` for jobs of ``kind``.
+
+    ``report(count)`` records how many items the job has processed so far.
+    Whatever the handler returns is stored as the job's result.
+    """
+    def register(handler: Handler) -> Handler:
+        JOB_HANDLERS[kind] = handler
+        return handler
+    return register
+
+def _job_key(job_id: str) -> str:
+    return f"job:{job_id}"
+
+def _lock_key(kind: str, dedupe_key: str) -> str:
+    return f"job_lock:{kind}:{dedupe_key}"
+
+def _processing_key(worker_id: str) -> str:
+    return f"jobs:processing:{worker_id}"
+
+def _heartbeat_key(worker_id: str) -> str:
+    return f"jobs:heartbeat:{worker_id}"
+
+async def _update(job_id: str, **fields):
+    await execute_redis("hset", redis_client.hset, _job_key(job_id), mapping=fields)
+
+async def enqueue_job(kind: str, dedupe_key: str, **params) -> Tuple[str, bool]:
+    """Queue a job unless one with the same kind and ``dedupe_key`` is already
+    queued or running.
+
+    Returns ``(job_id, created)``; ``created`` is False when the request was
+    folded into the existing job.
+    """
+    lock = _lock_key(kind, dedupe_key)
+    for _ in range(3):
+        job_id = uuid.uuid4().hex
+        if await execute_redis("set", redis_client.set, lock, job_id, nx=True, ex=JOB_LOCK_TTL):
+            break
+        existing = await execute_redis("get", redis_client.get, lock)
+        if existing:
+            return existing, False
+        # The lock expired between SET and GET; try again
+    else:
+        raise HTTPException(status_code=503, detail="Could not queue job")
+
+    pipe = redis_client.pipeline(transaction=True)
+    pipe.hset(_job_key(job_id), mapping={
+        "id": job_id,
+        "kind": kind,
+        "lock": lock,
+        "params": json.dumps(params),
+        "status": QUEUED,
+        "items": 0,
+        "created_at": time.time(),
+        # The worker's spans continue the trace of the request that queued it
+        "traceparent": current_traceparent() or "",
+    })
+    pipe.expire(_job_key(job_id), JOB_TTL)
+    pipe.lpush(QUEUE_KEY, job_id)
+    await execute_redis("enqueue", pipe.execute)
+    return job_id, True
+
+async def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """Current state of a job, or None if it is unknown or expired."""
+    data = await execute_redis("hgetall", redis_client.hgetall, _job_key(job_id))
+    if not data:
+        return None
+    job = {
+        "id": data["id"],
+        "kind": data["kind"],
+        "status": data["status"],
+        "params": json.loads(data.get("params") or "{}"),
+        "items": int(data.get("items") or 0),
+        "created_at": float(data["created_at"]),
+    }
+    for field in ("started_at", "finished_at"):
+        if data.get(field):
+            job[field] = float(data[field])
+    if data.get("result"):
+        job["result"] = json.loads(data["result"])
+    if data.get("error"):
+        job["error"] = data["error"]
+    return job
+
+async def wait_for_job(job_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+    """Poll a job until it succeeds or fails and return its final state.
+
+    Raises TimeoutError after ``timeout`` seconds; the job itself keeps
+    running and can still be polled.
+    """
+    async with asyncio.timeout(timeout):
+        while True:
+            job = await get_job(job_id)
+            if job is None or job["status"] in (SUCCEEDED, FAILED):
+                return job
+            await asyncio.sleep(JOB_POLL_INTERVAL)
+
+class JobWorkerPool:
+    """``concurrency`` coroutines taking job ids from the shared queue, plus
+    this process's heartbeat and a reaper for other processes' jobs."""
+
+    def __init__(self, concurrency: int = JOB_WORKERS, lease_ttl: int = JOB_LEASE_TTL,
+                 timeout: float = JOB_TIMEOUT):
+        self.concurrency = concurrency
+        self.lease_ttl = lease_ttl
+        self.timeout = timeout
+        self.worker_id = uuid.uuid4().hex
+        self.processing_key = _processing_key(self.worker_id)
+        # job id -> lock key of the jobs this process is running
+        self._running: Dict[str, str] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._background: List[asyncio.Task] = []
+        # Set once this process is listed in WORKERS_KEY, so the reaper can
+        # find every job it takes
+        self._registered = asyncio.Event()
+
+    def start(self):
+        if not self._tasks:
+            self._background = [asyncio.create_task(self._heartbeat()), asyncio.create_task(self._reaper())]
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def stop(self):
+        # Workers first: cancelled jobs go back on the queue
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        background, self._background = self._background, []
+        for task in background:
+            task.cancel()
+        await asyncio.gather(*background, return_exceptions=True)
+        if tasks:
+            pipe = redis_client.pipeline(transaction=True)
+            pipe.srem(WORKERS_KEY, self.worker_id)
+            pipe.delete(_heartbeat_key(self.worker_id), self.processing_key)
+            try:
+                await execute_redis("job_worker_stop", pipe.execute)
+            except HTTPException:
+                pass
+
+    async def _beat(self):
+        pipe = redis_client.pipeline(transaction=True)
+        pipe.sadd(WORKERS_KEY, self.worker_id)
+        pipe.set(_heartbeat_key(self.worker_id), "1", ex=self.lease_ttl)
+        await execute_redis("job_heartbeat", pipe.execute)
+        self._registered.set()
+        for job_id, lock in list(self._running.items()):
+            await execute_redis("renew", _renew, keys=[lock], args=[job_id, JOB_LOCK_TTL])
+
+    async def _heartbeat(self):
+        while True:
+            try:
+                await self._beat()
+            except HTTPException as e:
+                logger.warning("Job heartbeat failed: %s", e.detail)
+            await asyncio.sleep(self.lease_ttl / 3)
+
+    async def reap(self) -> int:
+        """Re-queue or fail the jobs of worker processes whose heartbeat expired."""
+        reaped = 0
+        workers = await execute_redis("smembers", redis_client.smembers, WORKERS_KEY)
+        for worker_id in workers:
+            if worker_id == self.worker_id:
+                continue
+            count = await execute_redis(
+                "reap", _reap, keys=[WORKERS_KEY, QUEUE_KEY],
+                args=[worker_id, JOB_MAX_ATTEMPTS, JOB_LOCK_TTL, time.time()],
+            )
+            if count:
+                logger.warning("Recovered %d job(s) from lost worker %s", count, worker_id)
+            reaped += count
+        return reaped
+
+    async def _reaper(self):
+        while True:
+            await asyncio.sleep(self.lease_ttl)
+            try:
+                await self.reap()
+            except HTTPException as e:
+                logger.warning("Job reaper failed: %s", e.detail)
+
+    async def _worker(self):
+        await self._registered.wait()
+        while True:
+            try:
+                job_id = await execute_redis(
+                    "blmove", redis_client.blmove, QUEUE_KEY, self.processing_key, 1, "RIGHT", "LEFT"
+                )
+            except HTTPException:
+                # Redis is down; the breaker decides when to try again
+                await asyncio.sleep(1)
+                continue
+            if not job_id:
+                continue
+            try:
+                await self._run(job_id)
+            except HTTPException as e:
+                # Lost Redis while recording the outcome; the lock's TTL
+                # eventually lets the job be requested again
+                logger.error("Job %s bookkeeping failed: %s", job_id, e.detail)
+
+    async def _finish(self, job_id: str, **fields):
+        pipe = redis_client.pipeline(transaction=True)
+        pipe.hset(_job_key(job_id), mapping=fields)
+        pipe.lrem(self.processing_key, 1, job_id)
+        await execute_redis("job_finish", pipe.execute)
+
+    async def _run(self, job_id: str):
+        data = await execute_redis("hgetall", redis_client.hgetall, _job_key(job_id))
+        if not data:
+            await execute_redis("lrem", redis_client.lrem, self.processing_key, 1, job_id)
+            return
+        handler = JOB_HANDLERS.get(data["kind"])
+        lock = data.get("lock")
+        progress = {"items": 0, "written": 0.0}
+
+        async def report(count: int):
+            progress["items"] = count
+            now = time.monotonic()
+            if now - progress["written"] >= JOB_PROGRESS_INTERVAL:
+                progress["written"] = now
+                await _update(job_id, items=count)
+
+        if lock:
+            self._running[job_id] = lock
+        try:
+            with start_span(f"job {data['kind']}", data.get("traceparent") or None, job_id=job_id):
+                if handler is None:
+                    raise ValueError(f"No handler for job kind {data['kind']}")
+                await _update(job_id, status=RUNNING, started_at=time.time())
+                result = await asyncio.wait_for(handler(json.loads(data["params"]), report), self.timeout)
+        except asyncio.CancelledError:
+            # Shutting down: put the job back so another process picks it up
+            pipe = redis_client.pipeline(transaction=True)
+            pipe.hset(_job_key(job_id), mapping={"status": QUEUED, "items": 0})
+            pipe.lrem(self.processing_key, 1, job_id)
+            pipe.rpush(QUEUE_KEY, job_id)
+            await execute_redis("requeue", pipe.execute)
+            raise
+        except asyncio.TimeoutError:
+            logger.error("Job %s (%s) timed out after %gs", job_id, data['kind'], self.timeout)
+            await self._finish(job_id, status=FAILED, error=f"Timed out after {self.timeout:g}s",
+                               items=progress["items"], finished_at=time.time())
+        except Exception as e:
+            logger.exception("Job %s (%s) failed", job_id, data['kind'])
+            await self._finish(job_id, status=FAILED, error=str(e), items=progress["items"],
+                               finished_at=time.time())
+        else:
+            await self._finish(job_id, status=SUCCEEDED, items=progress["items"],
+                               result=json.dumps(result or {}), finished_at=time.time())
+        finally:
+            self._running.pop(job_id, None)
+        if lock:
+            await execute_redis("release", _release, keys=[lock], args=[job_id])
+
+job_workers = JobWorkerPool()
@@ -0,0 +1,197 @@
+"""Logging for the backend: queue handoff, sampling, redaction, JSON lines.
+
+``setup_logging`` puts a single ``QueueHandler`` on the root logger. Logging
+a record on the request path is then a level check, an optional sampling
+draw and an append to an in-memory queue. Formatting, redaction and the
+blocking write to stderr all happen on the ``QueueListener`` thread.
+
+Modules log through ``logging.getLogger(__name__)`` as usual. Records are
+not formatted before they are queued, so pass values as arguments
+(``logger.info("Syncing %s", provider)``) rather than pre-built f-strings,
+and do not mutate an argument after logging it.
+
+Configuration (environment):
+
+- ``LOG_LEVEL``: root level (default INFO).
+- ``LOG_FORMAT``: ``json`` (default) or ``text``.
+- ``LOG_SAMPLE_RATES``: comma-separated ``logger=rate`` pairs, e.g.
+  ``access=0.1,routes.integrations=0.5``. Records from those loggers (and
+  their children) below WARNING are kept with that probability. Kept records
+  carry ``sample_rate`` so counts can be scaled back up.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')
+LOG_SAMPLE_RATES = os.getenv('LOG_SAMPLE_RATES', '')
+
+REDACTED = "[REDACTED]"
+
+# Keys whose values are never logged, wherever they appear
+SECRET_KEY_PATTERN = re.compile(
+    r'pass(word)?|secret|token|authorization|api[_-]?key|credential|cookie|code_verifier',
+    re.IGNORECASE,
+)
+# Secrets embedded in free text: key=value / "key": "value" pairs, bearer
+# credentials and anything shaped like a JWT
+SECRET_TEXT_PATTERNS = (
+    (re.compile(
+        r'''(?P<key>["']?[\w-]*(?:password|secret|token|api[_-]?key|code_verifier)["']?\s*[:=]\s*)'''
+        r'''(?P<quote>["']?)[^"'\s,&}]+''',
+        re.IGNORECASE,
+    ), r'\g<key>\g<quote>' + REDACTED),
+    (re.compile(r'(Bearer|Basic)\s+[\w\-.~+/]+=*', re.IGNORECASE), r'\1 ' + REDACTED),
+    (re.compile(r'eyJ[\w-]+\.[\w-]+\.[\w-]+'), REDACTED),
+)
+
+# Attributes every LogRecord has; anything else came in through ``extra``
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+def redact_text(text: str) -> str:
+    for pattern, replacement in SECRET_TEXT_PATTERNS:
+        text = pattern.sub(replacement, text)
+    return text
+
+def redact(value: Any) -> Any:
+    """Copy of ``value`` with secret-looking keys and substrings masked."""
+    if isinstance(value, str):
+        return redact_text(value)
+    if isinstance(value, dict):
+        return {
+            key: REDACTED if isinstance(key, str) and SECRET_KEY_PATTERN.search(key) else redact(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return type(value)(redact(item) for item in value)
+    return value
+
+def _extras(record: logging.LogRecord) -> Dict[str, Any]:
+    return {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRS}
+
+class RedactingFilter(logging.Filter):
+    """Resolve the message and mask secrets in it, its extras and tracebacks.
+
+    Attached to the output handler, so it runs on the listener thread.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.msg = redact_text(record.getMessage())
+        record.args = None
+        for key, value in _extras(record).items():
+            setattr(record, key, REDACTED if SECRET_KEY_PATTERN.search(key) else redact(value))
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        if record.exc_text:
+            record.exc_text = redact_text(record.exc_text)
+        record.exc_info = None
+        return True
+
+class SamplingFilter(logging.Filter):
+    """Keep a fraction of sub-WARNING records from high-volume loggers."""
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self._resolved: Dict[str, Optional[float]] = {}
+
+    def _rate(self, name: str) -> Optional[float]:
+        if name not in self._resolved:
+            rate, prefix = None, name
+            while prefix:
+                if prefix in self.rates:
+                    rate = self.rates[prefix]
+                    break
+                prefix = prefix.rpartition('.')[0]
+            self._resolved[name] = rate
+        return self._resolved[name]
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self._rate(record.name)
+        if rate is None:
+            return True
+        if random.random() >= rate:
+            return False
+        record.sample_rate = rate
+        return True
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, extras, traceback."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(_extras(record))
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+class _QueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The queue never leaves the process, so skip the stock
+        # format-and-copy; the listener thread formats the record
+        return record
+
+def parse_sample_rates(value: str) -> Dict[str, float]:
+    rates = {}
+    for pair in filter(None, (part.strip() for part in value.split(','))):
+        name, _, rate = pair.partition('=')
+        try:
+            rates[name.strip()] = min(max(float(rate), 0.0), 1.0)
+        except ValueError:
+            continue
+    return rates
+
+_listener: Optional[QueueListener] = None
+
+def setup_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT, sample_rates: str = LOG_SAMPLE_RATES):
+    """Route all logging through the background queue (idempotent)."""
+    global _listener
+    if _listener is not None:
+        return
+    output = logging.StreamHandler(sys.stderr)
+    output.addFilter(RedactingFilter())
+    if fmt == 'json':
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+
+    records = queue.SimpleQueue()
+    handler = _QueueHandler(records)
+    rates = parse_sample_rates(sample_rates)
+    if rates:
+        handler.addFilter(SamplingFilter(rates))
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+    # Per-request client logging from httpx would drown everything else
+    logging.getLogger("httpx").setLevel(max(root.level, logging.WARNING))
+
+    _listener = QueueListener(records, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+def stop_logging():
+    """Flush queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -1,7 +1,10 @@
+from contextlib import asynccontextmanager
+import asyncio
 from fastapi import FastAPI, Form, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, RedirectResponse
+from fastapi.responses import JSONResponse, RedirectResponse, PlainTextResponse
 import json
+import logging
 
 from auth_routes import router as auth_router
 from twofa_routes import router as twofa_router
@@ -9,8 +12,41 @@ from routes.dashboard import router as dashboard_router
 from routes.profiles import router as profile_router
 from routes.integrations import router as integrations_router
 from integrations.google_auth import google_auth_url, google_auth_callback, get_google_user_info
+from redis_client import close_redis, start_redis_monitor, redis_health
+from cassandra_client import init_cassandra, shutdown_cassandra
+from integrations.http_clients import close_clients
+from status_cache import status_cache
+from jobs import job_workers
+from auth import start_revocation_listener, stop_revocation_listener
+from middleware import setup_middleware
+from logging_config import setup_logging
+from metrics import metrics_text, start_metrics, stop_metrics
+from tracing import configure_tracing, shutdown_tracing
 
-app = FastAPI()
+setup_logging()
+logger = logging.getLogger(__name__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    configure_tracing()
+    start_metrics()
+    start_redis_monitor()
+    # Connecting is blocking, so keep it off the event loop
+    await asyncio.to_thread(init_cassandra)
+    start_revocation_listener()
+    status_cache.start()
+    job_workers.start()
+    yield
+    await job_workers.stop()
+    await stop_revocation_listener()
+    await status_cache.close()
+    await close_clients()
+    await asyncio.to_thread(shutdown_cassandra)
+    await close_redis()
+    await stop_metrics()
+    shutdown_tracing()
+
+app = FastAPI(lifespan=lifespan)
 
 # Enable CORS for development
 origins = [
@@ -30,6 +66,9 @@ app.add_middleware(
     max_age=3600,
 )
 
+# Timing and access logging (pure ASGI, so streamed bodies pass straight through)
+setup_middleware(app)
+
 # Include routers with correct prefixes
 app.include_router(auth_router, prefix="/api/auth", tags=["authentication"])
 app.include_router(twofa_router, prefix="/api/auth", tags=["two-factor-authentication"])
@@ -40,7 +79,7 @@ app.include_router(integrations_router, prefix="/api/integrations", tags=["integ
 # Global error handler
 @app.exception_handler(Exception)
 async def generic_error_handler(request: Request, exc: Exception):
-    print(f"Error handling request {request.url}: {exc}")
+    logger.exception("Error handling %s %s", request.method, request.url.path, exc_info=exc)
     return JSONResponse(
         status_code=500,
         content={"message": str(exc)},
@@ -50,6 +89,15 @@ async def generic_error_handler(request: Request, exc: Exception):
 def read_root():
     return {'Ping': 'Pong'}
 
+@app.get('/metrics')
+async def metrics():
+    """Prometheus scrape endpoint; merges every worker's metrics."""
+    return PlainTextResponse(await metrics_text(), media_type="text/plain; version=0.0.4")
+
+@app.get('/health/redis')
+def redis_health_status():
+    return redis_health.snapshot()
+
 # Google Authentication
 @app.get('/auth/google/url')
 async def get_google_auth_url():
@@ -64,17 +112,9 @@ async def google_callback(request: Request):
             return RedirectResponse(url=result['frontend_redirect'])
         return result
     except Exception as e:
-        print(f"Google callback error: {e}")
+        logger.warning("Google callback error: %s", e)
         return RedirectResponse(url="http://localhost:3000/login?error=auth_failed")
 
 @app.get('/api/auth/google/user')
 async def get_user_info(token: str):
     return await get_google_user_info(token)
-
-# For debugging
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
-    print(f"\nRequest: {request.method} {request.url}")
-    response = await call_next(request)
-    print(f"Response: {response.status_code}")
-    return response
@@ -0,0 +1,270 @@
+"""In-process metrics with a Prometheus text endpoint.
+
+Counters and fixed-bucket histograms live in plain dicts keyed by label
+values, so recording is a dict lookup and an addition on the event loop with
+no locking. Each uvicorn worker periodically writes a JSON snapshot of its
+registry to ``METRICS_DIR``. ``/metrics`` is answered by whichever worker
+receives the scrape, which merges its live values with the other workers'
+snapshots (skipping and deleting those of processes that have exited).
+Everything exported is a sum, so merging is exact up to the flush interval.
+"""
+import asyncio
+import bisect
+import json
+import logging
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+METRICS_DIR = os.getenv('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'backend-metrics'))
+# Seconds between snapshot writes
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', '5'))
+# Seconds between event-loop lag samples
+LOOP_LAG_INTERVAL = float(os.getenv('LOOP_LAG_INTERVAL', '0.5'))
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+Labels = Tuple[str, ...]
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values: Dict[Labels, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def snapshot(self) -> list:
+        return [[list(labels), value] for labels, value in self.values.items()]
+
+    def merge(self, totals: Dict[Labels, float], snapshot: list):
+        for labels, value in snapshot:
+            labels = tuple(labels)
+            totals[labels] = totals.get(labels, 0.0) + value
+
+    def render(self, totals: Dict[Labels, float]) -> List[str]:
+        return [f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+                for labels, value in sorted(totals.items())]
+
+class Histogram:
+    """Cumulative-on-export histogram; buckets are per-bucket counts internally."""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [count per bucket..., count above the last bucket, sum]
+        self.values: Dict[Labels, List[float]] = {}
+
+    def observe(self, value: float, *labels: str):
+        series = self.values.get(labels)
+        if series is None:
+            series = self.values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    @contextmanager
+    def time(self, *labels: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def snapshot(self) -> list:
+        return [[list(labels), series] for labels, series in self.values.items()]
+
+    def merge(self, totals: Dict[Labels, List[float]], snapshot: list):
+        for labels, series in snapshot:
+            if len(series) != len(self.buckets) + 2:
+                continue  # written with different buckets
+            labels = tuple(labels)
+            total = totals.setdefault(labels, [0] * (len(self.buckets) + 1) + [0.0])
+            for i, value in enumerate(series):
+                total[i] += value
+
+    def render(self, totals: Dict[Labels, List[float]]) -> List[str]:
+        lines = []
+        for labels, series in sorted(totals.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), series):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _number(bound)
+                lines.append(f"{self.name}_bucket{_labels((*self.labelnames, 'le'), (*labels, le))} "
+                             f"{_number(cumulative)}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(series[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {_number(cumulative)}")
+        return lines
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)) + "}"
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+class Registry:
+    def __init__(self):
+        self.metrics: Dict[str, object] = {}
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def snapshot(self) -> dict:
+        return {name: metric.snapshot() for name, metric in self.metrics.items()}
+
+registry = Registry()
+
+def counter(name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+    return registry.register(Counter(name, documentation, labelnames))
+
+def histogram(name: str, documentation: str, labelnames: Iterable[str] = (),
+              buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+    return registry.register(Histogram(name, documentation, labelnames, buckets))
+
+HTTP_REQUEST_SECONDS = histogram(
+    "http_request_duration_seconds", "API request latency by route template.",
+    ("method", "route", "status"),
+)
+PROVIDER_REQUEST_SECONDS = histogram(
+    "provider_request_duration_seconds", "Provider API call latency, including retries.",
+    ("provider", "method", "status"),
+)
+PROVIDER_RATE_LIMIT_WAIT_SECONDS = histogram(
+    "provider_rate_limit_wait_seconds",
+    "Time each provider call attempt waited for its credential's rate-limit budget.",
+    ("provider",), buckets=(0, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+PROVIDER_SYNC_SECONDS = histogram(
+    "provider_sync_duration_seconds", "Duration of a provider crawl in a sync job.",
+    ("provider", "mode", "outcome"), buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800),
+)
+PROVIDER_SYNC_ITEMS = counter(
+    "provider_sync_items_total", "Items fetched from providers by sync jobs.", ("provider", "mode"),
+)
+REDIS_COMMAND_SECONDS = histogram(
+    "redis_command_duration_seconds", "Redis command latency.", ("operation", "outcome"),
+)
+CASSANDRA_QUERY_SECONDS = histogram(
+    "cassandra_query_duration_seconds", "Cassandra query latency by statement name.", ("query", "outcome"),
+)
+CACHE_REQUESTS = counter(
+    "cache_requests_total", "Cache lookups by cache and result (hit, stale, miss).", ("cache", "result"),
+)
+LOOP_LAG_SECONDS = histogram(
+    "event_loop_lag_seconds", "How late a periodic event-loop timer fired.", (), buckets=LAG_BUCKETS,
+)
+
+def _snapshot_path(pid: int) -> str:
+    return os.path.join(METRICS_DIR, f"{pid}.json")
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def _other_snapshots() -> List[dict]:
+    snapshots = []
+    try:
+        names = os.listdir(METRICS_DIR)
+    except FileNotFoundError:
+        return snapshots
+    for name in names:
+        pid_text, _, ext = name.partition(".")
+        if ext != "json" or not pid_text.isdigit() or int(pid_text) == os.getpid():
+            continue
+        path = os.path.join(METRICS_DIR, name)
+        if not _alive(int(pid_text)):
+            # A previous run or a restarted worker; its totals restart with it
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            continue
+        try:
+            with open(path) as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return snapshots
+
+def _render(others: List[dict]) -> str:
+    lines = []
+    for name, metric in registry.metrics.items():
+        totals: dict = {}
+        metric.merge(totals, metric.snapshot())
+        for snapshot in others:
+            metric.merge(totals, snapshot.get(name, []))
+        lines.append(f"# HELP {name} {metric.documentation}")
+        lines.append(f"# TYPE {name} {metric.kind}")
+        lines.extend(metric.render(totals))
+    return "\n".join(lines) + "\n"
+
+async def metrics_text() -> str:
+    """Prometheus text exposition of every worker's metrics."""
+    # File reads happen off the loop; the live registry is only read on it
+    others = await asyncio.to_thread(_other_snapshots)
+    return _render(others)
+
+async def _flush_loop():
+    while True:
+        await asyncio.sleep(METRICS_FLUSH_INTERVAL)
+        try:
+            snapshot = json.dumps(registry.snapshot())
+            await asyncio.to_thread(_write, snapshot)
+        except OSError as e:
+            logger.warning("Could not write metrics snapshot: %s", e)
+
+def _write(snapshot: str):
+    """Replace this worker's snapshot file (atomic rename)."""
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=METRICS_DIR, suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        f.write(snapshot)
+    os.replace(tmp, _snapshot_path(os.getpid()))
+
+async def _lag_loop():
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        LOOP_LAG_SECONDS.observe(max(0.0, loop.time() - started - LOOP_LAG_INTERVAL))
+
+_tasks: List[asyncio.Task] = []
+
+def start_metrics():
+    """Start the snapshot writer and loop-lag sampler (called on app startup)."""
+    if not _tasks:
+        _tasks.extend([asyncio.create_task(_flush_loop()), asyncio.create_task(_lag_loop())])
+
+async def stop_metrics():
+    tasks = list(_tasks)
+    _tasks.clear()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    try:
+        os.remove(_snapshot_path(os.getpid()))
+    except OSError:
+        pass
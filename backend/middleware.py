@@ -1,73 +1,180 @@
-from fastapi import Request, HTTPException
-from starlette.middleware.base import BaseHTTPMiddleware
+"""Pure-ASGI request middleware.
+
+Each class wraps the ASGI app directly and only looks at the
+``http.response.start`` / ``http.response.body`` messages as they pass, so
+bodies are never buffered and streaming responses go out chunk by chunk.
+Unlike ``BaseHTTPMiddleware`` there is no extra task or memory stream per
+request.
+"""
+import logging
+import time
+from fastapi import HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-import jwt
-from redis_client import get_value_redis
-import os
-
-class AuthMiddleware(BaseHTTPMiddleware):
-    def __init__(
-        self,
-        app,
-        exclude_paths=None
-    ):
-        super().__init__(app)
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from auth import authenticate
+from metrics import HTTP_REQUEST_SECONDS
+from tracing import start_span
+
+access_logger = logging.getLogger("access")
+
+class TimingMiddleware:
+    """Add ``Server-Timing: app;dur=<ms>`` (time until the response started)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                elapsed = (time.perf_counter() - started) * 1000
+                message["headers"] = [
+                    *message.get("headers", ()),
+                    (b"server-timing", f"app;dur={elapsed:.1f}".encode("latin-1")),
+                ]
+            await send(message)
+
+        await self.app(scope, receive, send_with_timing)
+
+class MetricsMiddleware:
+    """Observe request latency per route template (``/api/integrations/{provider}/status``
+    rather than the concrete path, so label cardinality stays bounded)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_and_record(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_and_record)
+        finally:
+            # The router stores the matched route in the scope
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - started, scope["method"],
+                getattr(route, "path", "<unmatched>"), str(status["code"]),
+            )
+
+class TracingMiddleware:
+    """Open the root span of each request, continuing an incoming ``traceparent``."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        traceparent = Headers(scope=scope).get("traceparent")
+        status = {"code": 500}
+
+        async def send_and_record(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        with start_span(f"HTTP {scope['method']}", traceparent, **{"http.method": scope["method"]}) as span:
+            try:
+                await self.app(scope, receive, send_and_record)
+            finally:
+                route = getattr(scope.get("route"), "path", None)
+                if route:
+                    span.name = f"HTTP {scope['method']} {route}"
+                span.set("http.route", route or scope["path"])
+                span.set("http.status_code", status["code"])
+
+class AccessLogMiddleware:
+    """Log one line per request once its last body chunk has been sent.
+
+    5xx responses are logged at WARNING so access-log sampling never drops them.
+    """
+
+    def __init__(self, app, logger: logging.Logger = access_logger):
+        self.app = app
+        self.logger = logger
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.logger.isEnabledFor(logging.INFO):
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        response = {"status": 500, "bytes": 0}
+
+        async def send_and_record(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                response["bytes"] += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_and_record)
+        finally:
+            duration_ms = (time.perf_counter() - started) * 1000
+            # Path only: query strings can carry tokens
+            self.logger.log(
+                logging.INFO if response["status"] < 500 else logging.WARNING,
+                '%s %s %d %dB %.1fms', scope["method"], scope["path"], response["status"],
+                response["bytes"], duration_ms,
+                extra={"method": scope["method"], "path": scope["path"], "status": response["status"],
+                       "bytes": response["bytes"], "duration_ms": round(duration_ms, 1)},
+            )
+
+class AuthMiddleware:
+    """Reject requests without a valid bearer token, except on ``exclude_paths``.
+
+    The authenticated session is stored as ``request.state.user``.
+    """
+
+    def __init__(self, app, exclude_paths=None):
+        self.app = app
         self.exclude_paths = exclude_paths or [
             "/auth/google/callback",
-            "/auth/login",
-            "/auth/signup",
-            "/auth/google/url",  # ✅ Add this line
+            "/auth/google/url",
+            "/api/auth/login",
+            "/api/auth/2fa/login",
+            "/api/auth/signup",
+            "/api/auth/forgot-password",
+            "/api/auth/reset-password",
             "/api/integrations/notion/oauth2callback",
             "/api/integrations/airtable/oauth2callback",
             "/api/integrations/slack/oauth2callback",
             "/api/integrations/hubspot/oauth2callback",
-            "/",
         ]
 
-    async def dispatch(self, request: Request, call_next):
-        # Skip auth for excluded paths
-        if any(request.url.path.startswith(path) for path in self.exclude_paths):
-            response = await call_next(request)
-            return response
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] != "http" or scope["method"] == "OPTIONS" or scope["path"] == "/"
+                or any(scope["path"].startswith(path) for path in self.exclude_paths)):
+            await self.app(scope, receive, send)
+            return
 
-        # Check for token
+        auth = Headers(scope=scope).get("authorization", "")
         try:
-            auth = request.headers.get('Authorization')
-            if not auth or not auth.startswith('Bearer '):
-                raise HTTPException(
-                    status_code=401,
-                    detail="Missing authentication token",
-                    headers={"WWW-Authenticate": "Bearer"},
-                )
-
-            token = auth.split(' ')[1]
-            user_data = await get_value_redis(f"user_token:{token}")
-
-            if not user_data:
-                raise HTTPException(
-                    status_code=401,
-                    detail="Invalid or expired token",
-                    headers={"WWW-Authenticate": "Bearer"},
-                )
-
-            # Add user data to request state
-            request.state.user = user_data
-
-        except jwt.ExpiredSignatureError:
-            raise HTTPException(
-                status_code=401,
-                detail="Token has expired",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        except jwt.InvalidTokenError:
-            raise HTTPException(
-                status_code=401,
-                detail="Invalid token",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-
-        response = await call_next(request)
-        return response
+            if not auth.startswith("Bearer "):
+                raise HTTPException(status_code=401, detail="Missing authentication token",
+                                    headers={"WWW-Authenticate": "Bearer"})
+            user = await authenticate(auth[len("Bearer "):])
+        except HTTPException as e:
+            response = JSONResponse({"detail": e.detail}, status_code=e.status_code, headers=e.headers)
+            await response(scope, receive, send)
+            return
+        scope.setdefault("state", {})["user"] = user
+        await self.app(scope, receive, send)
 
 def add_cors_middleware(app):
     """Add CORS middleware with configuration"""
@@ -92,7 +199,18 @@ def add_cors_middleware(app):
         max_age=3600,
     )
 
-def setup_middleware(app):
-    """Setup all middleware"""
-    add_cors_middleware(app)
-    app.add_middleware(AuthMiddleware)
+def setup_middleware(app, require_auth: bool = False):
+    """Install the request middleware stack.
+
+    Access logging is outermost so its timing covers everything else.
+    Routes authenticate through the ``auth.get_current_user`` dependency;
+    ``require_auth`` additionally rejects unauthenticated requests to every
+    path outside AuthMiddleware's exclusions.
+    """
+    # add_middleware wraps, so the last one added runs first
+    if require_auth:
+        app.add_middleware(AuthMiddleware)
+    app.add_middleware(TimingMiddleware)
+    app.add_middleware(TracingMiddleware)
+    app.add_middleware(MetricsMiddleware)
+    app.add_middleware(AccessLogMiddleware)
@@ -0,0 +1,167 @@
+from cassandra.cluster import Cluster
+from cassandra.auth import PlainTextAuthProvider
+from datetime import datetime, timezone
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Single-row table the API server reads at startup to check the schema
+SCHEMA_VERSION_TABLE = "schema_version"
+SCHEMA_SCOPE = "vectorshift"
+
+# Ordered, append-only list of (version, description, statements).
+# Never edit a migration that has shipped; add a new one instead.
+MIGRATIONS = [
+    (1, "initial schema", [
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            email text PRIMARY KEY,
+            password_hash text,
+            created_at timestamp
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS password_reset_tokens (
+            user_email text,
+            reset_token text,
+            created_at timestamp,
+            PRIMARY KEY (user_email, reset_token)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS user_credentials (
+            user_id text,
+            provider text,
+            access_token text,
+            refresh_token text,
+            expires_at timestamp,
+            created_at timestamp,
+            metadata map<text, text>,
+            PRIMARY KEY (user_id, provider)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS user_integrations (
+            user_id text,
+            provider text,
+            org_id text,
+            status text,
+            last_sync timestamp,
+            settings map<text, text>,
+            PRIMARY KEY (user_id, provider)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS integration_items (
+            user_id text,
+            provider text,
+            item_id text,
+            name text,
+            item_type text,
+            url text,
+            creation_time timestamp,
+            last_modified_time timestamp,
+            parent_id text,
+            metadata map<text, text>,
+            PRIMARY KEY ((user_id, provider), item_id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS user_profiles (
+            email text PRIMARY KEY,
+            full_name text,
+            display_name text,
+            avatar_url text,
+            company text,
+            job_title text,
+            timezone text,
+            preferences map<text, text>,
+            updated_at timestamp
+        )
+        """,
+    ]),
+    (2, "two-factor secrets", [
+        """
+        CREATE TABLE IF NOT EXISTS user_2fa_secrets (
+            user_id text PRIMARY KEY,
+            secret text,
+            created_at timestamp
+        )
+        """,
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+def connect(keyspace: str = None):
+    """Open a cluster/session for running migrations."""
+    host = os.getenv('CASSANDRA_HOST', 'localhost')
+    port = int(os.getenv('CASSANDRA_PORT', '9042'))
+    user = os.getenv('CASSANDRA_USER')
+    password = os.getenv('CASSANDRA_PASSWORD')
+
+    auth_provider = None
+    if user and password:
+        auth_provider = PlainTextAuthProvider(username=user, password=password)
+
+    cluster = Cluster([host], port=port, auth_provider=auth_provider)
+    return cluster, cluster.connect(keyspace)
+
+def get_schema_version(session) -> int:
+    """Return the applied schema version, or 0 if nothing has been applied."""
+    row = session.execute(
+        f"SELECT version FROM {SCHEMA_VERSION_TABLE} WHERE scope = %s",
+        (SCHEMA_SCOPE,)
+    ).one()
+    return row.version if row else 0
+
+def migrate(target: int = LATEST_VERSION) -> int:
+    """Apply every pending migration up to ``target`` and return the new version.
+
+    Run this once per deploy (``python init_db.py``), never from the API
+    server. Each statement waits for schema agreement before the next runs.
+    """
+    keyspace = os.getenv('CASSANDRA_KEYSPACE', 'vectorshift')
+    replication_factor = int(os.getenv('CASSANDRA_REPLICATION_FACTOR', '1'))
+
+    cluster, session = connect()
+    try:
+        print(f"Creating keyspace {keyspace} if it doesn't exist...")
+        session.execute(f"""
+            CREATE KEYSPACE IF NOT EXISTS {keyspace}
+            WITH REPLICATION = {{
+                'class': 'SimpleStrategy',
+                'replication_factor': {replication_factor}
+            }}
+        """)
+        session.set_keyspace(keyspace)
+        session.execute(f"""
+            CREATE TABLE IF NOT EXISTS {SCHEMA_VERSION_TABLE} (
+                scope text PRIMARY KEY,
+                version int,
+                description text,
+                updated_at timestamp
+            )
+        """)
+
+        current = get_schema_version(session)
+        print(f"Current schema version: {current}")
+
+        for version, description, statements in MIGRATIONS:
+            if version <= current or version > target:
+                continue
+            print(f"Applying migration {version}: {description}...")
+            for statement in statements:
+                session.execute(statement)
+            session.execute(
+                f"INSERT INTO {SCHEMA_VERSION_TABLE} (scope, version, description, updated_at) "
+                "VALUES (%s, %s, %s, %s)",
+                (SCHEMA_SCOPE, version, description, datetime.now(timezone.utc))
+            )
+            current = version
+
+        print(f"Schema is at version {current}.")
+        return current
+    finally:
+        cluster.shutdown()
@@ -1,114 +1,121 @@
 import redis
+import redis.asyncio as aioredis
 import os
 import json
+import logging
+import time
 from dotenv import load_dotenv
 from fastapi import HTTPException
+from redis_health import RedisHealthMonitor, CONNECTION_ERRORS, is_pool_exhausted
+from metrics import REDIS_COMMAND_SECONDS
+from tracing import child_span
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 REDIS_HOST = os.getenv('REDIS_HOST', 'localhost')
 REDIS_PORT = int(os.getenv('REDIS_PORT', '6379'))
 REDIS_DB = int(os.getenv('REDIS_DB', '0'))
 REDIS_PASSWORD = os.getenv('REDIS_PASSWORD', None)
+REDIS_MAX_CONNECTIONS = int(os.getenv('REDIS_MAX_CONNECTIONS', '50'))
+REDIS_POOL_TIMEOUT = float(os.getenv('REDIS_POOL_TIMEOUT', '5'))
 
-# Create a single Redis connection pool
-redis_pool = redis.ConnectionPool(
+# Create a single asyncio Redis connection pool shared by the whole process.
+# The blocking pool makes callers wait for a free connection instead of
+# failing outright when every connection is checked out.
+redis_pool = aioredis.BlockingConnectionPool(
     host=REDIS_HOST,
     port=REDIS_PORT,
     db=REDIS_DB,
     password=REDIS_PASSWORD,
     decode_responses=True,
     socket_timeout=5,
-    retry_on_timeout=True
+    retry_on_timeout=True,
+    max_connections=REDIS_MAX_CONNECTIONS,
+    timeout=REDIS_POOL_TIMEOUT,
 )
 
 # Create a single Redis client instance
-redis_client = redis.Redis(connection_pool=redis_pool)
+redis_client = aioredis.Redis(connection_pool=redis_pool)
 
-def check_redis_connection():
-    """Check if Redis connection is alive"""
-    try:
-        redis_client.ping()
-        return True
-    except (redis.ConnectionError, redis.RedisError) as e:
-        print(f"Redis connection error: {str(e)}")
-        return False
+# Circuit breaker and background liveness probe for the client above
+redis_health = RedisHealthMonitor(redis_client)
 
-async def add_key_value_redis(key: str, value: str, expire: int = None):
-    """Add a key-value pair to Redis with optional expiration."""
-    if not check_redis_connection():
-        raise HTTPException(status_code=500, detail="Redis connection failed")
-    
+def start_redis_monitor():
+    """Start the background liveness probe (called on app startup)."""
+    redis_health.start()
+
+async def close_redis():
+    """Stop the liveness probe and release every pooled Redis connection."""
+    await redis_health.stop()
+    await redis_pool.disconnect()
+
+async def check_redis_connection():
+    """Check if Redis connection is alive (one PING; not used on request paths)."""
+    return await redis_health.probe()
+
+async def execute_redis(operation: str, command, *args, **kwargs):
+    """Run one Redis command behind the circuit breaker.
+
+    While the breaker is open this raises immediately without a network call.
+    """
+    redis_health.before_call()
+    started = time.perf_counter()
     try:
-        redis_client.set(key, value)
-        if expire:
-            redis_client.expire(key, expire)
-        return True
+        with child_span(f"redis {operation}"):
+            result = await command(*args, **kwargs)
+    except CONNECTION_ERRORS as e:
+        if is_pool_exhausted(e):
+            # Every pooled connection is busy: fail this call only
+            REDIS_COMMAND_SECONDS.observe(time.perf_counter() - started, operation, "pool_exhausted")
+            logger.warning("Redis %s: connection pool exhausted", operation)
+            raise HTTPException(status_code=503, detail="Redis connection pool exhausted")
+        REDIS_COMMAND_SECONDS.observe(time.perf_counter() - started, operation, "unavailable")
+        redis_health.record_failure(e)
+        logger.error("Redis %s error: %s", operation, e)
+        raise HTTPException(status_code=503, detail=f"Redis connection failed: {str(e)}")
     except redis.RedisError as e:
-        print(f"Redis set error: {str(e)}")
+        REDIS_COMMAND_SECONDS.observe(time.perf_counter() - started, operation, "error")
+        # The server answered, so the connection itself is healthy
+        redis_health.record_success()
+        logger.error("Redis %s error: %s", operation, e)
         raise HTTPException(status_code=500, detail=f"Redis operation failed: {str(e)}")
+    REDIS_COMMAND_SECONDS.observe(time.perf_counter() - started, operation, "ok")
+    redis_health.record_success()
+    return result
+
+async def add_key_value_redis(key: str, value: str, expire: int = None):
+    """Add a key-value pair to Redis with optional expiration."""
+    await execute_redis("set", redis_client.set, key, value, ex=expire or None)
+    return True
 
 async def get_value_redis(key: str) -> str:
     """Get a value from Redis by key."""
-    if not check_redis_connection():
-        raise HTTPException(status_code=500, detail="Redis connection failed")
-    
-    try:
-        return redis_client.get(key)
-    except redis.RedisError as e:
-        print(f"Redis get error: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Redis operation failed: {str(e)}")
+    return await execute_redis("get", redis_client.get, key)
 
 async def delete_key_redis(key: str):
     """Delete a key from Redis."""
-    if not check_redis_connection():
-        raise HTTPException(status_code=500, detail="Redis connection failed")
-    
-    try:
-        redis_client.delete(key)
-        return True
-    except redis.RedisError as e:
-        print(f"Redis delete error: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Redis operation failed: {str(e)}")
+    await execute_redis("delete", redis_client.delete, key)
+    return True
 
 async def store_user_token(user_id: str, token_data: dict, expire: int = 3600):
     """Store user token data in Redis."""
-    if not check_redis_connection():
-        raise HTTPException(status_code=500, detail="Redis connection failed")
-    
     if not user_id:
         raise HTTPException(status_code=400, detail="User ID is required")
 
     try:
         # Ensure token_data is serializable
         serialized_data = json.dumps(token_data)
-        
-        # Store with namespace to avoid conflicts
-        key = f"user_token:{user_id}"
-        
-        # Use Redis transaction to ensure atomicity
-        with redis_client.pipeline() as pipe:
-            pipe.set(key, serialized_data)
-            if expire:
-                pipe.expire(key, expire)
-            pipe.execute()
-        
-        # Verify storage
-        stored_data = redis_client.get(key)
-        if not stored_data:
-            raise HTTPException(status_code=500, detail="Failed to verify token storage")
-        
-        return True
-    except json.JSONDecodeError as e:
-        print(f"JSON serialization error: {str(e)}")
-        print(f"Token data: {token_data}")
+    except (TypeError, ValueError) as e:
+        logger.error("JSON serialization error: %s", e)
         raise HTTPException(status_code=500, detail="Failed to serialize token data")
-    except redis.RedisError as e:
-        print(f"Redis error: {str(e)}")
-        raise HTTPException(status_code=500, detail="Failed to store token in Redis")
-    except Exception as e:
-        print(f"Unexpected error: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Failed to store user session: {str(e)}")
+
+    # Store with namespace to avoid conflicts. SET with EX is a single atomic
+    # command, so neither a transaction nor a read-back is needed.
+    key = f"user_token:{user_id}"
+    await execute_redis("set", redis_client.set, key, serialized_data, ex=expire or None)
+    return True
 
 def format_credentials_key(provider: str, org_id: str, user_id: str) -> str:
     """Format the Redis key for storing integration credentials."""
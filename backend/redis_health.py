@@ -0,0 +1,130 @@
+import asyncio
+import logging
+import os
+import time
+import redis
+from fastapi import HTTPException
+
+logger = logging.getLogger(__name__)
+
+# Consecutive connection failures before the breaker opens
+FAILURE_THRESHOLD = int(os.getenv('REDIS_BREAKER_FAILURES', '3'))
+# Seconds an open breaker waits before letting a single trial request through
+RECOVERY_TIMEOUT = float(os.getenv('REDIS_BREAKER_RECOVERY', '10'))
+# Seconds between background PINGs while healthy / while open
+PROBE_INTERVAL = float(os.getenv('REDIS_PROBE_INTERVAL', '5'))
+PROBE_INTERVAL_OPEN = float(os.getenv('REDIS_PROBE_INTERVAL_OPEN', '1'))
+
+# Errors that mean "Redis is unreachable", as opposed to a bad command
+CONNECTION_ERRORS = (redis.ConnectionError, redis.TimeoutError, OSError)
+# What BlockingConnectionPool raises when no connection frees up in time
+POOL_EXHAUSTED_MESSAGE = "No connection available"
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+def is_pool_exhausted(error: Exception) -> bool:
+    """True when ``error`` is a pool checkout timeout rather than a Redis failure.
+
+    Every connection being busy says nothing about whether Redis is reachable,
+    so these errors fail the one call without counting against the breaker.
+    """
+    return isinstance(error, redis.ConnectionError) and str(error).startswith(POOL_EXHAUSTED_MESSAGE)
+
+class RedisUnavailable(HTTPException):
+    """Raised without touching the network while the breaker is open."""
+    def __init__(self):
+        super().__init__(status_code=503, detail="Redis is unavailable")
+
+class RedisHealthMonitor:
+    """Circuit breaker for the shared Redis client plus a background liveness probe.
+
+    Request paths only call ``before_call`` / ``record_success`` /
+    ``record_failure``, which are plain attribute reads and writes. The PING
+    traffic lives in ``run``, which closes the breaker again as soon as Redis
+    answers.
+    """
+
+    def __init__(self, client, failure_threshold: int = FAILURE_THRESHOLD,
+                 recovery_timeout: float = RECOVERY_TIMEOUT,
+                 interval: float = PROBE_INTERVAL,
+                 open_interval: float = PROBE_INTERVAL_OPEN):
+        self.client = client
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.interval = interval
+        self.open_interval = open_interval
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.last_error = None
+        self._task = None
+
+    @property
+    def is_available(self) -> bool:
+        return self.state != OPEN
+
+    def before_call(self):
+        """Fail fast while open; after the recovery timeout let one trial call through."""
+        if self.state == CLOSED:
+            return
+        if self.state == OPEN:
+            if time.monotonic() - self.opened_at < self.recovery_timeout:
+                raise RedisUnavailable()
+            self.state = HALF_OPEN
+            return
+        # A trial call is already in flight
+        raise RedisUnavailable()
+
+    def record_success(self):
+        if self.state != CLOSED or self.failures:
+            if self.state != CLOSED:
+                logger.warning("Redis connection recovered")
+            self.state = CLOSED
+            self.failures = 0
+
+    def record_failure(self, error: Exception):
+        self.last_error = str(error)
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != OPEN:
+                logger.error("Redis circuit opened: %s", self.last_error)
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+    async def probe(self) -> bool:
+        """Send a single PING and update breaker state from the result."""
+        try:
+            await self.client.ping()
+        except CONNECTION_ERRORS as e:
+            if not is_pool_exhausted(e):
+                self.record_failure(e)
+            return False
+        self.record_success()
+        return True
+
+    async def run(self):
+        while True:
+            await self.probe()
+            await asyncio.sleep(self.interval if self.state == CLOSED else self.open_interval)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def snapshot(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "last_error": self.last_error,
+        }
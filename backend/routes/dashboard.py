@@ -1,37 +1,23 @@
 from fastapi import APIRouter, Depends, HTTPException
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from typing import Dict, List
 from datetime import datetime, timedelta
-from cassandra_client import CassandraClient
-from redis_client import get_value_redis
+from cassandra_client import CassandraClient, get_cassandra
+from auth import get_current_user
 
 router = APIRouter()
-security = HTTPBearer()
-cassandra = CassandraClient()
-
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    token = credentials.credentials
-    user_data = await get_value_redis(f"user_token:{token}")
-    if not user_data:
-        raise HTTPException(
-            status_code=401,
-            detail="Invalid authentication credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    return user_data
 
 @router.get("/users/{hashed_id}/dashboard")
-async def get_user_dashboard(hashed_id: str, current_user: Dict = Depends(get_current_user)):
+async def get_user_dashboard(hashed_id: str, current_user: Dict = Depends(get_current_user), cassandra: CassandraClient = Depends(get_cassandra)):
     """Get user-specific dashboard data"""
     try:
-        # Get original user ID from email
-        original_user_id = current_user.get("email", "").split("@")[0]
+        # Integrations are stored under the session's sub (the full email)
+        user_id = current_user["sub"]
         # Check if hashed ID matches
-        if hashed_id != cassandra.hash_user_id(original_user_id):
+        if hashed_id != cassandra.hash_user_id(user_id):
             raise HTTPException(status_code=403, detail="Not authorized to access this dashboard")
 
         # Get user's integrations from database
-        integrations = await cassandra.get_user_integrations(original_user_id)
+        integrations = await cassandra.get_user_integrations(user_id)
         
         # Calculate statistics
         now = datetime.now()
@@ -73,17 +59,17 @@ async def get_user_dashboard(hashed_id: str, current_user: Dict = Depends(get_cu
             "activeIntegrations": formatted_integrations
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch dashboard data: {str(e)}")
 
 @router.post("/users/{hashed_id}/dashboard/refresh")
-async def refresh_dashboard_data(hashed_id: str, current_user: Dict = Depends(get_current_user)):
+async def refresh_dashboard_data(hashed_id: str, current_user: Dict = Depends(get_current_user), cassandra: CassandraClient = Depends(get_cassandra)):
     """Refresh user's dashboard data"""
     try:
-        # Get original user ID from email
-        original_user_id = current_user.get("email", "").split("@")[0]
         # Check if hashed ID matches
-        if hashed_id != cassandra.hash_user_id(original_user_id):
+        if hashed_id != cassandra.hash_user_id(current_user["sub"]):
             raise HTTPException(status_code=403, detail="Not authorized to refresh this dashboard")
             
         # Implement refresh logic here
@@ -91,5 +77,7 @@ async def refresh_dashboard_data(hashed_id: str, current_user: Dict = Depends(ge
         
         return {"message": "Dashboard data refreshed successfully"}
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to refresh dashboard data: {str(e)}")
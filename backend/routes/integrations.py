@@ -1,29 +1,47 @@
 from fastapi import Request, APIRouter, HTTPException, Depends, Response, Query
-from fastapi.responses import HTMLResponse, JSONResponse
-from fastapi.security import HTTPBearer
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
+import asyncio
+import logging
+import os
+import time
+from contextlib import aclosing
 from typing import Dict, Callable, Any, Optional
-from cassandra_client import CassandraClient
 from integrations.notion import (
     authorize_notion, oauth2callback_notion,
-    get_notion_credentials, get_items_notion
+    get_notion_credentials, get_items_notion, stream_items_notion
 )
 from integrations.airtable import (
     authorize_airtable, oauth2callback_airtable,
-    get_airtable_credentials, get_items_airtable
+    get_airtable_credentials, get_items_airtable, stream_items_airtable
 )
 from integrations.slack import (
     authorize_slack, oauth2callback_slack,
-    get_slack_credentials, get_items_slack
+    get_slack_credentials, get_items_slack, stream_items_slack
 )
 from integrations.hubspot import (
     authorize_hubspot, oauth2callback_hubspot,
-    get_hubspot_credentials, get_items_hubspot
+    get_hubspot_credentials, get_items_hubspot, stream_items_hubspot
 )
+from integrations.integration_item import dumps
+from integrations.streaming import encode_workspace, workspace_response
+from integration_store import (
+    get_integration, set_integration_status, stored_items, stored_page,
+    delete_items, sync_items, delta_since, format_timestamp
+)
+from cassandra_client import CassandraClient, get_cassandra
+from status_cache import status_cache, status_key
+from auth import get_current_user
+from jobs import job_handler, enqueue_job, get_job, wait_for_job
+from metrics import PROVIDER_SYNC_SECONDS, PROVIDER_SYNC_ITEMS
+from tracing import start_span
 from redis_client import get_value_redis, delete_key_redis
+from datetime import datetime, timezone
 
 router = APIRouter()
-security = HTTPBearer()
-cassandra = CassandraClient()
+logger = logging.getLogger(__name__)
+
+# Seconds /sync-all waits for each provider before reporting it as still running
+SYNC_ALL_TIMEOUT = float(os.getenv('SYNC_ALL_TIMEOUT', '120'))
 
 # CORS headers for OAuth callbacks
 CORS_HEADERS = {
@@ -40,30 +58,44 @@ PROVIDER_MAP = {
         "oauth2callback": oauth2callback_notion,
         "get_credentials": get_notion_credentials,
         "get_items": get_items_notion,
+        "stream_items": stream_items_notion,
     },
     "airtable": {
         "authorize": authorize_airtable,
         "oauth2callback": oauth2callback_airtable,
         "get_credentials": get_airtable_credentials,
         "get_items": get_items_airtable,
+        "stream_items": stream_items_airtable,
+        # The metadata API has no modification times, so every sync is full
+        "delta": False,
     },
     "slack": {
         "authorize": authorize_slack,
         "oauth2callback": oauth2callback_slack,
         "get_credentials": get_slack_credentials,
         "get_items": get_items_slack,
+        "stream_items": stream_items_slack,
     },
     "hubspot": {
         "authorize": authorize_hubspot,
         "oauth2callback": oauth2callback_hubspot,
         "get_credentials": get_hubspot_credentials,
         "get_items": get_items_hubspot,
+        "stream_items": stream_items_hubspot,
     }
 }
 
-async def get_current_user(token: str = Depends(security)):
-    """Mock authentication for development."""
-    return {"id": "mock_user"}
+def _caller_id(user: Dict[str, Any], requested: Optional[str] = None) -> str:
+    """Integration user id of the authenticated caller.
+
+    Integrations are always stored under the token's subject; a ``user_id``
+    sent by the client is ignored, so one user can never reach another's
+    credentials, items or jobs.
+    """
+    user_id = user["sub"]
+    if requested and requested != user_id:
+        logger.debug("Ignoring user_id from the request; using the authenticated user")
+    return user_id
 
 def get_provider_functions(provider: str) -> Dict[str, Callable]:
     """Retrieve provider-specific OAuth functions."""
@@ -72,9 +104,9 @@ def get_provider_functions(provider: str) -> Dict[str, Callable]:
     return PROVIDER_MAP[provider]
 
 @router.post("/{provider}/authorize")
-async def authorize_integration(provider: str, request: Request):
+async def authorize_integration(provider: str, request: Request,
+                                user: Dict[str, Any] = Depends(get_current_user)):
     """Generate OAuth authorization URL for the provider."""
-    print(f"Authorizing {provider}")
     try:
         provider_funcs = get_provider_functions(provider)
         
@@ -88,8 +120,9 @@ async def authorize_integration(provider: str, request: Request):
             form = await request.form()
             user_id = form.get('user_id')
             org_id = form.get('org_id')
+        user_id = _caller_id(user, user_id)
 
-        print(f"Auth request for {provider} - user: {user_id}, org: {org_id}")
+        logger.info("Authorizing %s", provider, extra={"provider": provider, "user_id": user_id, "org_id": org_id})
 
         if not user_id or not org_id:
             raise HTTPException(status_code=400, detail="Missing user_id/org_id")
@@ -98,31 +131,55 @@ async def authorize_integration(provider: str, request: Request):
         return {"url": auth_url}
     
     except Exception as e:
-        print(f"Authorization error for {provider}: {str(e)}")
+        logger.error("Authorization error for %s: %s", provider, e)
         raise HTTPException(status_code=500, detail=f"Authorization error: {str(e)}")
 
+async def _status_envelope(cassandra: CassandraClient, user_id: str, provider: str) -> dict:
+    integration = await get_integration(cassandra, user_id, provider) or {}
+    return {
+        "isConnected": True,
+        "status": integration.get("status") or "active",
+        "lastSync": integration.get("last_sync"),
+    }
+
+async def _load_status(cassandra: CassandraClient, provider_funcs: Dict[str, Callable],
+                       provider: str, user_id: str, org_id: str) -> Optional[bytes]:
+    """Encoded status response, served from Cassandra; only /sync contacts the provider.
+
+    None when the workspace is too large to cache.
+    """
+    await provider_funcs["get_credentials"](user_id, org_id)
+    envelope = await _status_envelope(cassandra, user_id, provider)
+    return await encode_workspace(envelope, stored_items(cassandra, user_id, provider),
+                                  max_bytes=status_cache.max_entry_bytes)
+
 @router.get("/{provider}/status")
 async def get_integration_status(
     provider: str,
-    user_id: str = Query(..., description="User ID"),
-    org_id: Optional[str] = Query(None, description="Organization ID")
+    user_id: Optional[str] = Query(None, description="Ignored; the authenticated user is used"),
+    org_id: Optional[str] = Query(None, description="Organization ID"),
+    page_size: Optional[int] = Query(None, ge=1, le=1000, description="Return one page of items"),
+    page_token: Optional[str] = Query(None, description="nextPageToken from the previous page"),
+    cassandra: CassandraClient = Depends(get_cassandra),
+    user: Dict[str, Any] = Depends(get_current_user),
 ):
-    """Fetch the connection status and workspace details for an integration."""
-    print(f"Checking status for {provider} - user: {user_id}, org: {org_id}")
+    """Fetch the connection status and the workspace items stored by the last sync."""
+    user_id = _caller_id(user, user_id)
+    logger.info("Checking status for %s", provider, extra={"provider": provider, "user_id": user_id, "org_id": org_id})
     try:
         provider_funcs = get_provider_functions(provider)
         try:
-            credentials = await provider_funcs["get_credentials"](user_id, org_id or user_id)
-            items = await provider_funcs["get_items"](credentials)
-
-            return {
-                "isConnected": True,
-                "status": "active",
-                "lastSync": "2025-03-12T12:00:00Z",
-                "workspace": items
-            }
+            if not page_size:
+                # Dashboard polls are answered from the status cache
+                body = await status_cache.get(
+                    status_key(provider, org_id or user_id, user_id),
+                    lambda: _load_status(cassandra, provider_funcs, provider, user_id, org_id or user_id),
+                )
+                if body is not None:
+                    return Response(content=body, media_type="application/json")
+            await provider_funcs["get_credentials"](user_id, org_id or user_id)
         except Exception as e:
-            print(f"Error getting credentials/items: {str(e)}")
+            logger.info("No usable %s credentials: %s", provider, e)
             if "No credentials found" in str(e):
                 return {
                     "isConnected": False,
@@ -134,56 +191,198 @@ async def get_integration_status(
                 "status": "error",
                 "error": str(e)
             }
-    
+
+        envelope = await _status_envelope(cassandra, user_id, provider)
+        if not page_size:
+            # Too large to cache: stream it straight from Cassandra
+            return await workspace_response(envelope, stored_items(cassandra, user_id, provider))
+        items, next_token = await stored_page(cassandra, user_id, provider, page_size, page_token)
+        envelope["workspace"] = [item.to_dict() for item in items]
+        envelope["nextPageToken"] = next_token
+        return Response(content=dumps(envelope), media_type="application/json")
+
     except Exception as e:
-        print(f"Status error for {provider}: {str(e)}")
+        logger.error("Status error for %s: %s", provider, e)
         return {
             "isConnected": False,
             "status": "error",
             "error": str(e)
         }
 
-@router.post("/{provider}/sync")
+@job_handler("sync")
+async def run_sync_job(params: Dict[str, Any], report) -> Dict[str, Any]:
+    """Crawl one provider for a user and store the items (runs on a job worker)."""
+    provider, user_id, org_id = params["provider"], params["user_id"], params["org_id"]
+    provider_funcs = get_provider_functions(provider)
+    credentials = await provider_funcs["get_credentials"](user_id, org_id)
+    cassandra = get_cassandra()
+    synced_at = datetime.now(timezone.utc)
+    # Only fetch what changed since the last sync unless a full sync is due
+    # or the provider cannot report changes
+    full = params.get("full") or not provider_funcs.get("delta", True)
+    since = None if full else delta_since(
+        await get_integration(cassandra, user_id, provider), synced_at
+    )
+    mode = "full" if since is None else "delta"
+    cache_key = status_key(provider, org_id, user_id)
+    await status_cache.invalidate(cache_key)
+    count = 0
+    outcome = "error"
+    started = time.perf_counter()
+    try:
+        with start_span(f"sync {provider}", provider=provider, mode=mode) as span:
+            items = sync_items(cassandra, user_id, org_id, provider,
+                               provider_funcs["stream_items"](credentials, since=since),
+                               synced_at, full=since is None)
+            async with aclosing(items):
+                async for _ in items:
+                    count += 1
+                    await report(count)
+            span.set("items", count)
+        outcome = "ok"
+    finally:
+        PROVIDER_SYNC_SECONDS.observe(time.perf_counter() - started, provider, mode, outcome)
+        PROVIDER_SYNC_ITEMS.inc(provider, mode, amount=count)
+        await status_cache.invalidate(cache_key)
+    return {
+        "items": count,
+        "mode": mode,
+        "lastSync": format_timestamp(synced_at),
+    }
+
+@router.get("/jobs/{job_id}")
+async def get_sync_job(job_id: str, user: Dict[str, Any] = Depends(get_current_user)):
+    """Poll the progress of a sync job returned by /{provider}/sync."""
+    job = await get_job(job_id)
+    # Other users' jobs are reported as missing rather than forbidden
+    if job is None or job["params"].get("user_id") != _caller_id(user):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+async def _sync_provider(provider: str, user_id: str, org_id: str, full: bool) -> Dict[str, Any]:
+    """Queue one provider's sync and wait for it; failures are reported, not raised."""
+    result: Dict[str, Any] = {"provider": provider}
+    try:
+        async with asyncio.timeout(SYNC_ALL_TIMEOUT):
+            try:
+                await PROVIDER_MAP[provider]["get_credentials"](user_id, org_id)
+            except Exception as e:
+                if "No credentials found" in str(e):
+                    return {**result, "status": "disconnected"}
+                raise
+            job_id, _ = await enqueue_job(
+                "sync", f"{provider}:{org_id}:{user_id}",
+                provider=provider, user_id=user_id, org_id=org_id, full=full,
+            )
+            result["jobId"] = job_id
+            job = await wait_for_job(job_id, SYNC_ALL_TIMEOUT)
+    except TimeoutError:
+        return {**result, "status": "timeout",
+                "error": f"Still running after {SYNC_ALL_TIMEOUT:g}s"}
+    except Exception as e:
+        logger.error("Sync-all error for %s: %s", provider, e)
+        return {**result, "status": "failed", "error": str(e)}
+
+    if job is None:
+        return {**result, "status": "failed", "error": "Job expired"}
+    result.update(status=job["status"], items=job["items"])
+    if job.get("error"):
+        result["error"] = job["error"]
+    result.update(job.get("result") or {})
+    return result
+
+@router.post("/sync-all")
+async def sync_all_integrations(request: Request, user: Dict[str, Any] = Depends(get_current_user)):
+    """Sync every provider concurrently and stream one NDJSON line per provider.
+
+    Lines arrive in completion order, so total latency is that of the
+    slowest provider. Each provider has SYNC_ALL_TIMEOUT seconds; a provider
+    that fails, times out or is not connected is reported on its own line
+    without affecting the others. A final line summarises the run.
+    """
+    content_type = request.headers.get('content-type', '')
+    if 'application/json' in content_type:
+        body = await request.json() if await request.body() else {}
+    else:
+        body = await request.form()
+    user_id = _caller_id(user, body.get('user_id'))
+    org_id = body.get('org_id') or user_id
+    full = body.get('full') in (True, '1', 'true')
+
+    logger.info("Syncing all providers", extra={"user_id": user_id, "org_id": org_id})
+
+    async def lines():
+        tasks = [
+            asyncio.create_task(_sync_provider(provider, user_id, org_id, full))
+            for provider in PROVIDER_MAP
+        ]
+        summary: Dict[str, int] = {}
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                result = await next_done
+                summary[result["status"]] = summary.get(result["status"], 0) + 1
+                yield dumps(result) + b"\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+        yield dumps({"done": True, "summary": summary}) + b"\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@router.post("/{provider}/sync", status_code=202)
 async def sync_integration(
     provider: str,
-    request: Request
+    request: Request,
+    user: Dict[str, Any] = Depends(get_current_user),
 ):
-    """Sync the latest data from the integration provider."""
+    """Queue a sync of the latest data from the integration provider.
+
+    Returns a job id to poll at /jobs/{job_id}. A sync requested while one
+    is already queued or running for the same user and provider returns
+    that job instead of starting another. Syncs fetch only changes since
+    the previous one unless ``full`` is set or a periodic full sync is due.
+    """
     try:
         content_type = request.headers.get('content-type', '')
         if 'application/json' in content_type:
             body = await request.json()
             user_id = body.get('user_id')
             org_id = body.get('org_id')
+            full = bool(body.get('full'))
         else:
             form = await request.form()
             user_id = form.get('user_id')
             org_id = form.get('org_id')
+            full = form.get('full') in ('1', 'true')
+        user_id = _caller_id(user, user_id)
 
-        if not user_id:
-            raise HTTPException(status_code=400, detail="Missing user_id")
+        logger.info("Syncing %s", provider, extra={"provider": provider, "user_id": user_id, "org_id": org_id})
 
-        print(f"Syncing {provider} - user: {user_id}, org: {org_id}")
-        
+        # Fail fast on an unknown provider or missing credentials
         provider_funcs = get_provider_functions(provider)
-        credentials = await provider_funcs["get_credentials"](user_id, org_id or user_id)
-        items = await provider_funcs["get_items"](credentials)
+        await provider_funcs["get_credentials"](user_id, org_id or user_id)
 
+        job_id, created = await enqueue_job(
+            "sync", f"{provider}:{org_id or user_id}:{user_id}",
+            provider=provider, user_id=user_id, org_id=org_id or user_id, full=full,
+        )
+        job = await get_job(job_id)
         return {
-            "isConnected": True,
-            "status": "active",
-            "lastSync": "2025-03-12T12:00:00Z",
-            "workspace": items
+            "jobId": job_id,
+            "status": job["status"] if job else "queued",
+            "deduplicated": not created,
         }
-    
+
     except Exception as e:
-        print(f"Sync error for {provider}: {str(e)}")
+        logger.error("Sync error for %s: %s", provider, e)
         raise HTTPException(status_code=500, detail=f"Sync error: {str(e)}")
 
 @router.post("/{provider}/disconnect")
 async def disconnect_integration(
     provider: str,
-    request: Request
+    request: Request,
+    cassandra: CassandraClient = Depends(get_cassandra),
+    user: Dict[str, Any] = Depends(get_current_user),
 ):
     """Disconnect an integration and delete stored credentials."""
     try:
@@ -196,26 +395,29 @@ async def disconnect_integration(
             form = await request.form()
             user_id = form.get('user_id')
             org_id = form.get('org_id')
+        user_id = _caller_id(user, user_id)
 
-        if not user_id:
-            raise HTTPException(status_code=400, detail="Missing user_id")
-
-        print(f"Disconnecting {provider} - user: {user_id}, org: {org_id}")
+        logger.info("Disconnecting %s", provider, extra={"provider": provider, "user_id": user_id, "org_id": org_id})
 
         # Remove credentials from Redis
         redis_key = f"{provider}_credentials:{org_id or user_id}:{user_id}"
         await delete_key_redis(redis_key)
 
+        # Forget the synced items along with the credentials
+        await delete_items(cassandra, user_id, provider)
+        await set_integration_status(cassandra, user_id, provider, "disconnected")
+        await status_cache.invalidate(status_key(provider, org_id or user_id, user_id))
+
         return {"status": "success", "message": f"Disconnected {provider} for user {user_id}"}
     
     except Exception as e:
-        print(f"Disconnect error for {provider}: {str(e)}")
+        logger.error("Disconnect error for %s: %s", provider, e)
         raise HTTPException(status_code=500, detail=f"Disconnection error: {str(e)}")
 
 @router.get("/{provider}/oauth2callback", include_in_schema=False)
 async def oauth_callback(provider: str, request: Request):
     """Handle OAuth callback from provider."""
-    print(f"OAuth callback for {provider}")
+    logger.info("OAuth callback for %s", provider)
     try:
         provider_funcs = get_provider_functions(provider)
         response = await provider_funcs["oauth2callback"](request)
@@ -226,7 +428,7 @@ async def oauth_callback(provider: str, request: Request):
         
         return response
     except Exception as e:
-        print(f"OAuth callback error for {provider}: {str(e)}")
+        logger.error("OAuth callback error for %s: %s", provider, e)
         error_message = str(e)
         return HTMLResponse(
             content=f"""
@@ -1,13 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from typing import Dict, Optional
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from datetime import datetime
-from cassandra_client import CassandraClient
+from cassandra_client import CassandraClient, get_cassandra
+from auth import get_current_user
 
 router = APIRouter()
-security = HTTPBearer()
-cassandra = CassandraClient()
 
 class ProfileUpdate(BaseModel):
     fullName: Optional[str] = None
@@ -18,27 +16,12 @@ class ProfileUpdate(BaseModel):
     timezone: Optional[str] = None
     preferences: Optional[Dict[str, str]] = None
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    try:
-        token = credentials.credentials
-        # Verify token and get user data
-        user_data = await cassandra.verify_token(token)
-        if not user_data:
-            raise HTTPException(
-                status_code=401,
-                detail="Invalid authentication credentials",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        return user_data
-    except Exception as e:
-        raise HTTPException(
-            status_code=401,
-            detail="Invalid authentication credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-
 @router.get("/api/users/{email}/profile")
-async def get_profile(email: str, current_user: Dict = Depends(get_current_user)):
+async def get_profile(
+    email: str,
+    current_user: Dict = Depends(get_current_user),
+    cassandra: CassandraClient = Depends(get_cassandra)
+):
     """Get user profile information"""
     # Verify user is accessing their own profile
     if email != current_user.get("email"):
@@ -56,7 +39,8 @@ async def get_profile(email: str, current_user: Dict = Depends(get_current_user)
 async def update_profile(
     email: str,
     profile_update: ProfileUpdate,
-    current_user: Dict = Depends(get_current_user)
+    current_user: Dict = Depends(get_current_user),
+    cassandra: CassandraClient = Depends(get_cassandra)
 ):
     """Update user profile information"""
     # Verify user is updating their own profile
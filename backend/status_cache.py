@@ -0,0 +1,233 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from fastapi import HTTPException
+from redis_client import redis_client, execute_redis, get_value_redis
+from metrics import CACHE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+# Seconds an entry is served without a refresh
+STATUS_CACHE_TTL = float(os.getenv('STATUS_CACHE_TTL', '30'))
+# Seconds an expired entry may still be served while a refresh runs
+STATUS_CACHE_STALE_TTL = float(os.getenv('STATUS_CACHE_STALE_TTL', '600'))
+# Entries kept in each process
+STATUS_CACHE_SIZE = int(os.getenv('STATUS_CACHE_SIZE', '1000'))
+# Larger responses are not cached (they would crowd out everything else)
+STATUS_CACHE_MAX_ENTRY_BYTES = int(os.getenv('STATUS_CACHE_MAX_ENTRY_BYTES', str(1024 * 1024)))
+
+INVALIDATION_CHANNEL = "status_cache:invalidations"
+
+# Store a refreshed entry only if the key has not been invalidated since the
+# refresh read its version (KEYS: entry, version; ARGV: version, value, ttl)
+PUT_SCRIPT = """
+if (redis.call('GET', KEYS[2]) or '0') ~= ARGV[1] then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+return 1
+"""
+
+_put_if_current = redis_client.register_script(PUT_SCRIPT)
+
+# A loader returns the encoded body, or None for a response too large to cache
+Loader = Callable[[], Awaitable[Optional[bytes]]]
+
+def status_key(provider: str, org_id: str, user_id: str) -> str:
+    return f"status_cache:{provider}:{org_id}:{user_id}"
+
+def _version_key(key: str) -> str:
+    return f"{key}:version"
+
+class StatusCache:
+    """Two-tier stale-while-revalidate cache of encoded status responses.
+
+    Lookups try the in-process LRU, then Redis (shared by every worker),
+    then the loader. A fresh entry is returned as is. An entry older than
+    ``ttl`` but younger than ``stale_ttl`` is returned immediately while one
+    background refresh per key reloads it. Concurrent misses for the same key
+    share one load. Redis errors only cost the shared tier; the cache keeps
+    working locally.
+
+    ``invalidate`` bumps a version counter in Redis, deletes the shared entry
+    and broadcasts the key over pub/sub so every worker drops its local copy.
+    A refresh records the version before loading and only writes back if it
+    is unchanged, so a refresh that raced an invalidation in another worker
+    cannot restore the old data. A worker that misses a broadcast serves its
+    local copy for at most ``ttl``.
+
+    Bodies over ``max_entry_bytes`` are not stored. Instead the cache
+    remembers, with the same freshness rules, that the key is too large, and
+    ``get`` returns None so the caller can stream the response.
+    """
+
+    def __init__(self, ttl: float = STATUS_CACHE_TTL, stale_ttl: float = STATUS_CACHE_STALE_TTL,
+                 size: int = STATUS_CACHE_SIZE, max_entry_bytes: int = STATUS_CACHE_MAX_ENTRY_BYTES):
+        self.ttl = ttl
+        self.stale_ttl = max(stale_ttl, ttl)
+        self.size = size
+        self.max_entry_bytes = max_entry_bytes
+        self._local: "OrderedDict[str, Tuple[float, Optional[bytes]]]" = OrderedDict()
+        self._loading: Dict[str, asyncio.Task] = {}
+        # Invalidations seen while a key was loading, so that load is not
+        # stored; entries only exist for keys in _loading
+        self._versions: Dict[str, int] = {}
+        self._listener: Optional[asyncio.Task] = None
+
+    def _get_local(self, key: str) -> Optional[Tuple[float, Optional[bytes]]]:
+        entry = self._local.get(key)
+        if entry is not None:
+            self._local.move_to_end(key)
+        return entry
+
+    def _put_local(self, key: str, fetched_at: float, body: Optional[bytes]):
+        self._local[key] = (fetched_at, body)
+        self._local.move_to_end(key)
+        while len(self._local) > self.size:
+            self._local.popitem(last=False)
+
+    async def _get_shared(self, key: str) -> Optional[Tuple[float, Optional[bytes]]]:
+        try:
+            value = await get_value_redis(key)
+        except HTTPException:
+            return None
+        if not value:
+            return None
+        fetched_at, _, body = value.partition('\n')
+        try:
+            # An empty body marks a response too large to cache
+            return float(fetched_at), body.encode('utf-8') if body else None
+        except ValueError:
+            return None
+
+    async def _shared_version(self, key: str) -> Optional[str]:
+        try:
+            return await get_value_redis(_version_key(key)) or '0'
+        except HTTPException:
+            return None
+
+    async def _put_shared(self, key: str, version: Optional[str], fetched_at: float, body: Optional[bytes]):
+        if version is None:
+            # Could not read the version, so a write might undo an invalidation
+            return
+        try:
+            await execute_redis(
+                "status_cache_put", _put_if_current, keys=[key, _version_key(key)],
+                args=[version, f"{fetched_at}\n{body.decode('utf-8') if body else ''}",
+                      int(self.stale_ttl) or 1],
+            )
+        except HTTPException:
+            pass
+
+    async def _load(self, key: str, loader: Loader) -> Optional[bytes]:
+        local_version = self._versions.get(key, 0)
+        version = await self._shared_version(key)
+        body = await loader()
+        if self._versions.get(key, 0) == local_version:
+            stored = body if body is not None and len(body) <= self.max_entry_bytes else None
+            fetched_at = time.time()
+            self._put_local(key, fetched_at, stored)
+            await self._put_shared(key, version, fetched_at, stored)
+        return body
+
+    def _start_load(self, key: str, loader: Loader, background: bool = False) -> asyncio.Task:
+        task = self._loading.get(key)
+        if task is None:
+            task = asyncio.create_task(self._load(key, loader))
+            self._loading[key] = task
+            task.add_done_callback(lambda done: self._finish_load(key, done, background))
+        return task
+
+    def _finish_load(self, key: str, task: asyncio.Task, background: bool):
+        if self._loading.get(key) is task:
+            del self._loading[key]
+            self._versions.pop(key, None)
+        # Foreground loads raise to their callers; a failed refresh only
+        # leaves the stale entry in place
+        error = None if task.cancelled() else task.exception()
+        if background and error is not None:
+            logger.warning("Status cache refresh failed for %s: %s", key, error)
+
+    async def get(self, key: str, loader: Loader) -> Optional[bytes]:
+        """Return the cached body for ``key``, loading or refreshing it as needed.
+
+        None means the response is too large to cache.
+        """
+        entry = self._get_local(key)
+        if entry is None:
+            entry = await self._get_shared(key)
+            if entry is not None:
+                self._put_local(key, *entry)
+
+        if entry is not None:
+            fetched_at, body = entry
+            age = time.time() - fetched_at
+            if age < self.ttl:
+                CACHE_REQUESTS.inc("status", "hit")
+                return body
+            if age < self.stale_ttl:
+                CACHE_REQUESTS.inc("status", "stale")
+                self._start_load(key, loader, background=True)
+                return body
+
+        CACHE_REQUESTS.inc("status", "miss")
+        # Shield so one caller going away does not cancel the others' load
+        return await asyncio.shield(self._start_load(key, loader))
+
+    def _evict(self, key: str):
+        """Forget ``key`` in this process, including any load in flight."""
+        if key in self._loading:
+            self._versions[key] = self._versions.get(key, 0) + 1
+        self._local.pop(key, None)
+
+    async def invalidate(self, key: str):
+        """Drop ``key`` from both tiers in every worker; the next lookup reloads it."""
+        self._evict(key)
+        pipe = redis_client.pipeline(transaction=True)
+        pipe.incr(_version_key(key))
+        pipe.expire(_version_key(key), int(self.stale_ttl) or 1)
+        pipe.delete(key)
+        pipe.publish(INVALIDATION_CHANNEL, json.dumps({"key": key}))
+        try:
+            await execute_redis("status_cache_invalidate", pipe.execute)
+        except HTTPException:
+            pass
+
+    async def _listen(self):
+        while True:
+            pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                async for message in pubsub.listen():
+                    try:
+                        self._evict(json.loads(message["data"])["key"])
+                    except (TypeError, ValueError, KeyError) as e:
+                        logger.warning("Ignoring malformed cache invalidation: %s", e)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Status cache listener error: %s", e)
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+
+    def start(self):
+        """Subscribe to invalidation broadcasts (called on app startup)."""
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def close(self):
+        """Stop the listener and cancel in-flight refreshes (called on app shutdown)."""
+        tasks = list(self._loading.values())
+        if self._listener is not None:
+            tasks.append(self._listener)
+            self._listener = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+status_cache = StatusCache()
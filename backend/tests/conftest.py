@@ -0,0 +1,177 @@
+import os
+import sys
+from collections import namedtuple
+import fakeredis
+import httpx
+import pytest
+from cassandra.query import UNSET_VALUE
+
+# The backend modules import each other as top-level modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import auth  # noqa: E402
+import cassandra_client  # noqa: E402
+import jobs  # noqa: E402
+import redis_client  # noqa: E402
+import status_cache  # noqa: E402
+from integrations import http_clients, rate_limit  # noqa: E402
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    """In-memory Redis behind the shared client and every module's scripts.
+
+    Each test also starts with an empty session cache.
+    """
+    client = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    for module in (redis_client, auth, jobs, status_cache):
+        monkeypatch.setattr(module, "redis_client", client)
+    monkeypatch.setattr(rate_limit, "_reserve", client.register_script(rate_limit.RESERVE_SCRIPT))
+    monkeypatch.setattr(status_cache, "_put_if_current", client.register_script(status_cache.PUT_SCRIPT))
+    for name, script in (("_release", jobs.RELEASE_SCRIPT), ("_renew", jobs.RENEW_SCRIPT),
+                         ("_reap", jobs.REAP_SCRIPT)):
+        monkeypatch.setattr(jobs, name, client.register_script(script))
+    monkeypatch.setattr(auth, "sessions", auth.SessionCache())
+    return client
+
+class ProviderStub:
+    """Stands in for the providers' HTTP APIs below the shared clients' transport stack.
+
+    ``routes`` maps ``(method, url without query)`` to a handler returning an
+    ``httpx.Response``; every request that reaches the stub is recorded.
+    """
+
+    def __init__(self):
+        self.routes = {}
+        self.requests = []
+
+    def add(self, method: str, url: str, handler):
+        self.routes[(method, url)] = handler
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        handler = self.routes.get((request.method, str(request.url.copy_with(query=None))))
+        if handler is None:
+            return httpx.Response(404, json={"error": "not stubbed"})
+        return handler(request)
+
+@pytest.fixture
+async def provider_http(monkeypatch):
+    """Route every provider client through a ProviderStub (fresh clients per test)."""
+    stub = ProviderStub()
+    monkeypatch.setattr(http_clients, "build_transport", lambda provider: httpx.MockTransport(stub))
+    await http_clients.close_clients()
+    yield stub
+    await http_clients.close_clients()
+
+ItemRow = namedtuple("ItemRow", "item_id name item_type url creation_time last_modified_time parent_id metadata")
+IntegrationRow = namedtuple("IntegrationRow", "provider org_id status last_sync settings")
+ITEM_COLUMNS = ItemRow._fields[1:-1]
+
+class Rows:
+    """The slice of a driver ResultSet the app uses."""
+
+    def __init__(self, rows=(), paging_state=None, was_applied=True):
+        self.current_rows = list(rows)
+        self.paging_state = paging_state
+        self.was_applied = was_applied
+
+    def one(self):
+        return self.current_rows[0] if self.current_rows else None
+
+    def __iter__(self):
+        return iter(self.current_rows)
+
+def _naive(value):
+    # The driver hands timestamps back as naive UTC
+    return value.replace(tzinfo=None) if getattr(value, "tzinfo", None) else value
+
+class FakeCassandra:
+    """In-memory CassandraClient for the integration statements.
+
+    Rows live in ``items`` ((user, provider) -> item_id -> row) and
+    ``integrations`` ((user, provider) -> row); ``executed`` lists every
+    statement name run, in order.
+    """
+
+    get_user_integrations = cassandra_client.CassandraClient.get_user_integrations
+    hash_user_id = staticmethod(cassandra_client.CassandraClient.hash_user_id)
+
+    def __init__(self):
+        self.items = {}
+        self.integrations = {}
+        self.executed = []
+
+    def _integration(self, user_id, provider) -> IntegrationRow:
+        return self.integrations.get((user_id, provider), IntegrationRow(provider, None, None, None, None))
+
+    def _owned(self, values):
+        # items_by_owner and item_ids_by_owner (full rows carry item_id too)
+        return list(self.items.get(tuple(values), {}).values())
+
+    async def execute_async(self, query, values=()):
+        self.executed.append(query)
+        if query == "integration_by_provider":
+            row = self.integrations.get(tuple(values))
+            return Rows([row] if row else [])
+        if query == "integration_synced":
+            org_id, status, last_sync, settings, user_id, provider = values
+            row = self._integration(user_id, provider)
+            self.integrations[(user_id, provider)] = row._replace(
+                org_id=org_id, status=status, last_sync=_naive(last_sync),
+                settings={**(row.settings or {}), **settings},
+            )
+        elif query == "integration_status_update":
+            status, user_id, provider = values
+            self.integrations[(user_id, provider)] = self._integration(user_id, provider)._replace(status=status)
+        elif query == "item_ids_stored":
+            user_id, provider, item_ids = values
+            stored = self.items.get((user_id, provider), {})
+            return Rows([stored[item_id] for item_id in item_ids if item_id in stored])
+        elif query == "items_delete_all":
+            self.items.pop(tuple(values), None)
+        else:
+            raise NotImplementedError(query)
+        return Rows()
+
+    async def execute_batch(self, query, rows):
+        self.executed.append(query)
+        for values in rows:
+            if query == "item_upsert":
+                *columns, metadata, user_id, provider, item_id = values
+                items = self.items.setdefault((user_id, provider), {})
+                row = items.get(item_id, ItemRow(item_id, *([None] * len(ITEM_COLUMNS)), {}))
+                updates = {name: _naive(value) for name, value in zip(ITEM_COLUMNS, columns)
+                           if value is not UNSET_VALUE}
+                items[item_id] = row._replace(metadata={**row.metadata, **metadata}, **updates)
+            elif query == "item_delete":
+                user_id, provider, item_id = values
+                self.items.get((user_id, provider), {}).pop(item_id, None)
+            else:
+                raise NotImplementedError(query)
+
+    async def fetch_page(self, query, values, fetch_size, paging_state=None):
+        self.executed.append(query)
+        rows = self._owned(values)
+        start = int(paging_state or 0)
+        end = start + fetch_size
+        return rows[start:end], (str(end).encode() if end < len(rows) else None)
+
+    async def iterate(self, query, values=(), fetch_size=None):
+        self.executed.append(query)
+        if query == "integrations_by_user":
+            rows = [row for (user_id, _), row in self.integrations.items() if user_id == values[0]]
+        else:
+            rows = self._owned(values)
+        for row in rows:
+            yield row
+
+@pytest.fixture
+def fake_cassandra(monkeypatch):
+    """A FakeCassandra installed as the shared client (what get_cassandra returns)."""
+    fake = FakeCassandra()
+    monkeypatch.setattr(cassandra_client, "_client", fake)
+    return fake
@@ -0,0 +1,86 @@
+import asyncio
+import json
+import time
+import pytest
+from fastapi import HTTPException
+import auth
+from auth import REVOCATION_CHANNEL, authenticate, create_access_token
+
+pytestmark = pytest.mark.anyio
+
+@pytest.fixture
+async def listener(fake_redis):
+    auth.start_revocation_listener()
+    async with asyncio.timeout(2):
+        while (await fake_redis.pubsub_numsub(REVOCATION_CHANNEL))[0][1] < 1:
+            await asyncio.sleep(0.01)
+    yield
+    await auth.stop_revocation_listener()
+
+async def rejected(token: str) -> bool:
+    try:
+        await authenticate(token)
+    except HTTPException as e:
+        assert e.status_code == 401
+        return True
+    return False
+
+async def eventually_rejected(token: str, timeout: float = 2.0):
+    async with asyncio.timeout(timeout):
+        while not await rejected(token):
+            await asyncio.sleep(0.01)
+
+async def test_cached_session_is_revoked_by_another_workers_logout(fake_redis, listener):
+    token = create_access_token({"sub": "alice@example.com"})
+    other = create_access_token({"sub": "alice@example.com"})
+    session = await authenticate(token)
+    await authenticate(other)
+    assert auth.sessions.get(token) is not None
+
+    # Another worker logs the token out; only the broadcast reaches this one
+    await fake_redis.publish(REVOCATION_CHANNEL, json.dumps({"jti": session["jti"], "exp": session["exp"]}))
+
+    await eventually_rejected(token)
+    assert (await authenticate(other))["sub"] == "alice@example.com"
+
+async def test_cached_sessions_are_revoked_by_a_password_reset_elsewhere(fake_redis, listener):
+    tokens = [create_access_token({"sub": "alice@example.com"}) for _ in range(2)]
+    bob = create_access_token({"sub": "bob@example.com"})
+    for token in (*tokens, bob):
+        await authenticate(token)
+
+    await fake_redis.publish(REVOCATION_CHANNEL, json.dumps({"sub": "alice@example.com", "before": time.time()}))
+
+    for token in tokens:
+        await eventually_rejected(token)
+    assert (await authenticate(bob))["sub"] == "bob@example.com"
+    # Logging in again after the reset works
+    fresh = create_access_token({"sub": "alice@example.com"})
+    assert (await authenticate(fresh))["sub"] == "alice@example.com"
+
+async def test_missed_broadcast_is_caught_from_redis(fake_redis):
+    token = create_access_token({"sub": "alice@example.com"})
+    before = time.time()
+    later = create_access_token({"sub": "alice@example.com"})
+    # No listener: the revocation only exists as a Redis record
+    await fake_redis.set("auth:revoked_before:alice@example.com", str(before))
+
+    assert await rejected(token)
+    assert (await authenticate(later))["sub"] == "alice@example.com"
+
+async def test_logout_applies_locally_and_is_broadcast(fake_redis):
+    token = create_access_token({"sub": "alice@example.com"})
+    session = await authenticate(token)
+    pubsub = fake_redis.pubsub(ignore_subscribe_messages=True)
+    await pubsub.subscribe(REVOCATION_CHANNEL)
+
+    await auth.revoke_token(token)
+
+    assert await rejected(token)
+    async with asyncio.timeout(2):
+        message = None
+        while message is None:
+            message = await pubsub.get_message(timeout=0.1)
+    assert json.loads(message["data"])["jti"] == session["jti"]
+    assert await fake_redis.get(f"auth:revoked:{session['jti']}") == "1"
+    await pubsub.aclose()
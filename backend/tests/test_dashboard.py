@@ -0,0 +1,61 @@
+import httpx
+import pytest
+from fastapi import FastAPI
+import auth
+import jobs
+from cassandra_client import CassandraClient
+from integrations.integration_item import IntegrationItem
+from routes import integrations
+from routes.dashboard import router as dashboard_router
+
+pytestmark = pytest.mark.anyio
+
+async def slack_credentials(user_id, org_id):
+    return {"access_token": "xoxb"}
+
+async def slack_channels(credentials, since=None):
+    for n in range(3):
+        yield IntegrationItem(id=f"C{n}", type="channel", name=f"channel-{n}", source="slack")
+
+@pytest.fixture
+async def api(fake_redis, fake_cassandra, monkeypatch):
+    monkeypatch.setitem(integrations.PROVIDER_MAP["slack"], "get_credentials", slack_credentials)
+    monkeypatch.setitem(integrations.PROVIDER_MAP["slack"], "stream_items", slack_channels)
+    monkeypatch.setattr(jobs, "JOB_POLL_INTERVAL", 0.01)
+    app = FastAPI()
+    app.include_router(integrations.router, prefix="/api/integrations")
+    app.include_router(dashboard_router, prefix="/api")
+    workers = jobs.JobWorkerPool(concurrency=1)
+    workers.start()
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            yield client
+    finally:
+        await workers.stop()
+
+def session(email: str) -> dict:
+    return {"Authorization": f"Bearer {auth.create_access_token({'sub': email})}"}
+
+async def test_synced_integration_shows_on_the_dashboard(api):
+    alice = session("alice@example.com")
+    # The integration pages still send a placeholder user id
+    response = await api.post("/api/integrations/slack/sync", json={"user_id": "user123"}, headers=alice)
+    job = await jobs.wait_for_job(response.json()["jobId"], timeout=5)
+    assert job["status"] == jobs.SUCCEEDED
+
+    hashed_id = CassandraClient.hash_user_id("alice@example.com")
+    response = await api.get(f"/api/users/{hashed_id}/dashboard", headers=alice)
+
+    assert response.status_code == 200
+    dashboard = response.json()
+    assert dashboard["integrations"]["active"] == 1
+    (slack,) = dashboard["activeIntegrations"]
+    assert slack["name"] == "slack"
+    assert slack["details"] == "3 workspaces"
+    assert slack["lastSync"] is not None
+
+async def test_dashboard_is_keyed_by_the_full_email(api):
+    alice = session("alice@example.com")
+    for user_id in ("alice", "alice@example.org"):
+        response = await api.get(f"/api/users/{CassandraClient.hash_user_id(user_id)}/dashboard", headers=alice)
+        assert response.status_code == 403
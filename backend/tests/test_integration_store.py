@@ -0,0 +1,36 @@
+from datetime import datetime, timezone
+import pytest
+import integration_store
+from integration_store import get_integration, sync_items
+from integrations.integration_item import IntegrationItem
+
+pytestmark = pytest.mark.anyio
+
+async def crawl(*ids):
+    for item_id in ids:
+        yield IntegrationItem(id=item_id, type="page", name=f"page {item_id}", source="notion")
+
+async def sync(cassandra, *ids, full):
+    async for _ in sync_items(cassandra, "u", "o", "notion", crawl(*ids),
+                              datetime.now(timezone.utc), full=full):
+        pass
+    return (await get_integration(cassandra, "u", "notion"))["workspace_count"]
+
+async def test_delta_sync_counts_only_new_items_without_scanning(fake_cassandra, monkeypatch):
+    monkeypatch.setattr(integration_store, "ITEM_BATCH_SIZE", 2)
+    assert await sync(fake_cassandra, "a", "b", "c", full=True) == 3
+
+    fake_cassandra.executed.clear()
+    # "b" changed, "d" and "e" are new, and "d" shows up twice
+    assert await sync(fake_cassandra, "b", "d", "e", "d", full=False) == 5
+
+    assert len(fake_cassandra.items[("u", "notion")]) == 5
+    assert "item_ids_by_owner" not in fake_cassandra.executed
+    assert "items_by_owner" not in fake_cassandra.executed
+    assert fake_cassandra.executed.count("item_ids_stored") == 2
+
+async def test_full_sync_recounts_after_deletions(fake_cassandra):
+    await sync(fake_cassandra, "a", "b", "c", full=True)
+    assert await sync(fake_cassandra, "a", full=True) == 1
+    assert list(fake_cassandra.items[("u", "notion")]) == ["a"]
+    assert "item_ids_stored" not in fake_cassandra.executed
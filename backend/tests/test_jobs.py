@@ -0,0 +1,120 @@
+import asyncio
+import pytest
+import jobs
+from jobs import FAILED, QUEUED, RUNNING, SUCCEEDED, JobWorkerPool, enqueue_job, get_job, wait_for_job
+
+pytestmark = pytest.mark.anyio
+
+@pytest.fixture
+def runs(fake_redis, monkeypatch):
+    """Register a ``test`` job kind that records each run and sleeps ``params['sleep']``."""
+    started = []
+
+    async def handler(params, report):
+        started.append(params["n"])
+        await report(1)
+        await asyncio.sleep(params.get("sleep", 0))
+        return {"n": params["n"]}
+
+    monkeypatch.setitem(jobs.JOB_HANDLERS, "test", handler)
+    monkeypatch.setattr(jobs, "JOB_POLL_INTERVAL", 0.01)
+    return started
+
+@pytest.fixture
+async def pools():
+    started = []
+
+    def start(**kwargs):
+        pool = JobWorkerPool(**kwargs)
+        pool.start()
+        started.append(pool)
+        return pool
+
+    yield start
+    for pool in started:
+        await pool.stop()
+
+async def orphan(redis, worker_id: str, dedupe_key: str, **params) -> str:
+    """A job a worker took off the queue before it died without a trace."""
+    job_id, _ = await enqueue_job("test", dedupe_key, **params)
+    await redis.sadd(jobs.WORKERS_KEY, worker_id)
+    await redis.lmove(jobs.QUEUE_KEY, f"jobs:processing:{worker_id}", "RIGHT", "LEFT")
+    await redis.hset(f"job:{job_id}", "status", RUNNING)
+    return job_id
+
+async def test_dead_workers_job_is_requeued_and_runs_once(fake_redis, runs, pools):
+    job_id = await orphan(fake_redis, "dead", "a", n=1)
+    # The lost job still holds its lock, so a repeat request joins it
+    assert await enqueue_job("test", "a", n=2) == (job_id, False)
+
+    first, second = pools(concurrency=2), pools(concurrency=2)
+    await asyncio.gather(first._registered.wait(), second._registered.wait())
+    assert sorted(await asyncio.gather(first.reap(), second.reap())) == [0, 1]
+
+    job = await wait_for_job(job_id, timeout=2)
+    assert job["status"] == SUCCEEDED
+    assert job["result"] == {"n": 1}
+    assert runs == [1]
+    assert "dead" not in await fake_redis.smembers(jobs.WORKERS_KEY)
+    assert await fake_redis.get(jobs._lock_key("test", "a")) is None
+
+async def test_live_workers_jobs_are_left_alone(fake_redis, runs):
+    job_id = await orphan(fake_redis, "busy", "a", n=1)
+    await fake_redis.set("jobs:heartbeat:busy", "1", ex=30)
+
+    assert await JobWorkerPool().reap() == 0
+    assert (await get_job(job_id))["status"] == RUNNING
+    assert await fake_redis.lrange("jobs:processing:busy", 0, -1) == [job_id]
+
+async def test_job_that_keeps_losing_workers_fails(fake_redis, runs):
+    job_id = await orphan(fake_redis, "dead", "a", n=1)
+    await fake_redis.hset(f"job:{job_id}", "attempts", jobs.JOB_MAX_ATTEMPTS - 1)
+
+    assert await JobWorkerPool().reap() == 1
+    job = await get_job(job_id)
+    assert job["status"] == FAILED
+    assert job["error"] == "Worker lost"
+    assert await fake_redis.lrange(jobs.QUEUE_KEY, 0, -1) == []
+    # A new request starts a fresh job
+    assert (await enqueue_job("test", "a", n=2))[1] is True
+    assert runs == []
+
+async def test_job_over_its_timeout_fails_and_frees_its_lock(fake_redis, runs, pools):
+    pools(concurrency=1, timeout=0.05)
+    job_id, _ = await enqueue_job("test", "a", n=1, sleep=5)
+
+    job = await wait_for_job(job_id, timeout=2)
+    assert job["status"] == FAILED
+    assert job["error"].startswith("Timed out")
+    assert (await enqueue_job("test", "a", n=2))[1] is True
+
+async def test_running_jobs_keep_their_lock(fake_redis, runs, pools):
+    pool = pools(concurrency=1, lease_ttl=1)
+    job_id, _ = await enqueue_job("test", "a", n=1, sleep=5)
+    lock = jobs._lock_key("test", "a")
+
+    async with asyncio.timeout(2):
+        while (await get_job(job_id))["status"] != RUNNING:
+            await asyncio.sleep(0.01)
+    await fake_redis.expire(lock, 1)
+    await asyncio.sleep(0.5)
+
+    assert await fake_redis.ttl(lock) > 1
+    assert await fake_redis.get(lock) == job_id
+    assert await fake_redis.lrange(pool.processing_key, 0, -1) == [job_id]
+
+async def test_stopping_a_worker_hands_its_job_to_another(fake_redis, runs, pools):
+    first = JobWorkerPool(concurrency=1)
+    first.start()
+    job_id, _ = await enqueue_job("test", "a", n=1, sleep=0.2)
+    async with asyncio.timeout(2):
+        while not runs:
+            await asyncio.sleep(0.01)
+
+    await first.stop()
+    assert (await get_job(job_id))["status"] == QUEUED
+    assert first.worker_id not in await fake_redis.smembers(jobs.WORKERS_KEY)
+
+    pools(concurrency=1)
+    assert (await wait_for_job(job_id, timeout=2))["status"] == SUCCEEDED
+    assert runs == [1, 1]
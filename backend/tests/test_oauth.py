@@ -0,0 +1,152 @@
+import base64
+import hashlib
+import json
+from urllib.parse import parse_qs, urlsplit
+import httpx
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+from integrations import airtable, hubspot, http_clients, notion, slack
+
+pytestmark = pytest.mark.anyio
+
+def callback_request(**params) -> Request:
+    query = httpx.QueryParams(params)
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "path": "/oauth2callback",
+        "query_string": str(query).encode(),
+        "headers": [],
+    })
+
+def url_params(url: str) -> dict:
+    return {key: values[0] for key, values in parse_qs(urlsplit(url).query).items()}
+
+def token_endpoint(stub, url: str, token: dict, status: int = 200):
+    stub.add("POST", url, lambda request: httpx.Response(status, json=token))
+
+def form(request: httpx.Request) -> dict:
+    return {key: values[0] for key, values in parse_qs(request.content.decode()).items()}
+
+@pytest.fixture
+def configured(monkeypatch):
+    for module in (airtable, hubspot, notion, slack):
+        monkeypatch.setattr(module, "CLIENT_ID", "client-id")
+        monkeypatch.setattr(module, "CLIENT_SECRET", "client-secret")
+        monkeypatch.setattr(module, "REDIRECT_URI", "http://localhost:8000/callback")
+
+async def test_clients_are_shared_per_provider(provider_http):
+    notion_client = http_clients.get_client("notion")
+    assert http_clients.get_client("notion") is notion_client
+    assert http_clients.get_client("hubspot") is not notion_client
+
+    await http_clients.close_clients()
+    assert notion_client.is_closed
+    assert http_clients.get_client("notion") is not notion_client
+
+async def test_airtable_pkce_round_trip(fake_redis, provider_http, configured):
+    token_endpoint(provider_http, airtable.TOKEN_URL, {"access_token": "at", "expires_in": 3600})
+
+    params = url_params(await airtable.authorize_airtable("user-1", "org-1"))
+    state = params["state"]
+    saved = json.loads(await fake_redis.get(f"airtable_state:{state}"))
+    verifier = saved["code_verifier"]
+    assert 43 <= len(verifier) <= 128
+    assert params["code_challenge_method"] == "S256"
+    expected = base64.urlsafe_b64encode(hashlib.sha256(verifier.encode()).digest()).rstrip(b"=").decode()
+    assert params["code_challenge"] == expected
+    # The verifier itself never leaves the server until the token exchange
+    assert verifier not in json.dumps(params)
+
+    response = await airtable.oauth2callback_airtable(callback_request(code="the-code", state=state))
+
+    assert response.status_code == 200
+    (token_request,) = provider_http.requests
+    body = form(token_request)
+    assert body["code"] == "the-code"
+    assert body["code_verifier"] == verifier
+    assert body["grant_type"] == "authorization_code"
+    assert json.loads(await fake_redis.get("airtable_credentials:org-1:user-1")) == {
+        "access_token": "at", "expires_in": 3600,
+    }
+    assert await fake_redis.get(f"airtable_state:{state}") is None
+
+async def test_airtable_state_is_single_use(fake_redis, provider_http, configured):
+    token_endpoint(provider_http, airtable.TOKEN_URL, {"access_token": "at"})
+    state = url_params(await airtable.authorize_airtable("user-1", "org-1"))["state"]
+    await airtable.oauth2callback_airtable(callback_request(code="c", state=state))
+
+    with pytest.raises(HTTPException) as error:
+        await airtable.oauth2callback_airtable(callback_request(code="c", state=state))
+    assert error.value.status_code == 400
+    assert len(provider_http.requests) == 1
+
+@pytest.mark.parametrize("callback", [
+    airtable.oauth2callback_airtable,
+    hubspot.oauth2callback_hubspot,
+    notion.oauth2callback_notion,
+    slack.oauth2callback_slack,
+])
+async def test_unknown_state_is_rejected_without_token_exchange(callback, fake_redis, provider_http, configured):
+    with pytest.raises(HTTPException) as error:
+        await callback(callback_request(code="c", state="forged"))
+    assert error.value.status_code == 400
+    assert provider_http.requests == []
+
+async def test_airtable_token_failure_is_reported(fake_redis, provider_http, configured):
+    token_endpoint(provider_http, airtable.TOKEN_URL, {"error": "invalid_grant"}, status=400)
+    state = url_params(await airtable.authorize_airtable("user-1", "org-1"))["state"]
+
+    with pytest.raises(HTTPException) as error:
+        await airtable.oauth2callback_airtable(callback_request(code="c", state=state))
+    assert error.value.status_code == 400
+    assert await fake_redis.get("airtable_credentials:org-1:user-1") is None
+
+async def test_slack_round_trip(fake_redis, provider_http, configured):
+    token_endpoint(provider_http, "https://slack.com/api/oauth.v2.access", {"ok": True, "access_token": "xoxb"})
+    state = url_params(await slack.authorize_slack("user-1", "org-1"))["state"]
+
+    await slack.oauth2callback_slack(callback_request(code="the-code", state=state))
+
+    assert form(provider_http.requests[0])["code"] == "the-code"
+    assert json.loads(await fake_redis.get("slack_credentials:org-1:user-1"))["access_token"] == "xoxb"
+    assert await fake_redis.get(f"slack_state:{state}") is None
+
+async def test_notion_round_trip(fake_redis, provider_http, configured):
+    token_endpoint(provider_http, notion.TOKEN_URL, {"access_token": "secret_x"})
+    state = url_params((await notion.authorize_notion("user-1", "org-1"))["url"])["state"]
+
+    await notion.oauth2callback_notion(callback_request(code="the-code", state=state))
+
+    (token_request,) = provider_http.requests
+    assert token_request.headers["Authorization"] == "Basic " + base64.b64encode(b"client-id:client-secret").decode()
+    assert json.loads(token_request.content)["code"] == "the-code"
+    assert json.loads(await fake_redis.get("notion_credentials:org-1:user-1")) == {"access_token": "secret_x"}
+    assert await fake_redis.get(f"notion_state:{state}") is None
+
+async def test_notion_provider_error_is_rendered(fake_redis, provider_http, configured):
+    response = await notion.oauth2callback_notion(callback_request(error="access_denied"))
+    assert b"access_denied" in response.body
+    assert provider_http.requests == []
+
+async def test_hubspot_round_trip(fake_redis, provider_http, configured):
+    token_endpoint(provider_http, hubspot.TOKEN_URL, {"access_token": "hs", "refresh_token": "r"})
+    state = url_params(await hubspot.authorize_hubspot("user-1", "org-1"))["state"]
+
+    await hubspot.oauth2callback_hubspot(callback_request(code="the-code", state=state))
+
+    assert form(provider_http.requests[0])["code"] == "the-code"
+    assert json.loads(await fake_redis.get("hubspot_credentials:org-1:user-1"))["access_token"] == "hs"
+    assert await fake_redis.get(f"hubspot_state:{state}") is None
+
+async def test_hubspot_token_failure_keeps_state(fake_redis, provider_http, configured):
+    token_endpoint(provider_http, hubspot.TOKEN_URL, {"status": "BAD_AUTH_CODE"}, status=400)
+    state = url_params(await hubspot.authorize_hubspot("user-1", "org-1"))["state"]
+
+    with pytest.raises(HTTPException) as error:
+        await hubspot.oauth2callback_hubspot(callback_request(code="c", state=state))
+    assert error.value.status_code == 400
+    assert await fake_redis.get("hubspot_credentials:org-1:user-1") is None
+    # The user can retry the consent screen's redirect with a fresh code
+    assert await fake_redis.get(f"hubspot_state:{state}") is not None
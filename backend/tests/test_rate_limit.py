@@ -0,0 +1,46 @@
+import httpx
+import pytest
+import tracing
+from integrations.http_clients import TracingTransport
+from integrations.rate_limit import RateLimitedTransport
+from integrations.retry import RetryPolicy, RetryTransport
+from metrics import PROVIDER_RATE_LIMIT_WAIT_SECONDS
+
+pytestmark = pytest.mark.anyio
+
+@pytest.fixture
+def spans():
+    exporter = tracing.InMemoryExporter()
+    tracing.set_exporter(exporter)
+    yield exporter.spans
+    tracing.set_exporter(None)
+
+def waits(provider: str):
+    series = PROVIDER_RATE_LIMIT_WAIT_SECONDS.values.get((provider,))
+    return (sum(series[:-1]), series[-1]) if series else (0, 0.0)
+
+async def test_every_attempts_wait_is_recorded(fake_redis, spans):
+    responses = [httpx.Response(503), httpx.Response(200)]
+    # One request per 0.1s, no burst: the retry has to wait for budget
+    transport = RateLimitedTransport(httpx.MockTransport(lambda request: responses.pop(0)),
+                                     "ratelimit-test", rate=10, capacity=1)
+    transport = TracingTransport(RetryTransport(transport, RetryPolicy(base=0.001)), "ratelimit-test")
+    count_before, total_before = waits("ratelimit-test")
+
+    with tracing.start_span("sync"):
+        async with httpx.AsyncClient(transport=transport) as http:
+            response = await http.get("https://api.example.com/items", headers={"Authorization": "Bearer t"})
+
+    assert response.status_code == 200
+    count, total = waits("ratelimit-test")
+    assert count - count_before == 2
+    assert 0.05 <= total - total_before <= 0.2
+    (call,) = [span for span in spans if span.name == "ratelimit-test GET"]
+    assert call.attributes["rate_limit_wait"] == pytest.approx(total - total_before)
+
+async def test_unbudgeted_requests_are_not_recorded(fake_redis):
+    transport = RateLimitedTransport(httpx.MockTransport(lambda request: httpx.Response(200)),
+                                     "ratelimit-test-anonymous", rate=10, capacity=1)
+    async with httpx.AsyncClient(transport=transport) as http:
+        await http.post("https://api.example.com/oauth/token")
+    assert waits("ratelimit-test-anonymous") == (0, 0.0)
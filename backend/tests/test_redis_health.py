@@ -0,0 +1,80 @@
+import fakeredis
+import pytest
+import redis
+import redis.asyncio as aioredis
+from fastapi import HTTPException
+import redis_client
+from redis_client import execute_redis
+from redis_health import CLOSED, OPEN, RedisHealthMonitor, is_pool_exhausted
+from integrations import rate_limit
+
+pytestmark = pytest.mark.anyio
+
+@pytest.fixture
+def saturated(monkeypatch):
+    """A one-connection blocking pool whose only connection is checked out."""
+    pool = aioredis.BlockingConnectionPool(
+        connection_class=fakeredis.aioredis.FakeAsyncRedisConnection,
+        server=fakeredis.FakeServer(),
+        decode_responses=True,
+        max_connections=1,
+        timeout=0.05,
+    )
+    client = aioredis.Redis(connection_pool=pool)
+    health = RedisHealthMonitor(client, failure_threshold=1)
+    monkeypatch.setattr(redis_client, "redis_health", health)
+    monkeypatch.setattr(rate_limit, "redis_health", health)
+    return pool, client, health
+
+async def test_pool_checkout_timeout_is_recognised(saturated):
+    pool, client, _ = saturated
+    await pool.get_connection("PING")
+    with pytest.raises(redis.ConnectionError) as error:
+        await client.get("key")
+    assert is_pool_exhausted(error.value)
+    assert not is_pool_exhausted(redis.ConnectionError("Connection refused"))
+    assert not is_pool_exhausted(redis.TimeoutError("No connection available."))
+
+async def test_pool_exhaustion_fails_the_call_without_opening_the_breaker(saturated):
+    pool, client, health = saturated
+    held = await pool.get_connection("PING")
+
+    for _ in range(3):
+        with pytest.raises(HTTPException) as error:
+            await execute_redis("get", client.get, "key")
+        assert error.value.status_code == 503
+    assert health.state == CLOSED
+    assert health.failures == 0
+
+    await pool.release(held)
+    await client.set("key", "value")
+    assert await execute_redis("get", client.get, "key") == "value"
+
+async def test_probe_ignores_pool_exhaustion(saturated):
+    pool, _, health = saturated
+    await pool.get_connection("PING")
+    assert await health.probe() is False
+    assert health.state == CLOSED
+
+async def test_connection_failures_still_open_the_breaker(saturated):
+    _, _, health = saturated
+
+    async def refused(*args):
+        raise redis.ConnectionError("Connection refused")
+
+    with pytest.raises(HTTPException) as error:
+        await execute_redis("get", refused, "key")
+    assert error.value.status_code == 503
+    assert health.state == OPEN
+
+async def test_rate_limiter_falls_back_without_opening_the_breaker(saturated, monkeypatch):
+    _, _, health = saturated
+
+    async def exhausted(**kwargs):
+        raise redis.ConnectionError("No connection available.")
+
+    monkeypatch.setattr(rate_limit, "_reserve", exhausted)
+    limiter = rate_limit.SharedRateLimiter("ratelimit:test", rate=10, capacity=10)
+    await limiter.acquire()
+    assert health.state == CLOSED
+    assert limiter.fallback.tokens < limiter.fallback.capacity
@@ -0,0 +1,165 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+import httpx
+import pytest
+from integrations import retry
+from integrations.retry import RetryPolicy, RetryTransport, retry_after
+
+pytestmark = pytest.mark.anyio
+
+_real_sleep = asyncio.sleep
+
+class FaultInjector:
+    """Mock transport handler that plays back one scripted fault per request.
+
+    Each step is an ``httpx.Response``, an exception to raise, or a number of
+    seconds to hang before answering 200.
+    """
+
+    def __init__(self, *steps):
+        self.steps = list(steps)
+        self.requests = []
+        self.cancelled = 0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        step = self.steps.pop(0) if self.steps else httpx.Response(200, json={"ok": True})
+        if isinstance(step, Exception):
+            raise step
+        if isinstance(step, (int, float)):
+            try:
+                await _real_sleep(step)
+            except asyncio.CancelledError:
+                self.cancelled += 1
+                raise
+            return httpx.Response(200, json={"slow": True})
+        return step
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Record the backoff waits instead of sleeping through them.
+
+    This replaces ``asyncio.sleep`` for the whole test; FaultInjector keeps
+    the real one so its hangs still take time.
+    """
+    recorded = []
+
+    async def fake_sleep(delay, *args, **kwargs):
+        recorded.append(delay)
+        await _real_sleep(0)
+
+    monkeypatch.setattr(retry.asyncio, "sleep", fake_sleep)
+    return recorded
+
+def client(faults: FaultInjector, **policy) -> httpx.AsyncClient:
+    transport = RetryTransport(httpx.MockTransport(faults), RetryPolicy(**policy))
+    return httpx.AsyncClient(transport=transport)
+
+async def test_429_waits_for_retry_after(sleeps):
+    faults = FaultInjector(httpx.Response(429, headers={"Retry-After": "2"}))
+    async with client(faults, base=0.01) as http:
+        response = await http.get("https://api.example.com/items")
+
+    assert response.status_code == 200
+    assert response.extensions["attempts"] == 2
+    assert sleeps == [2.0]
+
+def test_retry_after_accepts_http_dates():
+    when = datetime.now(timezone.utc) + timedelta(seconds=30)
+    response = httpx.Response(503, headers={"Retry-After": format_datetime(when, usegmt=True)})
+    assert 28 <= retry_after(response) <= 30
+    assert retry_after(httpx.Response(503, headers={"Retry-After": "soon"})) is None
+    assert retry_after(httpx.Response(503)) is None
+
+async def test_5xx_backoff_stays_within_jitter_bounds(sleeps):
+    faults = FaultInjector(*(httpx.Response(503) for _ in range(4)))
+    async with client(faults, attempts=4, base=0.1, cap=0.3) as http:
+        response = await http.get("https://api.example.com/items")
+
+    # Out of attempts: the last response comes back for the caller to handle
+    assert response.status_code == 503
+    assert response.extensions["attempts"] == 4
+    assert len(faults.requests) == 4
+    assert len(sleeps) == 3
+    for attempt, delay in enumerate(sleeps):
+        assert 0 <= delay <= min(0.3, 0.1 * 2 ** attempt)
+
+def test_backoff_is_full_jitter_under_the_cap():
+    policy = RetryPolicy(base=0.25, cap=2)
+    for attempt in range(8):
+        delays = [policy.backoff(attempt) for _ in range(200)]
+        bound = min(2, 0.25 * 2 ** attempt)
+        assert all(0 <= delay <= bound for delay in delays)
+        # Jittered, not a fixed schedule
+        assert len(set(delays)) > 1
+
+async def test_slow_attempt_times_out_and_is_retried(sleeps):
+    faults = FaultInjector(5.0)
+    async with client(faults, attempt_timeout=0.05, base=0.01) as http:
+        response = await http.get("https://api.example.com/items")
+
+    assert response.status_code == 200
+    assert response.extensions["attempts"] == 2
+    assert faults.cancelled == 1
+
+async def test_timed_out_post_is_not_retried(sleeps):
+    faults = FaultInjector(5.0)
+    async with client(faults, attempt_timeout=0.05) as http:
+        with pytest.raises(httpx.ReadTimeout):
+            await http.post("https://api.example.com/items", json={})
+
+    assert len(faults.requests) == 1
+    assert sleeps == []
+
+async def test_non_idempotent_5xx_is_returned_as_is(sleeps):
+    faults = FaultInjector(httpx.Response(502))
+    async with client(faults) as http:
+        response = await http.post("https://api.example.com/items", json={})
+
+    assert response.status_code == 502
+    assert len(faults.requests) == 1
+
+async def test_retry_after_beyond_budget_returns_response(sleeps):
+    faults = FaultInjector(httpx.Response(429, headers={"Retry-After": "120"}))
+    async with client(faults, budget=10) as http:
+        response = await http.get("https://api.example.com/items")
+
+    assert response.status_code == 429
+    assert response.extensions["attempts"] == 1
+    assert sleeps == []
+
+async def test_connection_errors_stop_when_budget_runs_out(sleeps, monkeypatch):
+    monkeypatch.setattr(RetryPolicy, "backoff", lambda self, attempt: 1.0)
+    faults = FaultInjector(*(httpx.ConnectError("refused") for _ in range(10)))
+    async with client(faults, attempts=10, budget=0.5) as http:
+        with pytest.raises(httpx.ConnectError):
+            await http.get("https://api.example.com/items")
+
+    assert len(faults.requests) == 1
+    assert sleeps == []
+
+async def test_hedged_get_cancels_the_slow_copy(sleeps):
+    faults = FaultInjector(5.0, httpx.Response(200, json={"copy": 2}))
+    async with client(faults, hedge_after=0.02) as http:
+        response = await http.get("https://api.example.com/items")
+
+    assert response.json() == {"copy": 2}
+    assert len(faults.requests) == 2
+    assert faults.cancelled == 1
+
+async def test_fast_answer_is_not_hedged(sleeps):
+    faults = FaultInjector(httpx.Response(200, json={"copy": 1}))
+    async with client(faults, hedge_after=0.5) as http:
+        response = await http.get("https://api.example.com/items")
+
+    assert response.json() == {"copy": 1}
+    assert len(faults.requests) == 1
+
+async def test_posts_are_never_hedged(sleeps):
+    faults = FaultInjector(0.1)
+    async with client(faults, hedge_after=0.02) as http:
+        response = await http.post("https://api.example.com/items", json={})
+
+    assert response.json() == {"slow": True}
+    assert len(faults.requests) == 1
@@ -0,0 +1,111 @@
+import asyncio
+import pytest
+from status_cache import INVALIDATION_CHANNEL, StatusCache, status_key
+
+pytestmark = pytest.mark.anyio
+
+KEY = status_key("notion", "org-1", "user-1")
+
+class Source:
+    """The data behind the cache. Counts loads and can hold them at ``gate``."""
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self.loads = 0
+        self.gate = None
+        self.started = asyncio.Event()
+
+    async def load(self) -> bytes:
+        self.loads += 1
+        body = self.body
+        self.started.set()
+        if self.gate is not None:
+            await self.gate.wait()
+        return body
+
+async def eventually(check, timeout: float = 2.0):
+    async with asyncio.timeout(timeout):
+        while not await check():
+            await asyncio.sleep(0.01)
+
+async def listening(redis, count: int):
+    async def subscribed():
+        return (await redis.pubsub_numsub(INVALIDATION_CHANNEL))[0][1] >= count
+    await eventually(subscribed)
+
+@pytest.fixture
+async def workers(fake_redis):
+    """Two processes' caches sharing one Redis, both listening for invalidations."""
+    caches = [StatusCache(), StatusCache()]
+    for cache in caches:
+        cache.start()
+    await listening(fake_redis, len(caches))
+    yield caches
+    for cache in caches:
+        await cache.close()
+
+async def test_concurrent_misses_share_one_load(fake_redis):
+    cache, source = StatusCache(), Source(b"v1")
+    bodies = await asyncio.gather(*(cache.get(KEY, source.load) for _ in range(10)))
+    assert bodies == [b"v1"] * 10
+    assert source.loads == 1
+
+async def test_stale_entry_is_served_while_it_refreshes(fake_redis):
+    cache, source = StatusCache(ttl=0.05, stale_ttl=60), Source(b"v1")
+    await cache.get(KEY, source.load)
+    await asyncio.sleep(0.06)
+    source.body = b"v2"
+
+    assert await cache.get(KEY, source.load) == b"v1"
+
+    async def refreshed():
+        return await cache.get(KEY, source.load) == b"v2"
+    await eventually(refreshed)
+    assert source.loads == 2
+
+async def test_invalidation_reaches_every_worker(workers):
+    a, b = workers
+    source = Source(b"v1")
+    assert await a.get(KEY, source.load) == b"v1"
+    assert await b.get(KEY, source.load) == b"v1"
+    assert source.loads == 1
+
+    source.body = b"v2"
+    await a.invalidate(KEY)
+
+    async def reloaded():
+        return await b.get(KEY, source.load) == b"v2"
+    await eventually(reloaded)
+
+async def test_refresh_racing_an_invalidation_is_not_written_back(fake_redis):
+    # No listeners: the version check in Redis alone keeps the stale load out
+    a, b = StatusCache(), StatusCache()
+    source = Source(b"old")
+    gate = source.gate = asyncio.Event()
+    load = asyncio.create_task(a.get(KEY, source.load))
+    await source.started.wait()
+
+    source.body, source.gate = b"new", None
+    await b.invalidate(KEY)
+    gate.set()
+    assert await load == b"old"
+
+    assert await fake_redis.get(KEY) is None
+    assert await b.get(KEY, source.load) == b"new"
+
+async def test_worker_that_hears_the_invalidation_drops_its_load(workers, fake_redis):
+    a, b = workers
+    source = Source(b"old")
+    gate = source.gate = asyncio.Event()
+    load = asyncio.create_task(a.get(KEY, source.load))
+    await source.started.wait()
+
+    source.body, source.gate = b"new", None
+    await b.invalidate(KEY)
+    await asyncio.sleep(0.05)
+    gate.set()
+    # The caller that asked still gets what was loaded for it
+    assert await load == b"old"
+
+    assert await fake_redis.get(KEY) is None
+    assert await a.get(KEY, source.load) == b"new"
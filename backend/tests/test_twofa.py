@@ -0,0 +1,118 @@
+import httpx
+import pytest
+from fastapi import FastAPI
+import auth
+from auth_routes import router as auth_router
+from cassandra_client import get_cassandra
+from two_factor_auth import TOTP
+from twofa_routes import router as twofa_router
+
+pytestmark = pytest.mark.anyio
+
+class Accounts:
+    """The CassandraClient calls the login and 2FA routes make, in memory."""
+
+    def __init__(self):
+        self.passwords = {"alice@example.com": "alice-pw", "bob@example.com": "bob-pw"}
+        self.secrets = {}
+
+    async def verify_user(self, email, password):
+        if self.passwords.get(email) != password:
+            raise ValueError("Invalid email or password")
+        return {"token": auth.create_access_token({"sub": email, "email": email}), "token_type": "bearer"}
+
+    async def get_user_by_id(self, user_id):
+        return {"id": user_id, "email": user_id} if user_id in self.passwords else None
+
+    async def store_2fa_secret(self, user_id, secret):
+        self.secrets[user_id] = secret
+        return True
+
+    async def get_2fa_secret(self, user_id):
+        return self.secrets.get(user_id)
+
+    async def remove_2fa_secret(self, user_id):
+        self.secrets.pop(user_id, None)
+        return True
+
+@pytest.fixture
+def accounts():
+    return Accounts()
+
+@pytest.fixture
+async def api(fake_redis, accounts):
+    app = FastAPI()
+    app.include_router(auth_router, prefix="/api/auth")
+    app.include_router(twofa_router, prefix="/api/auth")
+    app.dependency_overrides[get_cassandra] = lambda: accounts
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+def bearer(token: str) -> dict:
+    return {"Authorization": f"Bearer {token}"}
+
+def session(email: str) -> dict:
+    return bearer(auth.create_access_token({"sub": email}))
+
+async def test_setup_requires_a_session(api, accounts):
+    response = await api.post("/api/auth/2fa/setup", json={"user_id": "bob@example.com"})
+    assert response.status_code == 401
+    assert accounts.secrets == {}
+
+async def test_routes_act_on_the_caller_only(api, accounts):
+    alice = session("alice@example.com")
+    response = await api.post("/api/auth/2fa/setup", json={"user_id": "bob@example.com"}, headers=alice)
+    assert response.status_code == 200
+    assert list(accounts.secrets) == ["alice@example.com"]
+
+    accounts.secrets["bob@example.com"] = TOTP().secret
+    bob_code = TOTP(accounts.secrets["bob@example.com"]).generate_totp()
+    response = await api.post("/api/auth/2fa/verify", json={"code": bob_code, "user_id": "bob@example.com"},
+                              headers=alice)
+    assert response.json()["is_valid"] is False
+
+    del accounts.secrets["alice@example.com"]
+    response = await api.get("/api/auth/2fa/check", params={"user_id": "bob@example.com"}, headers=alice)
+    assert response.json() == {"is_enabled": False}
+    assert (await api.get("/api/auth/2fa/check", params={"user_id": "bob@example.com"})).status_code == 401
+
+async def test_password_login_with_2fa_needs_the_code(api, accounts):
+    accounts.secrets["alice@example.com"] = secret = TOTP().secret
+
+    response = await api.post("/api/auth/login", json={"email": "alice@example.com", "password": "alice-pw"})
+    body = response.json()
+    assert body["requires_2fa"] is True
+    assert "token" not in body
+    pre_auth = body["pre_auth_token"]
+    # The pre-auth token is not a session
+    assert (await api.get("/api/auth/2fa/check", headers=bearer(pre_auth))).status_code == 401
+
+    response = await api.post("/api/auth/2fa/login", json={"pre_auth_token": pre_auth, "code": "000000"})
+    assert response.status_code == 401
+
+    code = TOTP(secret).generate_totp()
+    response = await api.post("/api/auth/2fa/login", json={"pre_auth_token": pre_auth, "code": code})
+    assert response.status_code == 200
+    token = response.json()["token"]
+    assert (await api.get("/api/auth/2fa/check", headers=bearer(token))).json() == {"is_enabled": True}
+
+    # Single use
+    response = await api.post("/api/auth/2fa/login", json={"pre_auth_token": pre_auth, "code": code})
+    assert response.status_code == 401
+
+async def test_2fa_login_needs_a_password_checked_token(api, accounts):
+    accounts.secrets["alice@example.com"] = secret = TOTP().secret
+    code = TOTP(secret).generate_totp()
+
+    response = await api.post("/api/auth/2fa/login", json={"email": "alice@example.com", "code": code})
+    assert response.status_code == 422
+    # A session (or anything else without the pre-auth scope) is refused too
+    forged = auth.create_access_token({"sub": "alice@example.com"})
+    response = await api.post("/api/auth/2fa/login", json={"pre_auth_token": forged, "code": code})
+    assert response.status_code == 401
+
+async def test_password_login_without_2fa_returns_a_session(api):
+    response = await api.post("/api/auth/login", json={"email": "bob@example.com", "password": "bob-pw"})
+    body = response.json()
+    assert "requires_2fa" not in body
+    assert (await api.get("/api/auth/2fa/check", headers=bearer(body["token"]))).json() == {"is_enabled": False}
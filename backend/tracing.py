@@ -0,0 +1,250 @@
+"""Request and job tracing.
+
+A span is one timed operation (an API request, a Redis command, a Cassandra
+query, a provider HTTP call, a sync crawl). The active span lives in a
+context variable. ``asyncio.create_task`` and ``asyncio.to_thread`` copy the
+context, so spans started inside fanned-out crawl tasks nest under the span
+that launched them with no extra plumbing. Across process boundaries the
+context travels as a W3C ``traceparent`` string: provider requests carry it
+as a header, and sync jobs store it on the job so the worker's spans join
+the trace of the request that queued them.
+
+Nothing is recorded until ``configure_tracing`` installs an exporter. Then
+each new trace is sampled with probability ``TRACE_SAMPLE_RATIO``, and every
+span inherits its parent's decision, so a trace is either complete or
+absent.
+
+Configuration (environment):
+
+- ``TRACE_EXPORTER``: ``file`` to append finished spans as JSON lines to
+  ``TRACE_FILE``; unset disables tracing.
+- ``TRACE_SAMPLE_RATIO``: fraction of new traces to record (default 1.0).
+"""
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+TRACE_EXPORTER = os.getenv('TRACE_EXPORTER', '')
+TRACE_FILE = os.getenv('TRACE_FILE', 'traces.jsonl')
+TRACE_SAMPLE_RATIO = float(os.getenv('TRACE_SAMPLE_RATIO', '1.0'))
+
+class Span:
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent_id', 'sampled', 'start_ns', 'end_ns',
+                 'attributes', 'status', 'error', '_token')
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], sampled: bool):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = _new_id(64)
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes: Dict[str, Any] = {}
+        self.status = "ok"
+        self.error: Optional[str] = None
+        self._token = None
+
+    def set(self, key: str, value: Any):
+        if self.sampled:
+            self.attributes[key] = value
+
+    @property
+    def duration_ms(self) -> Optional[float]:
+        return None if self.end_ns is None else (self.end_ns - self.start_ns) / 1e6
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start_ns / 1e9,
+            "duration_ms": self.duration_ms,
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+    # Context manager: the span is current between __enter__ and __exit__
+
+    def __enter__(self) -> "Span":
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end_ns = time.time_ns()
+        if exc is not None and not isinstance(exc, GeneratorExit):
+            self.status = "error"
+            self.error = f"{exc_type.__name__}: {exc}"
+        try:
+            _current.reset(self._token)
+        except ValueError:
+            # Exited in a different context (e.g. an async generator closed
+            # from another task); the span is still recorded
+            pass
+        if self.sampled and _exporter is not None:
+            _exporter.export([self])
+        return False
+
+class _NoopSpan:
+    """Stand-in returned outside any trace; records and propagates nothing."""
+    __slots__ = ()
+    sampled = False
+    traceparent = None
+
+    def set(self, key: str, value: Any):
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NOOP = _NoopSpan()
+
+def _new_id(bits: int) -> str:
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
+
+class _RemoteParent:
+    """Parent context extracted from a traceparent string."""
+    __slots__ = ('trace_id', 'span_id', 'sampled')
+
+    def __init__(self, trace_id: str, span_id: str, sampled: bool):
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.sampled = sampled
+
+_current: contextvars.ContextVar = contextvars.ContextVar('current_span', default=None)
+
+def parse_traceparent(value: Optional[str]) -> Optional[_RemoteParent]:
+    """Parse a W3C traceparent; None when it is missing or malformed."""
+    if not value:
+        return None
+    parts = value.strip().split('-')
+    if len(parts) < 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        int(parts[1], 16), int(parts[2], 16)
+        flags = int(parts[3][:2], 16)
+    except ValueError:
+        return None
+    return _RemoteParent(parts[1], parts[2], bool(flags & 1))
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+def current_traceparent() -> Optional[str]:
+    """traceparent for the active span, for handing to another process."""
+    span = current_span()
+    return span.traceparent if span is not None else None
+
+def start_span(name: str, traceparent: Optional[str] = None, **attributes) -> Span:
+    """New span under the active span, or under ``traceparent`` when given;
+    otherwise the root of a new trace.
+
+    Use as a context manager: ``with start_span("sync notion", mode=mode):``.
+    """
+    parent = parse_traceparent(traceparent) if traceparent else _current.get()
+    if parent is None:
+        sampled = _exporter is not None and random.random() < TRACE_SAMPLE_RATIO
+        span = Span(name, _new_id(128), None, sampled)
+    else:
+        span = Span(name, parent.trace_id, parent.span_id, parent.sampled)
+    if span.sampled and attributes:
+        span.attributes.update(attributes)
+    return span
+
+def child_span(name: str, **attributes):
+    """Span for a leaf operation (a Redis command, a query, an HTTP call).
+
+    Only recorded inside a trace: background polling outside any request or
+    job does not start traces of its own.
+    """
+    parent = _current.get()
+    if parent is None or not parent.sampled:
+        return _NOOP
+    span = Span(name, parent.trace_id, parent.span_id, True)
+    if attributes:
+        span.attributes.update(attributes)
+    return span
+
+class InMemoryExporter:
+    """Keeps finished spans in a list (for tests and debugging)."""
+
+    def __init__(self):
+        self.spans: List[Span] = []
+
+    def export(self, spans: List[Span]):
+        self.spans.extend(spans)
+
+    def clear(self):
+        self.spans.clear()
+
+    def shutdown(self):
+        pass
+
+class FileExporter:
+    """Appends finished spans as JSON lines from a background thread."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._queue: "queue.SimpleQueue[Optional[Dict[str, Any]]]" = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._write, name="trace-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, spans: List[Span]):
+        for span in spans:
+            self._queue.put(span.to_dict())
+
+    def _write(self):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            while True:
+                entry = self._queue.get()
+                if entry is None:
+                    return
+                try:
+                    f.write(json.dumps(entry, default=str) + '\n')
+                    if self._queue.empty():
+                        f.flush()
+                except OSError as e:
+                    logger.warning("Could not write span: %s", e)
+
+    def shutdown(self):
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+_exporter = None
+
+def set_exporter(exporter):
+    """Install ``exporter`` (anything with ``export(spans)`` and ``shutdown()``);
+    None turns tracing off."""
+    global _exporter
+    _exporter = exporter
+
+def configure_tracing(exporter: str = TRACE_EXPORTER, path: str = TRACE_FILE):
+    """Install the exporter named by TRACE_EXPORTER (called on app startup)."""
+    if exporter == 'file':
+        set_exporter(FileExporter(path))
+    elif exporter:
+        logger.warning("Unknown TRACE_EXPORTER %r; tracing disabled", exporter)
+
+def shutdown_tracing():
+    """Flush and remove the exporter (called on app shutdown)."""
+    global _exporter
+    exporter, _exporter = _exporter, None
+    if exporter is not None:
+        exporter.shutdown()
@@ -17,6 +17,7 @@ if [ ! -d "venv" ]; then
 fi
 source venv/bin/activate
 pip install -r requirements.txt
+python init_db.py
 uvicorn main:app --reload &
 
 # Wait for backend to start